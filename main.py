@@ -1,28 +1,176 @@
 import sys
 import re
 import os
+import time
 import logging
 import hashlib
+import threading
+import queue
+import bisect
+import heapq
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from contextlib import contextmanager
 import pyodbc
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QTableWidget, QTableWidgetItem, QVBoxLayout,
     QPushButton, QWidget, QHBoxLayout, QAbstractItemView, QFileDialog, QMessageBox,
     QLineEdit, QLabel, QHeaderView, QAction, QFrame, QMenu, QDialog, QFormLayout,
-    QComboBox, QGroupBox, QTabWidget, QTextEdit, QCheckBox, QListWidget, QListWidgetItem,
-    QInputDialog, QDialogButtonBox, QSizePolicy
+    QComboBox, QGroupBox, QTabWidget, QTextEdit, QCheckBox, QListView,
+    QInputDialog, QDialogButtonBox, QSizePolicy, QTableView, QProgressBar
 )
-from PyQt5.QtCore import Qt, QSize
-from PyQt5.QtGui import QIcon, QFont
+from PyQt5.QtCore import (
+    Qt, QSize, QAbstractTableModel, QAbstractListModel, QModelIndex, pyqtSignal, QObject, QRunnable, QThreadPool, QTimer
+)
+from PyQt5.QtGui import QIcon, QFont, QBrush, QColor
 import pandas as pd
+import numpy as np
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None  # 未安装pypinyin时姓名搜索不支持拼音和首字母
+
+
+COURSE_NUMBER_PATTERN = r'^[A-Za-z]\d{3}$'
+COURSE_NUMBER_ERROR = "课程号必须为一个字母后跟三个数字（例如：C001）"
 
 
 def validate_course_number(cno):
     """验证课程号格式：一个字母加三个数字"""
-    pattern = re.compile(r'^[A-Za-z]\d{3}$')
+    pattern = re.compile(COURSE_NUMBER_PATTERN)
     if not pattern.match(cno):
-        return False, "课程号必须为一个字母后跟三个数字（例如：C001）"
+        return False, COURSE_NUMBER_ERROR
     return True, ""
 
+
+def text_column(series):
+    """把一列转换为去除首尾空白的字符串（空值为空字符串）"""
+    return series.fillna("").astype(str).str.strip()
+
+
+def numeric_column(series):
+    """把一列转换为数字，空单元格和无法转换的值为NaN，返回 (数值, 空单元格掩码)"""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        # 整列都是数字时无需逐个转换字符串
+        return series.astype(float), series.isna().to_numpy()
+    raw = series.fillna("").astype(str)
+    blank = raw == ""
+    # 只含空白字符的单元格不算空，转换失败后按非数字处理
+    values = pd.to_numeric(raw.str.strip().mask(blank), errors="coerce")
+    return values, blank.to_numpy()
+
+
+def course_number_mask(cnos):
+    """向量化验证课程号格式，返回合法课程号的布尔掩码"""
+    return text_column(cnos).str.match(COURSE_NUMBER_PATTERN).to_numpy(dtype=bool)
+
+
+def validate_score_frame(df):
+    """向量化校验导入的学生成绩数据
+
+    df 使用标准列名（学号、姓名、课程号、学分、成绩），索引为数据行序号，按整列计算各项检查的掩码，
+    返回 {Excel行号: [错误信息, ...]}，没有错误的行不出现在结果中
+    """
+    checks = []
+    for column in ("学号", "姓名", "课程号"):
+        checks.append((text_column(df[column]).to_numpy() == "", f"{column}不能为空"))
+
+    credit, credit_blank = numeric_column(df["学分"])
+    credit_invalid = ~credit_blank & credit.isna().to_numpy()
+    checks.append((credit_invalid, "学分必须是数字"))
+    checks.append(((credit <= 0).to_numpy(), "学分必须大于0"))
+
+    grade, grade_blank = numeric_column(df["成绩"])
+    grade_invalid = ~grade_blank & grade.isna().to_numpy()
+    checks.append((grade_invalid, "成绩必须是数字"))
+    checks.append((((grade < MIN_GRADE) | (grade > MAX_GRADE)).to_numpy(),
+                   f"成绩必须在{MIN_GRADE}-{MAX_GRADE}之间"))
+
+    # 索引为数据行序号，表头占第1行，数据从第2行开始
+    row_numbers = df.index.to_numpy() + 2
+    errors = {}
+    for mask, message in checks:
+        for row_number in row_numbers[mask]:
+            errors.setdefault(int(row_number), []).append(message)
+    return dict(sorted(errors.items()))
+
+
+def format_validation_errors(errors):
+    """把按行分组的错误展开为 "第 N 行: ..." 形式的列表"""
+    return [f"第 {row} 行: {message}" for row, messages in errors.items() for message in messages]
+
+
+def score_import_rows(df):
+    """把一块已校验的成绩数据转换为写入暂存表的行，返回 (行列表, 课程号格式错误的行数)
+
+    课程号格式错误的行被跳过并记录日志，学分和成绩的空值或非数字值按0处理
+    """
+    cnos = text_column(df["课程号"])
+    valid = course_number_mask(cnos)
+    row_indexes = df.index.to_numpy()
+    for position in np.flatnonzero(~valid):
+        logging.warning(f"行 {row_indexes[position] + 2}：课程号 '{cnos.iat[position]}' 格式错误 - "
+                        f"{COURSE_NUMBER_ERROR}")
+
+    credit = numeric_column(df["学分"])[0].fillna(0.0)
+    grade = numeric_column(df["成绩"])[0].fillna(0.0)
+
+    rows = list(zip(
+        row_indexes[valid].tolist(),
+        text_column(df["学号"])[valid].tolist(),
+        text_column(df["姓名"])[valid].tolist(),
+        cnos[valid].tolist(),
+        text_column(df["课程名称"])[valid].tolist(),
+        credit[valid].astype(float).tolist(),
+        grade[valid].astype(float).tolist()
+    ))
+    return rows, int((~valid).sum())
+
+
+def format_export_row(record, spec, integral=True):
+    """按 EXPORT_QUERIES 中的格式设置转换一行导出数据
+
+    integral: 是否把整数值的小数转换为整数，列类型固定的格式（Parquet）应为False
+    """
+    row = list(record)
+    for i, value in enumerate(row):
+        if value is None:
+            if spec['null_as_zero']:
+                row[i] = 0
+        elif i in spec['integral_columns']:
+            if integral and value == int(value):
+                row[i] = int(value)
+        elif i in spec['round_columns']:
+            row[i] = round(value, 2)
+    return row
+
+
+def match_import_columns(headers):
+    """按 IMPORT_HEADER_MAPPINGS 匹配表头，返回 {标准列名: 列序号}"""
+    matched_columns = {}
+    for required_col, possible_names in IMPORT_HEADER_MAPPINGS.items():
+        names = [name.lower() for name in possible_names]
+        for position, col in enumerate(headers):
+            if str(col).lower() in names:
+                matched_columns[required_col] = position
+                break
+    return matched_columns
+
+
+def detect_csv_encoding(file_path, sample_size=1024 * 1024):
+    """检测CSV文件编码：能按UTF-8解码则使用UTF-8，否则按GBK（Excel另存的中文CSV）处理"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+    try:
+        sample.decode('utf-8-sig')
+    except UnicodeDecodeError as e:
+        # 样本末尾截断的多字节字符不算解码失败
+        if e.start < len(sample) - 3:
+            return 'gbk'
+    return 'utf-8-sig'
+
+
 def __init__(self):
     super().__init__()
 
@@ -40,13 +188,26 @@ def __init__(self):
         logging.warning(f"图标文件未找到: {icon_path}")
 
 
-# 配置日志记录
-os.makedirs('logs', exist_ok=True)
-logging.basicConfig(
-    filename='logs/student_app.log',
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# 慢查询单独记录到一个日志文件，不写入主日志
+slow_query_logger = logging.getLogger("slow_query")
+slow_query_logger.propagate = False
+
+
+def setup_logging():
+    """配置日志记录
+
+    只在主进程启动时调用：按课程导出时进程池的子进程会重新导入本模块，不能再次打开日志文件
+    """
+    os.makedirs('logs', exist_ok=True)
+    logging.basicConfig(
+        filename='logs/student_app.log',
+        level=logging.DEBUG,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    slow_query_handler = logging.FileHandler('logs/slow_queries.log', encoding='utf-8')
+    slow_query_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    slow_query_logger.addHandler(slow_query_handler)
 
 # 数据库连接配置
 DB_CONFIG = {
@@ -56,10 +217,599 @@ DB_CONFIG = {
     'driver': '{ODBC Driver 17 for SQL Server}'  # ODBC驱动
 }
 
+# 数据库连接池配置
+DB_POOL_CONFIG = {
+    'max_size': 6,  # 最大连接数
+    'acquire_timeout': 15,  # 等待可用连接的最长时间（秒）
+    'health_check_idle': 30,  # 空闲超过该时间（秒）的连接在借出前先做健康检查
+    'connect_retries': 2,  # 网络类错误时的重连次数
+}
+
+# 数据库调用统计配置
+QUERY_STATS_CONFIG = {
+    'slow_query_ms': 500,  # 执行加读取结果超过该时间（毫秒）的语句写入 logs/slow_queries.log
+    'summary_limit': 10,  # 退出时写入主日志的总耗时最多的语句数
+}
+
 # 全局常量
 MAX_GRADE = 100  # 最高成绩
 MIN_GRADE = 0  # 最低成绩
 
+# 学生成绩分页浏览可选的每页行数
+PAGE_SIZES = [100, 500, 1000, 5000]
+DEFAULT_PAGE_SIZE = 500
+
+# 流式读取查询结果的配置
+QUERY_STREAM_CONFIG = {
+    'first_batch_size': 200,  # 第一批行数较小，尽快显示首屏
+    'batch_size': 5000,  # 之后每批从服务器读取的最大行数
+}
+
+# 边输入边搜索：停止输入多少毫秒后开始搜索
+SEARCH_DEBOUNCE_MS = 300
+
+# 姓名拼音/模糊搜索最多返回的学生数
+NAME_SEARCH_LIMIT = 200
+
+# 多用户修改同步：触发器把各表的修改写入ChangeLog表，本程序定时读取其他客户端的修改。
+# ChangeLog表和触发器由管理员执行 sql/change_log.sql 创建，过期记录由服务器定时清理
+CHANGE_FEED_CONFIG = {
+    'poll_interval_ms': 5000,  # 读取修改记录的间隔（毫秒）
+    'max_keys': 2000,  # 一次读到的某个表的修改超过该数量时，改为重新加载全部数据
+}
+
+# 批量导入配置
+BULK_IMPORT_CONFIG = {
+    'stage_batch_size': 5000,  # 每次executemany写入暂存表的行数
+    'read_chunk_size': 10000,  # 每次从导入文件读取并校验的行数
+}
+
+# 导入学生成绩时必须包含的列
+IMPORT_REQUIRED_COLUMNS = ["学号", "姓名", "课程号", "课程名称", "学分", "成绩"]
+
+# 导入文件的表头，支持多种表头格式
+IMPORT_HEADER_MAPPINGS = {
+    "学号": ["学号", "学生学号", "学生号", "sno", "student_id", "学生id"],
+    "姓名": ["姓名", "学生姓名", "name", "student_name"],
+    "课程号": ["课程号", "课号", "课程编号", "cno", "course_id"],
+    "课程名称": ["课程名称", "课程名", "课程", "course_name", "course"],
+    "学分": ["学分", "分值", "学分值", "credit"],
+    "成绩": ["成绩", "得分", "分数", "grade", "score"]
+}
+
+# 各选项卡导出的数据，title为导出全部数据时的工作表名称
+# integral_columns: 整数值的小数列按整数导出；round_columns: 保留两位小数；null_as_zero: 空值导出为0
+# parquet_types: 导出Parquet文件时各列的类型
+EXPORT_QUERIES = {
+    'scores': {
+        'title': "学生成绩",
+        'headers': ["学号", "姓名", "课程号", "课程名称", "学分", "成绩"],
+        'query': """
+            SELECT s.Sno, s.name, sc.Cno, c.course_name, c.Credit, sc.Grade
+            FROM Student_Score sc
+            JOIN Student s ON sc.Sno = s.Sno
+            JOIN Course c ON sc.Cno = c.Cno
+            ORDER BY s.Sno, sc.Cno
+        """,
+        'integral_columns': (4, 5),
+        'round_columns': (),
+        'null_as_zero': False,
+        'parquet_types': ('string', 'string', 'string', 'string', 'float64', 'float64'),
+    },
+    'students': {
+        'title': "学生统计",
+        'headers': ["学号", "姓名", "已修课程数", "平均成绩"],
+        'query': """
+            SELECT s.Sno, s.name,
+                   COUNT(sc.Cno) as course_count,
+                   AVG(sc.Grade) as avg_grade
+            FROM Student s
+            LEFT JOIN Student_Score sc ON s.Sno = sc.Sno
+            GROUP BY s.Sno, s.name
+            ORDER BY s.Sno
+        """,
+        'integral_columns': (),
+        'round_columns': (3,),
+        'null_as_zero': True,
+        'parquet_types': ('string', 'string', 'int64', 'float64'),
+    },
+    'courses': {
+        'title': "课程统计",
+        'headers': ["课程号", "课程名称", "学分", "选课人数", "平均成绩"],
+        'query': """
+            SELECT c.Cno, c.course_name, c.Credit,
+                   COUNT(sc.Sno) as student_count,
+                   AVG(sc.Grade) as avg_grade
+            FROM Course c
+            LEFT JOIN Student_Score sc ON c.Cno = sc.Cno
+            GROUP BY c.Cno, c.course_name, c.Credit
+            ORDER BY c.Cno
+        """,
+        'integral_columns': (2,),
+        'round_columns': (4,),
+        'null_as_zero': True,
+        'parquet_types': ('string', 'string', 'float64', 'int64', 'float64'),
+    },
+}
+
+# 计算导出列宽时采样的行数（只写模式必须在写入数据前设置列宽）
+EXPORT_WIDTH_SAMPLE_ROWS = 1000
+
+# Excel单张工作表的最大行数（含表头）
+EXCEL_MAX_SHEET_ROWS = 1048576
+
+# 多表导出时每个查询在后台预读的最大批次数
+EXPORT_PREFETCH_BATCHES = 8
+
+# 按课程导出：所有成绩按课程号排序读取，每门课程的报表在单独的进程中生成
+COURSE_REPORT_QUERY = """
+    SELECT sc.Cno, c.course_name, c.Credit, s.Sno, s.name, sc.Grade
+    FROM Student_Score sc
+    JOIN Student s ON sc.Sno = s.Sno
+    JOIN Course c ON sc.Cno = c.Cno
+    ORDER BY sc.Cno, sc.Grade DESC, s.Sno
+"""
+
+# 每个进程最多排队等待的课程数，限制已读取但尚未生成报表的数据量
+COURSE_REPORT_QUEUE_PER_WORKER = 2
+
+# Parquet文件每个行组的行数
+EXPORT_PARQUET_ROW_GROUP_SIZE = 100000
+
+# 支持的导出格式：(文件对话框过滤器, 扩展名)
+EXPORT_FILE_FORMATS = [
+    ("Excel文件 (*.xlsx)", ".xlsx"),
+    ("CSV文件 (*.csv)", ".csv"),
+    ("压缩CSV文件 (*.csv.gz)", ".csv.gz"),
+    ("Parquet文件 (*.parquet)", ".parquet"),
+]
+
+
+# 语句指纹：去掉字面量和多余空白，参数个数不同的IN列表视为同一语句
+_FINGERPRINT_PATTERNS = [
+    (re.compile(r"N?'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b0x[0-9A-Fa-f]+\b"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\b(IN\s*)\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE), r"\1(?, ...)"),
+    (re.compile(r"\s+"), " "),
+]
+_FINGERPRINT_CACHE = {}  # 原始语句 -> 指纹，程序中的语句大多是常量，只需规范化一次
+
+
+def sql_fingerprint(sql):
+    """返回语句的指纹文本，相同结构、不同字面量的语句有相同的指纹"""
+    fingerprint = _FINGERPRINT_CACHE.get(sql)
+    if fingerprint is None:
+        fingerprint = sql
+        for pattern, replacement in _FINGERPRINT_PATTERNS:
+            fingerprint = pattern.sub(replacement, fingerprint)
+        fingerprint = fingerprint.strip()
+        if len(_FINGERPRINT_CACHE) >= 1000:
+            _FINGERPRINT_CACHE.clear()
+        _FINGERPRINT_CACHE[sql] = fingerprint
+    return fingerprint
+
+
+class LatencyHistogram:
+    """耗时直方图，桶边界按1.25倍递增（0.1毫秒到约10分钟），用固定内存估算分位数"""
+
+    BOUNDS = [0.1 * 1.25 ** i for i in range(80)]  # 各桶的上界（毫秒）
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(self.BOUNDS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def copy(self):
+        histogram = LatencyHistogram()
+        histogram.counts = list(self.counts)
+        histogram.count, histogram.total, histogram.max = self.count, self.total, self.max
+        return histogram
+
+    def percentile(self, p):
+        """第p百分位数的估计值（所在桶的上界，不超过最大值）"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.BOUNDS[i] if i < len(self.BOUNDS) else self.max, self.max)
+        return self.max
+
+
+class QueryStatsEntry:
+    """一个语句指纹的累计统计"""
+
+    __slots__ = ("fingerprint", "calls", "errors", "params", "rows", "execute_ms", "fetch_ms", "latency")
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.errors = 0
+        self.params = 0  # 最近一次调用的参数个数
+        self.rows = 0  # 累计返回行数
+        self.execute_ms = 0.0  # 累计执行时间
+        self.fetch_ms = 0.0  # 累计读取结果时间
+        self.latency = LatencyHistogram()  # 每次调用执行加读取的总耗时
+
+    def copy(self):
+        entry = QueryStatsEntry(self.fingerprint)
+        for name in self.__slots__[1:-1]:
+            setattr(entry, name, getattr(self, name))
+        entry.latency = self.latency.copy()
+        return entry
+
+
+class QueryStats:
+    """按语句指纹汇总全部数据库调用的次数、行数、耗时和分位数，超过阈值的调用写入慢查询日志
+
+    由各线程的InstrumentedCursor调用，内部加锁
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # 指纹 -> QueryStatsEntry
+
+    def record(self, sql, params, rows, execute_time, fetch_time, error=None):
+        """记录一次调用，时间单位为秒"""
+        fingerprint = sql_fingerprint(sql)
+        execute_ms = execute_time * 1000
+        fetch_ms = fetch_time * 1000
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                entry = self._entries[fingerprint] = QueryStatsEntry(fingerprint)
+            entry.calls += 1
+            entry.errors += error is not None
+            entry.params = params
+            entry.rows += rows
+            entry.execute_ms += execute_ms
+            entry.fetch_ms += fetch_ms
+            entry.latency.add(execute_ms + fetch_ms)
+
+        if execute_ms + fetch_ms >= QUERY_STATS_CONFIG['slow_query_ms']:
+            status = f", 出错: {error}" if error is not None else ""
+            slow_query_logger.warning(
+                f"{execute_ms + fetch_ms:.0f} 毫秒 (执行 {execute_ms:.0f}, 读取 {fetch_ms:.0f}), "
+                f"参数 {params} 个, 返回 {rows} 行{status}: {fingerprint}")
+
+    def snapshot(self):
+        """返回各指纹统计的副本，按总耗时从大到小排序"""
+        with self._lock:
+            entries = [entry.copy() for entry in self._entries.values()]
+        entries.sort(key=lambda e: e.latency.total, reverse=True)
+        return entries
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+    def summary(self, limit=None):
+        """总耗时最多的语句的统计摘要（多行文本）"""
+        lines = []
+        for entry in self.snapshot()[:limit or QUERY_STATS_CONFIG['summary_limit']]:
+            latency = entry.latency
+            lines.append(f"{entry.calls} 次, 共 {latency.total / 1000:.2f} 秒, p50 {latency.percentile(50):.1f}"
+                         f" / p95 {latency.percentile(95):.1f} / p99 {latency.percentile(99):.1f} 毫秒, "
+                         f"{entry.rows} 行: {entry.fingerprint[:200]}")
+        return "\n".join(lines)
+
+
+# 全部数据库连接共用的调用统计
+QUERY_STATS = QueryStats()
+
+
+class InstrumentedCursor:
+    """记录每次调用耗时的游标包装，其余属性和方法直接转给pyodbc游标
+
+    execute/executemany计为执行时间，之后的fetch计为读取时间；结果读完、再次执行或关闭游标时
+    把这次调用记入QueryStats。没有结果集的语句（增删改）执行后立即记录
+    """
+
+    def __init__(self, cursor, stats):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_stats", stats)
+        object.__setattr__(self, "_pending", None)  # [语句, 参数个数, 行数, 执行时间, 读取时间]
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)  # 如fast_executemany
+
+    def _run(self, method, sql, args, params):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            method(sql, *args)
+        except Exception as e:
+            self._stats.record(sql, params, 0, time.perf_counter() - started, 0.0, e)
+            raise
+        pending = [sql, params, 0, time.perf_counter() - started, 0.0]
+        if self._cursor.description is None:
+            self._stats.record(*pending)
+        else:
+            object.__setattr__(self, "_pending", pending)
+        return self
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            count = len(params[0])
+        else:
+            count = len(params)
+        return self._run(self._cursor.execute, sql, params, count)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = seq_of_params if isinstance(seq_of_params, list) else list(seq_of_params)
+        count = sum(len(params) for params in seq_of_params)
+        return self._run(self._cursor.executemany, sql, (seq_of_params,), count)
+
+    def _fetched(self, started, rows, exhausted):
+        pending = self._pending
+        if pending is not None:
+            pending[2] += rows
+            pending[4] += time.perf_counter() - started
+            if exhausted:
+                self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany() if size is None else self._cursor.fetchmany(size)
+        self._fetched(started, len(rows), not rows or (size is not None and len(rows) < size))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def _finish(self):
+        pending = self._pending
+        if pending is not None:
+            object.__setattr__(self, "_pending", None)
+            self._stats.record(*pending)
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __del__(self):
+        if "_pending" in self.__dict__:
+            self._finish()
+
+
+class InstrumentedConnection:
+    """数据库连接包装，cursor()返回InstrumentedCursor，其余属性和方法直接转给pyodbc连接"""
+
+    def __init__(self, conn, stats):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_stats", stats)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def cursor(self):
+        return InstrumentedCursor(self._conn.cursor(), self._stats)
+
+
+class PoolTimeoutError(pyodbc.Error):
+    """等待连接池中的可用连接超时"""
+
+
+class ConnectionPool:
+    """数据库连接池
+
+    连接数有上限，空闲较久的连接借出前先做健康检查，失效的连接自动丢弃并重连。
+    每个操作借用各自的连接，因此加载、搜索、导入、导出可以同时进行。
+    借出的连接都经过InstrumentedConnection包装，所有语句的耗时记入stats（默认为QUERY_STATS）。
+    """
+
+    # 表示连接已断开或网络异常的SQLSTATE前缀
+    DISCONNECT_STATES = ('08', 'HYT')
+
+    def __init__(self, conn_str, max_size=None, acquire_timeout=None, on_connect=None, stats=None):
+        self._conn_str = conn_str
+        self.stats = stats if stats is not None else QUERY_STATS
+        self._on_connect = on_connect  # 新连接建立后调用，参数为连接
+        self.max_size = max_size or DB_POOL_CONFIG['max_size']
+        self._acquire_timeout = acquire_timeout or DB_POOL_CONFIG['acquire_timeout']
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._idle = []  # 空闲连接: (连接, 归还时间)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @classmethod
+    def is_disconnect_error(cls, error):
+        """判断数据库错误是否由连接断开引起"""
+        state = str(error.args[0]) if error.args else ""
+        return state.startswith(cls.DISCONNECT_STATES)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    @staticmethod
+    def _is_healthy(conn):
+        """健康检查"""
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _connect(self):
+        """建立新连接，网络类错误时自动重试"""
+        retries = DB_POOL_CONFIG['connect_retries']
+        for attempt in range(retries + 1):
+            try:
+                conn = InstrumentedConnection(pyodbc.connect(self._conn_str), self.stats)
+                if self._on_connect is not None:
+                    self._on_connect(conn)
+                return conn
+            except pyodbc.Error as e:
+                # 登录失败等错误重试也没有意义
+                if attempt == retries or not self.is_disconnect_error(e):
+                    raise
+                logging.warning(f"数据库连接失败，正在重连 ({attempt + 1}/{retries}): {e}")
+                time.sleep(0.5 * (2 ** attempt))
+
+    def acquire(self):
+        """借出一个连接，用完后必须调用release归还"""
+        if not self._slots.acquire(timeout=self._acquire_timeout):
+            raise PoolTimeoutError("HYT00", f"等待数据库连接超时（连接池上限 {self.max_size}）")
+
+        try:
+            while True:
+                with self._lock:
+                    if self._closed:
+                        raise pyodbc.Error("08003", "连接池已关闭")
+                    idle = self._idle.pop() if self._idle else None
+
+                if idle is None:
+                    return self._connect()
+
+                conn, released_at = idle
+                if time.monotonic() - released_at < DB_POOL_CONFIG['health_check_idle'] or self._is_healthy(conn):
+                    return conn
+
+                logging.warning("丢弃失效的数据库连接")
+                self._close_quietly(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """归还连接，discard为True时直接关闭该连接"""
+        try:
+            if not discard:
+                try:
+                    # 丢弃未提交的事务，保证下一个使用者拿到干净的连接
+                    conn.rollback()
+                except pyodbc.Error:
+                    discard = True
+
+            with self._lock:
+                if discard or self._closed:
+                    self._close_quietly(conn)
+                else:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """借用一个连接，退出with块时自动归还，连接断开时不再放回池中"""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except pyodbc.Error as e:
+            discard = self.is_disconnect_error(e)
+            raise
+        finally:
+            self.release(conn, discard)
+
+    def close_all(self):
+        """关闭连接池中的所有空闲连接"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+
+# 学生、课程基础数据的查询，结果由ReferenceDataCache缓存
+REFERENCE_QUERIES = {
+    'students': "SELECT Sno, name FROM Student ORDER BY Sno",
+    'courses': "SELECT Cno, course_name, Credit FROM Course ORDER BY Cno",
+}
+
+
+class ReferenceDataCache:
+    """学生、课程基础数据的共用缓存
+
+    每类数据有一个版本号，本程序修改这类数据后调用invalidate使版本号加一，下次读取时
+    才重新查询数据库。使用方记下生成下拉框、选择列表等内容时的版本号，
+    版本号没有变化时直接沿用已生成的内容，不需要访问数据库
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._versions = {kind: 0 for kind in REFERENCE_QUERIES}
+        self._rows = {}  # 类别 -> (版本号, 行列表)
+
+    def version(self, kind):
+        return self._versions[kind]
+
+    def is_fresh(self, kind):
+        """缓存中是否有当前版本的数据"""
+        cached = self._rows.get(kind)
+        return cached is not None and cached[0] == self._versions[kind]
+
+    def rows(self, kind):
+        """返回 (版本号, 行列表)，字符串已去掉首尾空格；没有当前版本的数据时查询数据库"""
+        if not self.is_fresh(kind):
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(REFERENCE_QUERIES[kind])
+                self.store(kind, self._versions[kind], cursor.fetchall())
+        return self._rows[kind]
+
+    def store(self, kind, version, rows):
+        """保存其他途径查询到的同一份数据（如后台加载的课程表格），version为开始查询时的版本号"""
+        if version != self._versions[kind]:
+            return  # 查询期间数据已被修改，结果可能已过期
+        rows = [tuple(value.strip() if isinstance(value, str) else value for value in row) for row in rows]
+        self._rows[kind] = (version, rows)
+
+    def patch(self, kind, key, row=None, old_key=None):
+        """本程序修改了一条数据：直接修改缓存中的行（row为None表示删除），不需要重新查询
+
+        版本号同样加一，使用方据此更新各自生成的内容；缓存中没有数据时只增加版本号
+        """
+        fresh = self.is_fresh(kind)
+        self._versions[kind] += 1
+        if not fresh:
+            self._rows.pop(kind, None)
+            return
+        target = key if old_key is None else old_key
+        rows = [existing for existing in self._rows[kind][1] if existing[0] != target]
+        if row is not None:
+            bisect.insort(rows, tuple(row))
+        self._rows[kind] = (self._versions[kind], rows)
+
+    def invalidate(self, *kinds):
+        """数据已被修改，kinds为空时表示全部"""
+        for kind in kinds or list(self._versions):
+            self._versions[kind] += 1
+            self._rows.pop(kind, None)
+
 
 class SearchableComboBox(QComboBox):
     """可搜索的下拉框"""
@@ -91,12 +841,2770 @@ class SearchableComboBox(QComboBox):
         self.showPopup()
 
 
+class ResultStream:
+    """流式读取查询结果
+
+    用fetchmany分批读取，不会把整个结果集一次性放进内存。第一批较小以尽快显示首屏，
+    之后逐步增大到batch_size。同时统计首行耗时和吞吐量（行/秒）。
+    应在执行查询之前创建，这样统计的时间包含服务器执行查询的时间。
+    """
+
+    def __init__(self, cursor, batch_size=None, first_batch_size=None):
+        self.cursor = cursor
+        self.batch_size = batch_size or QUERY_STREAM_CONFIG['batch_size']
+        self.first_batch_size = min(first_batch_size or QUERY_STREAM_CONFIG['first_batch_size'],
+                                    self.batch_size)
+        self.rows = 0  # 已读取的行数
+        self.batches = 0  # 已读取的批数
+        self.first_row_time = None  # 首行耗时（秒）
+        self._started = time.perf_counter()
+        self._finished = None
+
+    def __iter__(self):
+        """逐批返回结果行"""
+        size = self.first_batch_size
+        while True:
+            rows = self.cursor.fetchmany(size)
+            if not rows:
+                break
+
+            if self.first_row_time is None:
+                self.first_row_time = time.perf_counter() - self._started
+            self.rows += len(rows)
+            self.batches += 1
+
+            yield rows
+            size = min(size * 4, self.batch_size)
+
+        self._finished = time.perf_counter()
+
+    def iter_rows(self):
+        """逐行返回结果"""
+        for rows in self:
+            yield from rows
+
+    @property
+    def elapsed(self):
+        """已用时间（秒）"""
+        return (self._finished or time.perf_counter()) - self._started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        """统计信息摘要"""
+        first_row = f"{self.first_row_time * 1000:.0f} 毫秒" if self.first_row_time is not None else "-"
+        return f"{self.rows} 行，首行 {first_row}，耗时 {self.elapsed:.2f} 秒，{self.rows_per_second:.0f} 行/秒"
+
+
+class KeysetPager:
+    """学生成绩按 (学号, 课程号) 键集分页
+
+    不使用OFFSET，而是记住当前页首尾两行的 (学号, 课程号)，翻页时从该位置沿索引继续查找，
+    因此无论翻到第几页，每页查询的代价都只与页大小有关
+    """
+
+    PAGE_QUERY = """
+    SELECT TOP (?) sc.Sno, s.name, sc.Cno, c.Credit, sc.Grade
+    FROM Student_Score sc
+    JOIN Student s ON sc.Sno = s.Sno
+    JOIN Course c ON sc.Cno = c.Cno
+    {where}
+    ORDER BY sc.Sno {order}, sc.Cno {order}
+    """
+
+    def __init__(self, page_size=DEFAULT_PAGE_SIZE):
+        self.page_size = page_size
+        self.first_key = None  # 当前页第一行的 (学号, 课程号)
+        self.last_key = None  # 当前页最后一行的 (学号, 课程号)
+        self.page_number = None  # 当前页码，跳转到学号后未知
+        self.has_next = False
+        self.has_previous = False
+
+    def _query(self, where, params, descending=False):
+        # 多取一行用于判断该方向上是否还有数据
+        order = "DESC" if descending else "ASC"
+        return self.PAGE_QUERY.format(where=where, order=order), [self.page_size + 1, *params]
+
+    def first_page(self):
+        """第一页的查询语句和参数"""
+        return self._query("", ())
+
+    def next_page(self):
+        """下一页的查询语句和参数"""
+        sno, cno = self.last_key
+        return self._query("WHERE sc.Sno > ? OR (sc.Sno = ? AND sc.Cno > ?)", (sno, sno, cno))
+
+    def previous_page(self):
+        """上一页的查询语句和参数（倒序查询，结果需要反转）"""
+        sno, cno = self.first_key
+        return self._query("WHERE sc.Sno < ? OR (sc.Sno = ? AND sc.Cno < ?)", (sno, sno, cno), descending=True)
+
+    def seek(self, sno):
+        """从指定学号开始的一页"""
+        return self._query("WHERE sc.Sno >= ?", (sno,))
+
+    def apply(self, rows, direction, append=False):
+        """处理一页查询结果并更新当前位置，返回按学号、课程号正序排列的本页数据
+
+        direction: "first"、"next"、"previous" 或 "seek"
+        append: 为True时本页数据追加在当前页之后（滚动加载），保留当前页的起始位置
+        """
+        more = len(rows) > self.page_size
+        rows = list(rows[:self.page_size])
+        if direction == "previous":
+            rows.reverse()
+
+        if not rows:
+            if direction == "next":
+                self.has_next = False
+            elif direction == "previous":
+                self.has_previous = False
+            else:
+                self.first_key = self.last_key = None
+                self.has_next = self.has_previous = False
+                self.page_number = 1 if direction == "first" else None
+            return rows
+
+        if direction == "first":
+            self.page_number = 1
+            self.has_previous = False
+            self.has_next = more
+        elif direction == "next":
+            if self.page_number is not None:
+                self.page_number += 1
+            self.has_previous = self.has_previous or not append
+            self.has_next = more
+        elif direction == "previous":
+            if self.page_number is not None:
+                self.page_number = max(self.page_number - 1, 1)
+            self.has_previous = more
+            self.has_next = True
+        else:
+            self.page_number = None
+            self.has_previous = True
+            self.has_next = more
+
+        if not append:
+            self.first_key = (rows[0][0], rows[0][2])
+        self.last_key = (rows[-1][0], rows[-1][2])
+        return rows
+
+
+class BulkScoreImporter:
+    """学生成绩批量导入
+
+    先把数据批量写入会话级临时表，再用基于集合的MERGE语句一次性补充学生、课程并合并成绩，
+    所有操作在同一事务中完成，调用方负责提交。统计结果与逐行导入时一致：
+    同一文件中重复出现的 (学号, 课程号) 第一次计为新增，之后每次计为更新
+    """
+
+    STAGING_TABLE = "#ImportScores"
+    ACTIONS_TABLE = "#MergeActions"
+
+    CREATE_STAGING = """
+    CREATE TABLE #ImportScores (
+        RowNo INT NOT NULL,
+        Sno NVARCHAR(50) COLLATE DATABASE_DEFAULT NOT NULL,
+        name NVARCHAR(100) COLLATE DATABASE_DEFAULT NOT NULL,
+        Cno NVARCHAR(50) COLLATE DATABASE_DEFAULT NOT NULL,
+        course_name NVARCHAR(200) COLLATE DATABASE_DEFAULT NOT NULL,
+        Credit FLOAT NOT NULL,
+        Grade FLOAT NOT NULL
+    )
+    """
+
+    INSERT_STAGING = """
+    INSERT INTO #ImportScores (RowNo, Sno, name, Cno, course_name, Credit, Grade)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+
+    # 同一学号以第一次出现的姓名为准
+    MERGE_STUDENTS = """
+    MERGE Student AS t
+    USING (
+        SELECT Sno, name FROM (
+            SELECT Sno, name, ROW_NUMBER() OVER (PARTITION BY Sno ORDER BY RowNo) AS rn
+            FROM #ImportScores
+        ) AS f WHERE rn = 1
+    ) AS s
+    ON t.Sno = s.Sno
+    WHEN NOT MATCHED BY TARGET THEN
+        INSERT (Sno, name) VALUES (s.Sno, s.name);
+    """
+
+    DELETE_MISSING_STUDENTS = """
+    DELETE i FROM #ImportScores AS i
+    WHERE NOT EXISTS (SELECT 1 FROM Student AS s WHERE s.Sno = i.Sno)
+    """
+
+    # 同一课程号以第一次出现的课程名称和学分为准
+    MERGE_COURSES = """
+    MERGE Course AS t
+    USING (
+        SELECT Cno, course_name, Credit FROM (
+            SELECT Cno,
+                   CASE WHEN course_name = N'' THEN N'[导入]课程' + Cno ELSE course_name END AS course_name,
+                   Credit,
+                   ROW_NUMBER() OVER (PARTITION BY Cno ORDER BY RowNo) AS rn
+            FROM #ImportScores
+        ) AS f WHERE rn = 1
+    ) AS s
+    ON t.Cno = s.Cno
+    WHEN NOT MATCHED BY TARGET THEN
+        INSERT (Cno, course_name, Credit) VALUES (s.Cno, s.course_name, s.Credit);
+    """
+
+    DELETE_MISSING_COURSES = """
+    DELETE i FROM #ImportScores AS i
+    WHERE NOT EXISTS (SELECT 1 FROM Course AS c WHERE c.Cno = i.Cno)
+    """
+
+    CREATE_ACTIONS = """
+    CREATE TABLE #MergeActions (
+        Action NVARCHAR(10) NOT NULL,
+        Occurrences INT NOT NULL
+    )
+    """
+
+    # 更新已存在记录时取最后一次出现的成绩，否则新增记录取第一次出现的成绩。
+    # 目标表上有触发器（如多用户同步的ChangeLog触发器）时，不带INTO的OUTPUT会被拒绝（错误334），
+    # 因此先把每条记录的操作写入临时表，再汇总读取
+    MERGE_SCORES = """
+    MERGE Student_Score AS t
+    USING (
+        SELECT Sno, Cno, Grade, Occurrences FROM (
+            SELECT Sno, Cno, Grade,
+                   COUNT(*) OVER (PARTITION BY Sno, Cno) AS Occurrences,
+                   ROW_NUMBER() OVER (PARTITION BY Sno, Cno ORDER BY RowNo {order}) AS rn
+            FROM #ImportScores
+        ) AS f WHERE rn = 1
+    ) AS s
+    ON t.Sno = s.Sno AND t.Cno = s.Cno
+    {when_matched}
+    WHEN NOT MATCHED BY TARGET THEN
+        INSERT (Sno, Cno, Grade) VALUES (s.Sno, s.Cno, s.Grade)
+    OUTPUT $action, s.Occurrences INTO #MergeActions (Action, Occurrences);
+    """
+
+    # 每种操作的记录数和这些记录在文件中出现的总次数
+    COUNT_ACTIONS = """
+    SELECT Action, COUNT(*), SUM(Occurrences) FROM #MergeActions GROUP BY Action
+    """
+
+    def __init__(self, cursor, update_existing=True, add_missing_students=True, add_missing_courses=True,
+                 batch_size=None):
+        self.cursor = cursor
+        self.update_existing = update_existing
+        self.add_missing_students = add_missing_students
+        self.add_missing_courses = add_missing_courses
+        self.batch_size = batch_size or BULK_IMPORT_CONFIG['stage_batch_size']
+        self.staged = 0
+        self.imported = 0
+        self.updated = 0
+        self.errors = 0
+
+    def begin(self):
+        """创建暂存表（连接是复用的，先清理上次可能残留的同名临时表）"""
+        for table in (self.STAGING_TABLE, self.ACTIONS_TABLE):
+            self.cursor.execute(f"IF OBJECT_ID('tempdb..{table}') IS NOT NULL DROP TABLE {table}")
+        self.cursor.execute(self.CREATE_STAGING)
+        self.cursor.execute(self.CREATE_ACTIONS)
+        # 参数数组一次性发送，而不是每行一次往返
+        self.cursor.fast_executemany = True
+
+    def stage(self, rows):
+        """写入一批已清洗的数据
+
+        rows: (行号, 学号, 姓名, 课程号, 课程名称, 学分, 成绩) 元组的可迭代对象
+        """
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        self.cursor.executemany(self.INSERT_STAGING, batch)
+        self.staged += len(batch)
+
+    def apply(self):
+        """把暂存表中的数据合并到学生、课程和成绩表，返回 (新增, 更新, 错误) 记录数"""
+        cursor = self.cursor
+
+        if self.add_missing_students:
+            cursor.execute(self.MERGE_STUDENTS)
+        cursor.execute(self.DELETE_MISSING_STUDENTS)
+        if cursor.rowcount > 0:
+            logging.warning(f"{cursor.rowcount} 条记录的学生不存在且未选择自动添加")
+            self.errors += cursor.rowcount
+
+        if self.add_missing_courses:
+            cursor.execute(self.MERGE_COURSES)
+        cursor.execute(self.DELETE_MISSING_COURSES)
+        if cursor.rowcount > 0:
+            logging.warning(f"{cursor.rowcount} 条记录的课程不存在且未选择自动添加")
+            self.errors += cursor.rowcount
+
+        if self.update_existing:
+            query = self.MERGE_SCORES.format(
+                order="DESC", when_matched="WHEN MATCHED THEN UPDATE SET t.Grade = s.Grade")
+        else:
+            query = self.MERGE_SCORES.format(order="ASC", when_matched="")
+        cursor.execute(query)
+
+        cursor.execute(self.COUNT_ACTIONS)
+        for action, records, occurrences in cursor.fetchall():
+            if action == "INSERT":
+                self.imported += records
+                # 文件中重复的记录在逐行导入时会依次更新
+                if self.update_existing:
+                    self.updated += occurrences - records
+            else:
+                self.updated += occurrences
+
+        cursor.execute(f"DROP TABLE {self.STAGING_TABLE}")
+        cursor.execute(f"DROP TABLE {self.ACTIONS_TABLE}")
+        return self.imported, self.updated, self.errors
+
+
+class ScoreImportReader:
+    """分块读取学生成绩导入文件
+
+    .xlsx 使用openpyxl只读模式逐行读取，.csv 使用pandas分块读取，内存占用只与块大小有关；
+    .xls 格式不支持流式读取，整表读入后再分块。每块是使用标准列名的DataFrame，
+    索引为数据行序号（Excel行号减2），可直接用于校验和写入
+    """
+
+    def __init__(self, file_path, chunk_size=None):
+        self.file_path = file_path
+        self.chunk_size = chunk_size or BULK_IMPORT_CONFIG['read_chunk_size']
+        extension = os.path.splitext(file_path)[1].lower()
+        self.kind = {'.csv': 'csv', '.xls': 'xls'}.get(extension, 'xlsx')
+        self.encoding = detect_csv_encoding(file_path) if self.kind == 'csv' else None
+        self.headers = self._read_headers()
+        self.matched_columns = match_import_columns(self.headers)
+
+    @property
+    def missing_columns(self):
+        return [col for col in IMPORT_REQUIRED_COLUMNS if col not in self.matched_columns]
+
+    def _read_headers(self):
+        if self.kind == 'csv':
+            return list(pd.read_csv(self.file_path, nrows=0, encoding=self.encoding).columns)
+        if self.kind == 'xls':
+            return list(pd.read_excel(self.file_path, nrows=0).columns)
+
+        import openpyxl
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            header = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+        return ["" if value is None else value for value in header]
+
+    def chunks(self):
+        """逐块返回使用标准列名的数据"""
+        if self.kind == 'xlsx':
+            yield from self._xlsx_chunks()
+            return
+
+        names = [self.headers[self.matched_columns[col]] for col in IMPORT_REQUIRED_COLUMNS]
+        if self.kind == 'csv':
+            # 全部按文本读取，保留学号前导零，数字由校验阶段统一转换
+            reader = pd.read_csv(self.file_path, encoding=self.encoding, dtype=str,
+                                 keep_default_na=False, chunksize=self.chunk_size)
+            for chunk in reader:
+                yield self._standardize(chunk[names])
+        else:
+            df = pd.read_excel(self.file_path)[names]
+            for start in range(0, len(df), self.chunk_size):
+                yield self._standardize(df.iloc[start:start + self.chunk_size])
+
+    @staticmethod
+    def _standardize(chunk):
+        chunk = chunk.copy()
+        chunk.columns = IMPORT_REQUIRED_COLUMNS
+        return chunk
+
+    def _xlsx_chunks(self):
+        import openpyxl
+        positions = [self.matched_columns[col] for col in IMPORT_REQUIRED_COLUMNS]
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            records = []
+            indexes = []
+            for index, row in enumerate(workbook.active.iter_rows(min_row=2, values_only=True)):
+                # 只读模式下工作表末尾可能有格式残留的空行
+                if all(value is None for value in row):
+                    continue
+                records.append(tuple(row[p] if p < len(row) else None for p in positions))
+                indexes.append(index)
+                if len(records) >= self.chunk_size:
+                    yield pd.DataFrame(records, columns=IMPORT_REQUIRED_COLUMNS, index=indexes)
+                    records = []
+                    indexes = []
+            if records:
+                yield pd.DataFrame(records, columns=IMPORT_REQUIRED_COLUMNS, index=indexes)
+        finally:
+            workbook.close()
+
+
+class ExcelExportWriter:
+    """流式写入Excel文件
+
+    使用openpyxl只写模式，数据行直接写入临时文件而不在内存中保留整张表；
+    表头和数据单元格共用两个命名样式，不再为每个单元格单独创建边框和对齐对象。
+    数据超过单张工作表的行数上限时自动续写到新的工作表
+    """
+
+    HEADER_STYLE = "export_header"
+    CELL_STYLE = "export_cell"
+
+    def __init__(self, file_path, max_sheet_rows=EXCEL_MAX_SHEET_ROWS):
+        import openpyxl
+        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+
+        self.file_path = file_path
+        self.max_sheet_rows = max_sheet_rows
+        self.workbook = openpyxl.Workbook(write_only=True)
+
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+        header_style = NamedStyle(name=self.HEADER_STYLE)
+        header_style.font = Font(bold=True, color="FFFFFF")
+        header_style.fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+        header_style.alignment = Alignment(horizontal="center", vertical="center")
+        header_style.border = border
+
+        cell_style = NamedStyle(name=self.CELL_STYLE)
+        cell_style.alignment = Alignment(horizontal="center")
+        cell_style.border = border
+
+        self.workbook.add_named_style(header_style)
+        self.workbook.add_named_style(cell_style)
+
+    def add_sheet(self, title, headers, batches, format_row=None, on_progress=None):
+        """新建工作表并写入数据，返回写入的数据行数
+
+        batches: 数据行批次的可迭代对象（如ResultStream）
+        format_row: 写入前转换每行数据的函数
+        on_progress: 每写完一批调用一次，参数为已写入行数
+        """
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.utils import get_column_letter
+
+        batches = iter(batches)
+
+        # 采样开头的数据行计算列宽
+        sample = []
+        for batch in batches:
+            sample.extend(format_row(record) if format_row else list(record) for record in batch)
+            if len(sample) >= EXPORT_WIDTH_SAMPLE_ROWS:
+                break
+
+        widths = []
+        for i, header in enumerate(headers):
+            widths.append(max([len(str(header))] + [len(str(row[i])) for row in sample]) + 4)
+
+        sheet = None
+        sheet_rows = 0
+        sheet_count = 0
+
+        def styled(values, style):
+            cells = []
+            for value in values:
+                cell = WriteOnlyCell(sheet, value=value)
+                cell.style = style
+                cells.append(cell)
+            return cells
+
+        def new_sheet():
+            # 第一张使用指定的名称，续表依次命名为 "名称(2)"、"名称(3)"...
+            nonlocal sheet, sheet_rows, sheet_count
+            sheet_count += 1
+            sheet = self.workbook.create_sheet(title if sheet_count == 1 else f"{title}({sheet_count})")
+            for i, width in enumerate(widths):
+                sheet.column_dimensions[get_column_letter(i + 1)].width = width
+            sheet.append(styled(headers, self.HEADER_STYLE))
+            sheet_rows = 1
+
+        def append(row):
+            nonlocal sheet_rows
+            # 超过单张工作表的行数上限时写入续表
+            if sheet_rows >= self.max_sheet_rows:
+                new_sheet()
+            sheet.append(styled(row, self.CELL_STYLE))
+            sheet_rows += 1
+
+        # 没有数据时也写出只有表头的工作表
+        new_sheet()
+        for row in sample:
+            append(row)
+        written = len(sample)
+        if on_progress:
+            on_progress(written)
+
+        for batch in batches:
+            for record in batch:
+                append(format_row(record) if format_row else record)
+            written += len(batch)
+            if on_progress:
+                on_progress(written)
+
+        return written
+
+    def save(self):
+        self.workbook.save(self.file_path)
+
+
+class PrefetchStream:
+    """在后台线程执行查询并预读结果批次
+
+    多个查询可以同时在服务器上执行，调用方按顺序逐个消费；
+    预读的批次数有上限，消费较慢时查询线程等待，内存占用不会随结果增长
+    """
+
+    _END = object()
+
+    def __init__(self, pool, query, params=(), max_batches=EXPORT_PREFETCH_BATCHES):
+        self.pool = pool
+        self.query = query
+        self.params = params
+        self._queue = queue.Queue(max_batches)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        # 定期检查是否已关闭，避免消费方放弃后线程一直阻塞并占用连接
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(self.query, self.params)
+                for batch in ResultStream(cursor):
+                    if not self._put(batch):
+                        return
+                cursor.close()
+            self._put(self._END)
+        except Exception as e:
+            self._put(e)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self, timeout=5):
+        """停止预读并等待查询线程归还连接"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+class CsvExportWriter:
+    """流式写入CSV文件，可选gzip压缩
+
+    使用带BOM的UTF-8编码，Excel可以直接打开中文内容；CSV没有工作表，每个文件只写一张表
+    """
+
+    def __init__(self, file_path, compress=False):
+        self.file_path = file_path
+        self.compress = compress
+
+    def add_sheet(self, title, headers, batches, format_row=None, on_progress=None):
+        """写入表头和数据，返回写入的数据行数（title仅为与Excel导出保持一致）"""
+        import csv
+        import gzip
+
+        opener = gzip.open if self.compress else open
+        written = 0
+        with opener(self.file_path, 'wt', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            for batch in batches:
+                if format_row:
+                    batch = [format_row(record) for record in batch]
+                writer.writerows(batch)
+                written += len(batch)
+                if on_progress:
+                    on_progress(written)
+        return written
+
+    def save(self):
+        """数据在add_sheet中已写入文件"""
+
+
+class ParquetExportWriter:
+    """流式写入Parquet文件（需要安装pyarrow）
+
+    每累计一定行数写出一个行组，列类型由 EXPORT_QUERIES 中的 parquet_types 指定，
+    不随每批数据的内容变化
+    """
+
+    def __init__(self, file_path, column_types):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("导出Parquet文件需要安装pyarrow（pip install pyarrow）")
+
+        self.file_path = file_path
+        self.column_types = column_types
+
+    def _table(self, rows, schema):
+        import pyarrow as pa
+
+        columns = list(zip(*rows)) if rows else [()] * len(schema)
+        arrays = []
+        for values, field in zip(columns, schema):
+            # 数据库返回的Decimal需要先转换为float
+            if pa.types.is_floating(field.type):
+                values = [None if v is None else float(v) for v in values]
+            elif pa.types.is_integer(field.type):
+                values = [None if v is None else int(v) for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def add_sheet(self, title, headers, batches, format_row=None, on_progress=None):
+        """写入数据，返回写入的数据行数（title仅为与Excel导出保持一致）"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(header, pa.type_for_alias(column_type))
+                            for header, column_type in zip(headers, self.column_types)])
+        written = 0
+        pending = []
+        with pq.ParquetWriter(self.file_path, schema) as writer:
+            for batch in batches:
+                if format_row:
+                    batch = [format_row(record) for record in batch]
+                pending.extend(batch)
+                written += len(batch)
+                if len(pending) >= EXPORT_PARQUET_ROW_GROUP_SIZE:
+                    writer.write_table(self._table(pending, schema))
+                    pending = []
+                if on_progress:
+                    on_progress(written)
+            if pending or written == 0:
+                writer.write_table(self._table(pending, schema))
+        return written
+
+    def save(self):
+        """数据在add_sheet中已写入文件"""
+
+
+def create_export_writer(file_path, spec):
+    """按文件扩展名创建导出写入器，返回 (写入器, 行格式化函数)"""
+    lower_path = file_path.lower()
+    if lower_path.endswith('.csv.gz'):
+        writer = CsvExportWriter(file_path, compress=True)
+    elif lower_path.endswith('.csv'):
+        writer = CsvExportWriter(file_path)
+    elif lower_path.endswith('.parquet'):
+        writer = ParquetExportWriter(file_path, spec['parquet_types'])
+        return writer, lambda record: format_export_row(record, spec, integral=False)
+    else:
+        writer = ExcelExportWriter(file_path)
+    return writer, lambda record: format_export_row(record, spec)
+
+
+def render_course_report(directory, cno, course_name, credit, rows):
+    """生成一门课程的成绩报表文件（在进程池中执行，不能使用界面相关的对象）
+
+    rows: (学号, 姓名, 成绩) 元组列表，已按成绩从高到低排序
+    返回该课程的统计信息，用于生成汇总表
+    """
+    safe_name = re.sub(r'[\\/:*?"<>|]', '_', course_name)
+    file_name = f"{cno}_{safe_name}.xlsx"
+
+    grades = [float(row[2]) for row in rows if row[2] is not None]
+    summary = {
+        'cno': cno,
+        'course_name': course_name,
+        'credit': credit,
+        'count': len(rows),
+        'highest': max(grades) if grades else None,
+        'lowest': min(grades) if grades else None,
+        'average': round(sum(grades) / len(grades), 2) if grades else None,
+        'file_name': file_name,
+    }
+
+    spec = {'integral_columns': (2,), 'round_columns': (), 'null_as_zero': False}
+    writer = ExcelExportWriter(os.path.join(directory, file_name))
+    writer.add_sheet("成绩", ["学号", "姓名", "成绩"], [rows], lambda record: format_export_row(record, spec))
+    writer.add_sheet("统计", ["项目", "数值"], [[
+        ("课程号", cno),
+        ("课程名称", course_name),
+        ("学分", credit),
+        ("选课人数", summary['count']),
+        ("最高成绩", summary['highest']),
+        ("最低成绩", summary['lowest']),
+        ("平均成绩", summary['average']),
+    ]])
+    writer.save()
+    return summary
+
+
+def is_cancel_error(error):
+    """语句被cursor.cancel()中断时的错误（SQLSTATE HY008），后台任务据此区分取消和出错"""
+    return isinstance(error, pyodbc.Error) and bool(error.args) and str(error.args[0]) == "HY008"
+
+
+class QueryWorkerSignals(QObject):
+    """后台查询的信号（QRunnable本身不能发出信号）"""
+
+    rows_ready = pyqtSignal(object)  # 一批结果行
+    progress = pyqtSignal(int, float)  # 已接收行数、吞吐量（行/秒）
+    finished = pyqtSignal(object)  # 查询完成，参数为ResultStream（包含行数和耗时统计）
+    failed = pyqtSignal(object)  # 查询出错，参数为异常对象
+    done = pyqtSignal()  # 无论成功、失败还是取消，最后都会发出
+
+
+class QueryWorker(QRunnable):
+    """在线程池中执行一条查询，借用独立的数据库连接，结果分批送回界面"""
+
+    def __init__(self, pool, query, params=(), batch_size=None):
+        super().__init__()
+        self.pool = pool
+        self.query = query
+        self.params = params
+        self.batch_size = batch_size
+        self.signals = QueryWorkerSignals()
+        self._cancelled = False
+        self._cursor = None
+
+    def cancel(self):
+        """取消查询，正在服务器上执行的语句会被中断，之后不再发出结果信号"""
+        self._cancelled = True
+        cursor = self._cursor
+        if cursor is not None:
+            try:
+                cursor.cancel()
+            except Exception as e:
+                logging.debug(f"中断查询语句失败: {e}")
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        try:
+            with self.pool.connection() as conn:
+                self._cursor = cursor = conn.cursor()
+                if self._cancelled:
+                    return
+                stream = ResultStream(cursor, self.batch_size)
+                cursor.execute(self.query, self.params)
+                for rows in stream:
+                    if self._cancelled:
+                        break
+                    self.signals.rows_ready.emit(rows)
+                    self.signals.progress.emit(stream.rows, stream.rows_per_second)
+                cursor.close()
+
+            if not self._cancelled:
+                logging.debug(f"后台查询完成: {stream.summary()}")
+                self.signals.finished.emit(stream)
+        except Exception as e:
+            if not self._cancelled:
+                self.signals.failed.emit(e)
+        finally:
+            self.signals.done.emit()
+
+
+class ImportWorkerSignals(QObject):
+    """后台导入的信号"""
+
+    stage = pyqtSignal(str)  # 当前阶段说明
+    progress = pyqtSignal(int, int)  # 已处理行数、总行数（读取文件阶段总行数未知，为0）
+    finished = pyqtSignal(object)  # 完成，导入时参数为 (新增, 更新, 错误) 记录数，读取文件时为ImportAnalysis
+    failed = pyqtSignal(object)  # 导入出错，参数为异常对象
+    cancelled = pyqtSignal()  # 导入已取消，事务已回滚
+    done = pyqtSignal()  # 无论成功、失败还是取消，最后都会发出
+
+
+class ImportAnalysis:
+    """导入文件的读取和校验结果，读到的数据块交给ImportWorker写入数据库，不再重新读取文件"""
+
+    MAX_ERRORS = 10  # 只保留前几条错误说明
+    PREVIEW_ROWS = 10
+
+    def __init__(self, missing_columns):
+        self.missing_columns = missing_columns  # 文件中缺少的必要列
+        self.chunks = []  # 使用标准列名的数据块
+        self.total_rows = 0
+        self.preview = pd.DataFrame(columns=IMPORT_REQUIRED_COLUMNS)
+        self.errors = []
+        self.error_count = 0
+
+    def add_chunk(self, chunk):
+        """加入一块数据并按列向量化校验"""
+        if not self.chunks:
+            self.preview = chunk.head(self.PREVIEW_ROWS)
+        self.chunks.append(chunk)
+        self.total_rows += len(chunk)
+
+        chunk_errors = format_validation_errors(validate_score_frame(chunk))
+        self.error_count += len(chunk_errors)
+        self.errors.extend(chunk_errors[:self.MAX_ERRORS - len(self.errors)])
+
+
+class ImportAnalysisWorker(QRunnable):
+    """在线程池中读取并校验学生成绩导入文件，取消时在两块数据之间停止读取"""
+
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+        self.signals = ImportWorkerSignals()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        try:
+            self.signals.stage.emit("正在读取文件...")
+            reader = ScoreImportReader(self.file_path)
+            analysis = ImportAnalysis(reader.missing_columns)
+            if not analysis.missing_columns:
+                self.signals.stage.emit("正在分析数据...")
+                for chunk in reader.chunks():
+                    if self._cancelled:
+                        break
+                    analysis.add_chunk(chunk)
+                    self.signals.progress.emit(analysis.total_rows, 0)
+
+            if self._cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(analysis)
+        except Exception as e:
+            if self._cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.failed.emit(e)
+        finally:
+            self.signals.done.emit()
+
+
+class ImportWorker(QRunnable):
+    """在线程池中执行学生成绩导入
+
+    把ImportAnalysisWorker读取并校验过的数据块写入暂存表，再合并到正式表，全部在一个事务中完成；
+    取消时中断正在执行的语句，不提交事务，连接归还连接池时回滚
+    """
+
+    def __init__(self, pool, chunks, total_rows, update_existing=True, add_missing_students=True,
+                 add_missing_courses=True):
+        super().__init__()
+        self.pool = pool
+        self.chunks = chunks
+        self.total_rows = total_rows
+        self.options = {
+            'update_existing': update_existing,
+            'add_missing_students': add_missing_students,
+            'add_missing_courses': add_missing_courses,
+        }
+        self.signals = ImportWorkerSignals()
+        self._cancelled = False
+        self._cursor = None
+
+    def cancel(self):
+        """取消导入，正在执行的数据库语句会被中断"""
+        self._cancelled = True
+        cursor = self._cursor
+        if cursor is not None:
+            try:
+                cursor.cancel()
+            except Exception as e:
+                logging.debug(f"中断导入语句失败: {e}")
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        committed = False
+        try:
+            with self.pool.connection() as conn:
+                self._cursor = cursor = conn.cursor()
+                importer = BulkScoreImporter(cursor, **self.options)
+                importer.begin()
+
+                # 逐块清理数据后写入暂存表，课程号格式错误的行计为错误记录
+                self.signals.stage.emit("正在写入数据...")
+                processed = 0
+                for chunk in self.chunks:
+                    if self._cancelled:
+                        break
+                    rows, invalid = score_import_rows(chunk)
+                    importer.errors += invalid
+                    importer.stage(rows)
+
+                    processed += len(chunk)
+                    self.signals.progress.emit(processed, self.total_rows)
+
+                if not self._cancelled:
+                    self.signals.stage.emit("正在合并数据...")
+                    result = importer.apply()
+
+                # 是否提交只在这里判断一次，之后的结果以committed为准：提交之后才到达的取消请求
+                # 不再影响结果；已取消时不提交，事务在连接归还时回滚
+                if not self._cancelled:
+                    conn.commit()
+                    committed = True
+                self._cursor = None
+
+            if committed:
+                self.signals.finished.emit(result)
+            else:
+                logging.info("导入已取消，事务已回滚")
+                self.signals.cancelled.emit()
+        except Exception as e:
+            # 只有被取消请求中断的语句才算取消，点击取消之后发生的其他错误仍按出错报告
+            if not committed and self._cancelled and is_cancel_error(e):
+                logging.info(f"导入已取消，事务已回滚: {e}")
+                self.signals.cancelled.emit()
+            else:
+                self.signals.failed.emit(e)
+        finally:
+            self._cursor = None
+            self.signals.done.emit()
+
+
+class ImportProgressDialog(QDialog):
+    """导入进度对话框，显示已处理行数、速度和预计剩余时间
+
+    对话框不是模态的，导入期间可以继续使用主窗口。
+    total_rows为None时用于读取和校验文件阶段：总行数未知，进度条显示为忙碌状态，只显示已读取行数和速度
+    """
+
+    cancel_requested = pyqtSignal()
+
+    def __init__(self, total_rows=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("导入中...")
+        self.setMinimumWidth(380)
+        self.total_rows = total_rows
+        self.start_time = time.monotonic()
+        self._finished = False
+
+        layout = QVBoxLayout(self)
+        self.stage_label = QLabel("正在准备导入...")
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0 if total_rows is None else max(total_rows, 1))
+        self.progress_bar.setValue(0)
+        self.rows_label = QLabel("已读取 0 行" if total_rows is None else f"已处理 0/{total_rows} 行")
+        self.speed_label = QLabel("速度: -    预计剩余: -")
+
+        self.cancel_btn = QPushButton("取消导入")
+        self.cancel_btn.clicked.connect(self.reject)
+
+        layout.addWidget(self.stage_label)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.rows_label)
+        layout.addWidget(self.speed_label)
+        layout.addWidget(self.cancel_btn, alignment=Qt.AlignRight)
+
+    @staticmethod
+    def format_duration(seconds):
+        """把秒数格式化为 "X分Y秒" """
+        seconds = int(seconds)
+        if seconds >= 60:
+            return f"{seconds // 60}分{seconds % 60}秒"
+        return f"{seconds}秒"
+
+    def set_stage(self, text):
+        """切换阶段；合并阶段无法获得进度，进度条显示为忙碌状态"""
+        self.stage_label.setText(text)
+        if text.startswith("正在合并"):
+            self.progress_bar.setRange(0, 0)
+            self.speed_label.setText(f"已用时间: {self.format_duration(time.monotonic() - self.start_time)}")
+
+    def update_progress(self, processed, total):
+        """更新已处理行数、速度和预计剩余时间，total为0表示总行数未知"""
+        elapsed = time.monotonic() - self.start_time
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        if not total:
+            self.rows_label.setText(f"已读取 {processed} 行")
+            self.speed_label.setText(f"速度: {rate:.0f} 行/秒")
+            return
+        self.progress_bar.setValue(min(processed, self.progress_bar.maximum()))
+        self.rows_label.setText(f"已处理 {processed}/{total} 行")
+        if rate > 0:
+            eta = self.format_duration(max(total - processed, 0) / rate)
+            self.speed_label.setText(f"速度: {rate:.0f} 行/秒    预计剩余: {eta}")
+
+    def reject(self):
+        """点击取消或关闭窗口时请求取消导入，导入线程结束后再关闭对话框"""
+        if self._finished:
+            super().reject()
+            return
+        self.cancel_btn.setEnabled(False)
+        if self.total_rows is None:
+            self.stage_label.setText("正在取消导入，等待读取线程结束...")
+        else:
+            self.stage_label.setText("正在取消导入，等待事务回滚...")
+        self.cancel_requested.emit()
+
+    def finish(self):
+        """导入线程结束后关闭对话框"""
+        self._finished = True
+        self.accept()
+
+
+class CourseReportWorkerSignals(QObject):
+    """按课程导出报表的信号"""
+
+    progress = pyqtSignal(int, int)  # 已生成的报表数、已读取的课程数
+    finished = pyqtSignal(object)  # 导出完成，参数为生成的课程报表数
+    failed = pyqtSignal(object)  # 导出出错，参数为异常对象
+    cancelled = pyqtSignal()  # 导出已取消
+    done = pyqtSignal()  # 无论成功、失败还是取消，最后都会发出
+
+
+class CourseReportWorker(QRunnable):
+    """在线程池中按课程导出成绩报表
+
+    成绩按课程号顺序读取，一门课程读完就提交给进程池生成报表文件，全部完成后生成课程汇总表；
+    取消时中断查询、撤销还未开始的报表任务，已经生成的报表文件保留
+    """
+
+    def __init__(self, pool, directory):
+        super().__init__()
+        self.pool = pool
+        self.directory = directory
+        self.signals = CourseReportWorkerSignals()
+        self._cancelled = False
+        self._cursor = None
+
+    def cancel(self):
+        """取消导出，正在执行的查询会被中断"""
+        self._cancelled = True
+        cursor = self._cursor
+        if cursor is not None:
+            try:
+                cursor.cancel()
+            except Exception as e:
+                logging.debug(f"中断导出查询失败: {e}")
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    @staticmethod
+    def courses(cursor):
+        """按课程分组读取查询结果，逐门返回 ((课程号, 课程名称, 学分), [(学号, 姓名, 成绩), ...])"""
+        course = None
+        rows = []
+        for record in ResultStream(cursor).iter_rows():
+            cno = record[0].strip()
+            if course is None or cno != course[0]:
+                if rows:
+                    yield course, rows
+                course = (cno, record[1].strip(), record[2])
+                rows = []
+            rows.append((record[3].strip(), record[4].strip(), record[5]))
+        if rows:
+            yield course, rows
+
+    def write_summary(self, summaries):
+        """生成课程汇总表"""
+        summaries.sort(key=lambda item: item['cno'])
+        writer = ExcelExportWriter(os.path.join(self.directory, "课程汇总.xlsx"))
+        writer.add_sheet(
+            "课程汇总",
+            ["课程号", "课程名称", "学分", "选课人数", "最高成绩", "最低成绩", "平均成绩", "报表文件"],
+            [[(s['cno'], s['course_name'], s['credit'], s['count'], s['highest'], s['lowest'], s['average'],
+               s['file_name']) for s in summaries]],
+            lambda record: format_export_row(
+                record, {'integral_columns': (2, 4, 5), 'round_columns': (), 'null_as_zero': False})
+        )
+        writer.save()
+
+    def run(self):
+        summaries = []
+        try:
+            workers = os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = set()
+                submitted = 0
+                try:
+                    with self.pool.connection() as conn:
+                        self._cursor = cursor = conn.cursor()
+                        if not self._cancelled:
+                            cursor.execute(COURSE_REPORT_QUERY)
+                            for (cno, course_name, credit), rows in self.courses(cursor):
+                                if self._cancelled:
+                                    break
+                                if len(pending) >= workers * COURSE_REPORT_QUEUE_PER_WORKER:
+                                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                                    summaries.extend(future.result() for future in done)
+                                    self.signals.progress.emit(len(summaries), submitted)
+                                pending.add(executor.submit(render_course_report, self.directory, cno, course_name,
+                                                            credit, rows))
+                                submitted += 1
+                        self._cursor = None
+
+                    if not self._cancelled:
+                        for future in as_completed(pending):
+                            summaries.append(future.result())
+                            self.signals.progress.emit(len(summaries), submitted)
+                finally:
+                    # 取消或出错时，还未开始的报表任务不再执行，正在生成的等它完成
+                    for future in pending:
+                        future.cancel()
+
+            if self._cancelled:
+                logging.info(f"按课程导出已取消，已生成 {len(summaries)} 门课程的报表")
+                self.signals.cancelled.emit()
+            else:
+                self.write_summary(summaries)
+                self.signals.finished.emit(len(summaries))
+        except Exception as e:
+            if self._cancelled and is_cancel_error(e):
+                logging.info(f"按课程导出已取消: {e}")
+                self.signals.cancelled.emit()
+            else:
+                self.signals.failed.emit(e)
+        finally:
+            self._cursor = None
+            self.signals.done.emit()
+
+
+class QueryStatsDialog(QDialog):
+    """数据库查询统计：按语句显示调用次数、返回行数、执行和读取耗时及p50/p95/p99，默认按总耗时排序"""
+
+    HEADERS = ["语句", "次数", "出错", "参数", "平均行数", "执行(毫秒)", "读取(毫秒)",
+               "P50(毫秒)", "P95(毫秒)", "P99(毫秒)", "最大(毫秒)", "总耗时(秒)"]
+
+    def __init__(self, stats, parent=None):
+        super().__init__(parent)
+        self.stats = stats
+        self.setWindowTitle("数据库查询统计")
+        self.resize(1100, 500)
+
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel()
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+
+        refresh_btn = QPushButton("刷新")
+        refresh_btn.clicked.connect(self.refresh)
+        threshold_btn = QPushButton("慢查询阈值...")
+        threshold_btn.clicked.connect(self.set_threshold)
+        reset_btn = QPushButton("清空统计")
+        reset_btn.clicked.connect(self.reset)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.close)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(refresh_btn)
+        buttons.addWidget(threshold_btn)
+        buttons.addWidget(reset_btn)
+        buttons.addStretch()
+        buttons.addWidget(close_btn)
+
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+        self.refresh()
+
+    @staticmethod
+    def number_item(value):
+        """按数值排序的单元格"""
+        item = QTableWidgetItem()
+        item.setData(Qt.DisplayRole, round(value, 1) if isinstance(value, float) else value)
+        return item
+
+    def refresh(self):
+        entries = self.stats.snapshot()
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(entries))
+        for row, entry in enumerate(entries):
+            latency = entry.latency
+            item = QTableWidgetItem(entry.fingerprint)
+            item.setToolTip(entry.fingerprint)
+            self.table.setItem(row, 0, item)
+            values = (entry.calls, entry.errors, entry.params, entry.rows / entry.calls,
+                      entry.execute_ms / entry.calls, entry.fetch_ms / entry.calls,
+                      latency.percentile(50), latency.percentile(95), latency.percentile(99), latency.max,
+                      round(latency.total / 1000, 2))
+            for column, value in enumerate(values, start=1):
+                self.table.setItem(row, column, self.number_item(value))
+        self.table.setSortingEnabled(True)
+
+        calls = sum(entry.calls for entry in entries)
+        total = sum(entry.latency.total for entry in entries) / 1000
+        self.summary_label.setText(f"{len(entries)} 种语句，共 {calls} 次调用，总耗时 {total:.2f} 秒；"
+                                   f"超过 {QUERY_STATS_CONFIG['slow_query_ms']} 毫秒的调用记录在 "
+                                   f"logs/slow_queries.log")
+
+    def set_threshold(self):
+        value, ok = QInputDialog.getInt(self, "慢查询阈值", "执行加读取结果超过多少毫秒记为慢查询：",
+                                        QUERY_STATS_CONFIG['slow_query_ms'], 1, 3600000)
+        if ok:
+            QUERY_STATS_CONFIG['slow_query_ms'] = value
+            self.refresh()
+
+    def reset(self):
+        self.stats.reset()
+        self.refresh()
+
+
+class QueryExecutor(QObject):
+    """后台查询执行器，使用QThreadPool执行查询，避免阻塞界面"""
+
+    def __init__(self, pool, parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self._thread_pool = QThreadPool(self)
+        self._thread_pool.setMaxThreadCount(pool.max_size)
+        self._workers = set()  # 保持对执行中任务的引用
+
+    def submit(self, query, params=(), on_rows=None, on_finished=None, on_failed=None, on_done=None,
+               on_progress=None, batch_size=None):
+        """提交查询，返回QueryWorker
+
+        回调在任务开始前连接到信号上，避免查询很快完成时漏掉结果
+        """
+        worker = QueryWorker(self.pool, query, params, batch_size)
+
+        signals = worker.signals
+        for signal, callback in ((signals.rows_ready, on_rows), (signals.finished, on_finished),
+                                 (signals.failed, on_failed), (signals.done, on_done),
+                                 (signals.progress, on_progress)):
+            if callback is not None:
+                signal.connect(callback)
+        return self.start(worker)
+
+    def start(self, worker):
+        """在线程池中启动任务（需要有cancel方法和带done信号的signals），返回该任务"""
+        worker.setAutoDelete(False)
+        worker.signals.done.connect(lambda: self._workers.discard(worker))
+
+        self._workers.add(worker)
+        self._thread_pool.start(worker)
+        return worker
+
+    def shutdown(self, timeout=3000):
+        """取消所有查询并等待线程结束"""
+        for worker in list(self._workers):
+            worker.cancel()
+        self._thread_pool.clear()
+        self._thread_pool.waitForDone(timeout)
+
+
+class NgramIndex:
+    """字符串包含搜索用的n-gram倒排索引
+
+    每个字符串按1到n个字符切分出全部片段，记录片段 -> 包含它的键。按字符切分，
+    中文姓名和课程名称同样适用。不超过n个字符的搜索词本身就是一个片段，直接查表；
+    更长的搜索词取各个n字片段的键集合求交集，再逐个核对候选，
+    只需检查少量候选而不是扫描全部字符串。比较不区分大小写
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self.postings = {}  # 片段 -> 键集合
+        self.texts = {}  # 键 -> 转换为小写后的字符串
+
+    def _grams(self, text, size):
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    def add(self, key, text):
+        text = text.casefold()
+        self.texts[key] = text
+        for size in range(1, self.n + 1):
+            for gram in self._grams(text, size):
+                self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key, text):
+        text = self.texts.pop(key, text.casefold())
+        for size in range(1, self.n + 1):
+            for gram in self._grams(text, size):
+                keys = self.postings.get(gram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.postings[gram]
+
+    def search(self, text):
+        """返回包含text的全部键"""
+        text = text.casefold()
+        if not text:
+            return set(self.texts)
+        if len(text) <= self.n:
+            return set(self.postings.get(text, ()))
+
+        # 从键最少的片段开始求交集，候选集合尽快缩小
+        grams = sorted(self._grams(text, self.n), key=lambda gram: len(self.postings.get(gram, ())))
+        candidates = set(self.postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not candidates:
+                break
+            candidates &= self.postings.get(gram, set())
+        return {key for key in candidates if text in self.texts[key]}
+
+
+# 拼音转换缓存：字符 -> 不带声调的拼音
+_PINYIN_CACHE = {}
+
+
+def text_to_pinyin(text):
+    """返回 (全拼, 拼音首字母)，未安装pypinyin时返回None
+
+    逐字转换并缓存结果，姓名用字有限，大量姓名转换时基本只需查缓存
+    """
+    if lazy_pinyin is None:
+        return None
+
+    syllables = []
+    for char in text:
+        syllable = _PINYIN_CACHE.get(char)
+        if syllable is None:
+            syllable = "".join(lazy_pinyin(char)).strip().casefold()
+            _PINYIN_CACHE[char] = syllable
+        if syllable:
+            syllables.append(syllable)
+    return "".join(syllables), "".join(syllable[0] for syllable in syllables)
+
+
+def within_one_edit(a, b):
+    """a、b之间的编辑距离是否不超过1（插入、删除、替换一个字符或交换相邻两个字符）"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+
+class NameLookupIndex:
+    """姓名查找索引，支持汉字、全拼、拼音首字母和编辑距离为1的模糊匹配
+
+    建立时预先计算每个姓名的全拼和首字母，并按字符（汉字）和两字母片段（全拼）
+    建立倒排表；拼音精确和前缀匹配在排好序的列表上二分查找。模糊匹配先用倒排表
+    筛出共有片段足够多的候选，再逐个核对编辑距离。结果按匹配程度排序：
+    姓名相同、姓名开头、姓名包含、首字母相同、全拼相同、首字母开头、全拼开头、模糊匹配。
+    未安装pypinyin时只支持汉字和模糊匹配
+    """
+
+    FUZZY_MIN_CHARS = 2  # 汉字搜索词至少几个字才做模糊匹配
+    FUZZY_MIN_LETTERS = 5  # 拼音搜索词至少几个字母才做模糊匹配
+
+    def __init__(self, items):
+        """items: (键, 姓名) 序列"""
+        self.keys = []
+        self.names = []
+        self.full = []  # 全拼
+        char_postings = {}
+        bigram_postings = {}
+        initials = []
+
+        for key, name in items:
+            position = len(self.keys)
+            name = "".join(name.split()).casefold()
+            pinyin = text_to_pinyin(name) or ("", "")
+            self.keys.append(key)
+            self.names.append(name)
+            self.full.append(pinyin[0])
+            initials.append((pinyin[1], position))
+            for char in set(name):
+                char_postings.setdefault(char, []).append(position)
+            for gram in self._bigrams(pinyin[0]):
+                bigram_postings.setdefault(gram, []).append(position)
+
+        self.char_postings = {char: np.array(p, dtype=np.int32) for char, p in char_postings.items()}
+        self.bigram_postings = {gram: np.array(p, dtype=np.int32) for gram, p in bigram_postings.items()}
+        self.name_lengths = np.array([len(name) for name in self.names], dtype=np.int32)
+        self.full_lengths = np.array([len(full) for full in self.full], dtype=np.int32)
+        self.sorted_initials = sorted(initials)
+        self.sorted_full = sorted((full, position) for position, full in enumerate(self.full))
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def _bigrams(text):
+        return {text[i:i + 2] for i in range(len(text) - 1)}
+
+    def _candidates(self, postings, grams, min_shared, lengths=None, length=None):
+        """至少包含min_shared个片段的位置；给出lengths时只保留长度与length相差不超过1的位置"""
+        arrays = [postings[gram] for gram in grams if gram in postings]
+        if min_shared <= 0 or len(arrays) < min_shared:
+            return np.empty(0, dtype=np.int64)
+        counts = np.bincount(np.concatenate(arrays), minlength=len(self.keys))
+        selected = counts >= min_shared
+        if lengths is not None:
+            selected &= np.abs(lengths - length) <= 1
+        return np.flatnonzero(selected)
+
+    @staticmethod
+    def _prefix_range(sorted_values, text):
+        """排好序的 (值, 位置) 列表中以text开头的项"""
+        start = bisect.bisect_left(sorted_values, (text, -1))
+        for value, position in sorted_values[start:]:
+            if not value.startswith(text):
+                break
+            yield value, position
+
+    def search(self, text, limit=None):
+        """返回匹配text的键，按匹配程度排序；limit为最多返回的个数，None表示全部"""
+        text = "".join(text.split()).casefold()
+        if not text:
+            return []
+
+        best = {}  # 位置 -> 最好的匹配等级，越小越好
+
+        def add(position, rank):
+            if rank < best.get(position, rank + 1):
+                best[position] = rank
+
+        # 汉字：姓名包含搜索词
+        chars = set(text)
+        for position in self._candidates(self.char_postings, chars, len(chars)).tolist():
+            name = self.names[position]
+            if text in name:
+                add(position, 0 if name == text else 1 if name.startswith(text) else 2)
+
+        is_pinyin = text.isascii() and text.isalpha()
+        if is_pinyin:
+            # 拼音首字母和全拼的精确、前缀匹配
+            for value, position in self._prefix_range(self.sorted_initials, text):
+                add(position, 3 if value == text else 5)
+            for value, position in self._prefix_range(self.sorted_full, text):
+                add(position, 4 if value == text else 6)
+
+        # 模糊匹配：编辑距离为1时，搜索词中的不同字符最多有1个、不同两字母片段最多有3个
+        # （交换相邻字母时）不在目标中
+        if len(text) >= self.FUZZY_MIN_CHARS and not is_pinyin:
+            for position in self._candidates(self.char_postings, chars, len(chars) - 1,
+                                             self.name_lengths, len(text)).tolist():
+                if within_one_edit(text, self.names[position]):
+                    add(position, 7)
+        if len(text) >= self.FUZZY_MIN_LETTERS and is_pinyin:
+            grams = self._bigrams(text)
+            for position in self._candidates(self.bigram_postings, grams, len(grams) - 3,
+                                             self.full_lengths, len(text)).tolist():
+                if within_one_edit(text, self.full[position]):
+                    add(position, 7)
+
+        order_key = lambda position: (best[position], len(self.names[position]), position)
+        if limit is None:
+            positions = sorted(best, key=order_key)
+        else:
+            positions = heapq.nsmallest(limit, best, key=order_key)
+        return [self.keys[position] for position in positions]
+
+
+class ScoreColumnStore:
+    """学生成绩联表数据 (学号, 姓名, 课程号, 学分, 成绩, 课程名称) 的本地列式缓存
+
+    每行只保存学号编码、课程号编码和成绩三个NumPy数组；字符串按编码只保存一份，
+    姓名随学号、课程名称和学分随课程号保存在字典表中。筛选字符串列时先在字典表上
+    计算出匹配的编码，再按编码整列查表，不需要逐行比较字符串。
+    缓存由一次全量查询建立，之后由本程序自己的写操作同步更新
+    """
+
+    STRING_COLUMNS = ("sno", "name", "cno", "course_name")
+    NUMERIC_COLUMNS = ("credit", "grade")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """清空缓存，下次加载时重新从数据库读取"""
+        self.loaded = False
+        self._pending = None  # 正在加载的数据：(学号编码, 课程号编码, 成绩) 三个列表
+
+        self.student_codes = {}  # 学号 -> 编码
+        self.snos = []  # 编码 -> 学号
+        self.student_names = []  # 编码 -> 姓名
+        self.course_codes = {}  # 课程号 -> 编码
+        self.cnos = []  # 编码 -> 课程号
+        self.course_names = []  # 编码 -> 课程名称
+        self.course_credits = []  # 编码 -> 学分
+
+        self.sno_code = np.empty(0, dtype=np.int32)
+        self.cno_code = np.empty(0, dtype=np.int32)
+        self.grade = np.empty(0, dtype=np.float64)
+        self._buffers = None  # 追加行用的底层数组，三列为其前len行的视图
+        self._positions = None  # (学号编码, 课程号编码) -> 行位置，第一次按主键查找时建立
+
+        self._text_index = None  # 字符串列的n-gram索引，第一次包含搜索时建立
+
+    def __len__(self):
+        return len(self.grade)
+
+    @staticmethod
+    def _text(value):
+        return sys.intern(str(value).strip()) if value is not None else ""
+
+    def _set_text(self, name, code, value):
+        """设置字典表中的字符串（code等于字典表长度时追加），同时维护n-gram索引"""
+        values, _ = self._dictionary(name)
+        if code == len(values):
+            values.append(value)
+            old = None
+        else:
+            old = values[code]
+            if old == value:
+                return
+            values[code] = value
+        if self._text_index is not None:
+            if old is not None:
+                self._text_index.remove((name, code), old)
+            self._text_index.add((name, code), value)
+
+    def _student_code(self, sno, name=None):
+        code = self.student_codes.get(sno)
+        if code is None:
+            code = len(self.snos)
+            self.student_codes[sno] = code
+            self._set_text("sno", code, sno)
+            self._set_text("name", code, name if name is not None else "")
+        elif name is not None:
+            self._set_text("name", code, name)
+        return code
+
+    def _course_code(self, cno, course_name=None, credit=None):
+        code = self.course_codes.get(cno)
+        if code is None:
+            code = len(self.cnos)
+            self.course_codes[cno] = code
+            self._set_text("cno", code, cno)
+            self._set_text("course_name", code, course_name if course_name is not None else "")
+            self.course_credits.append(credit)
+        else:
+            if course_name is not None:
+                self._set_text("course_name", code, course_name)
+            if credit is not None:
+                self.course_credits[code] = credit
+        return code
+
+    # ---------- 加载 ----------
+
+    def begin_load(self):
+        """开始从查询结果重新建立缓存"""
+        self.clear()
+        self._pending = ([], [], [])
+
+    def add_rows(self, records):
+        """加入一批查询结果，每行为 (学号, 姓名, 课程号, 学分, 成绩, 课程名称)"""
+        if self._pending is None:
+            return
+        sno_codes, cno_codes, grades = self._pending
+        for sno, name, cno, credit, grade, course_name in records:
+            sno_codes.append(self._student_code(self._text(sno), self._text(name)))
+            cno_codes.append(self._course_code(self._text(cno), self._text(course_name), credit))
+            grades.append(np.nan if grade is None else float(grade))
+
+    def finish_load(self):
+        """加载完成，转换为NumPy数组"""
+        if self._pending is None:
+            return
+        sno_codes, cno_codes, grades = self._pending
+        self.sno_code = np.array(sno_codes, dtype=np.int32)
+        self.cno_code = np.array(cno_codes, dtype=np.int32)
+        self.grade = np.array(grades, dtype=np.float64)
+        self._positions = None
+        self._pending = None
+        self.loaded = True
+
+    def _changed(self):
+        """记录一次写操作，返回缓存是否需要同步
+
+        加载过程中数据库被修改时，正在加载的结果可能已过期，放弃这次加载
+        """
+        self._pending = None
+        return self.loaded
+
+    # ---------- 查找和读取 ----------
+
+    def find(self, sno, cno):
+        """返回 (学号, 课程号) 所在的行位置，不存在时返回-1"""
+        sno_code = self.student_codes.get(sno)
+        cno_code = self.course_codes.get(cno)
+        if sno_code is None or cno_code is None:
+            return -1
+        return self._position_index().get((sno_code, cno_code), -1)
+
+    def _position_index(self):
+        """(学号编码, 课程号编码) -> 行位置，建立之后随逐条追加、删除同步修改，整列删除后重新建立"""
+        if self._positions is None:
+            keys = zip(self.sno_code.tolist(), self.cno_code.tolist())
+            self._positions = {key: position for position, key in enumerate(keys)}
+        return self._positions
+
+    def column(self, name):
+        """按行展开的一列：字符串列为对象数组，学分、成绩为浮点数组"""
+        if name == "grade":
+            return self.grade
+        if name == "credit":
+            credits = np.array([np.nan if c is None else float(c) for c in self.course_credits], dtype=np.float64)
+            return credits[self.cno_code] if len(credits) else np.empty(0, dtype=np.float64)
+        values, codes = self._dictionary(name)
+        return np.array(values, dtype=object)[codes] if values else np.empty(0, dtype=object)
+
+    def _dictionary(self, name):
+        """字符串列的 (字典表, 行编码数组)"""
+        if name == "sno":
+            return self.snos, self.sno_code
+        if name == "name":
+            return self.student_names, self.sno_code
+        if name == "cno":
+            return self.cnos, self.cno_code
+        if name == "course_name":
+            return self.course_names, self.cno_code
+        raise KeyError(name)
+
+    def rows(self, indices=None):
+        """按行位置生成表格行 (学号, 姓名, 课程号, 学分, 成绩)，默认按学号、课程号排序"""
+        if indices is None:
+            indices = self.sort_indices()
+        snos = np.array(self.snos, dtype=object)[self.sno_code[indices]] if len(indices) else []
+        names = np.array(self.student_names, dtype=object)[self.sno_code[indices]] if len(indices) else []
+        cnos = np.array(self.cnos, dtype=object)[self.cno_code[indices]] if len(indices) else []
+        credits = np.array(self.course_credits, dtype=object)[self.cno_code[indices]] if len(indices) else []
+        grades = [None if np.isnan(g) else g for g in self.grade[indices].tolist()]
+        return list(zip(snos, names, cnos, credits, grades))
+
+    # ---------- 筛选、排序和统计 ----------
+
+    def string_mask(self, name, predicate):
+        """字符串列的筛选掩码：predicate只对字典表中的每个不同值计算一次"""
+        values, codes = self._dictionary(name)
+        lookup = np.fromiter((bool(predicate(value)) for value in values), dtype=bool, count=len(values))
+        return lookup[codes] if len(values) else np.zeros(len(codes), dtype=bool)
+
+    def text_index(self):
+        """字符串列的n-gram索引，键为 (列名, 编码)"""
+        if self._text_index is None:
+            index = NgramIndex()
+            for name in self.STRING_COLUMNS:
+                values, _ = self._dictionary(name)
+                for code, value in enumerate(values):
+                    index.add((name, code), value)
+            self._text_index = index
+        return self._text_index
+
+    def contains_mask(self, names, text):
+        """任一指定字符串列包含text（不区分大小写）的行掩码，通过n-gram索引查找"""
+        keys = self.text_index().search(text)
+        mask = np.zeros(len(self), dtype=bool)
+        for name in names:
+            values, codes = self._dictionary(name)
+            matched = [code for column, code in keys if column == name]
+            if matched:
+                lookup = np.zeros(len(values), dtype=bool)
+                lookup[matched] = True
+                mask |= lookup[codes]
+        return mask
+
+    def sno_mask(self, snos):
+        """学号属于snos的行掩码"""
+        codes = [self.student_codes[sno] for sno in snos if sno in self.student_codes]
+        lookup = np.zeros(len(self.student_names), dtype=bool)
+        lookup[codes] = True
+        return lookup[self.sno_code] if len(self.student_names) else np.zeros(len(self), dtype=bool)
+
+    def _ranks(self, name):
+        # 字典表中各值的排序名次，按名次比较等价于按字符串比较
+        values, codes = self._dictionary(name)
+        order = sorted(range(len(values)), key=values.__getitem__)
+        ranks = np.empty(len(values), dtype=np.int64)
+        ranks[order] = np.arange(len(values))
+        return ranks[codes] if len(values) else np.empty(0, dtype=np.int64)
+
+    def sort_indices(self, indices=None, column=None, descending=False):
+        """对行位置排序，默认按学号、课程号升序；指定列时以学号、课程号作为次序"""
+        if indices is None:
+            indices = np.arange(len(self))
+        keys = [self._ranks("cno")[indices], self._ranks("sno")[indices]]
+        if column is not None:
+            key = self.column(column)[indices] if column in self.NUMERIC_COLUMNS else self._ranks(column)[indices]
+            keys.append(-key if descending else key)
+        return indices[np.lexsort(keys)]
+
+    def statistics(self, indices=None):
+        """成绩统计：人数、平均、最高、最低成绩和及格率"""
+        grades = self.grade if indices is None else self.grade[indices]
+        grades = grades[~np.isnan(grades)]
+        if not len(grades):
+            return {'count': 0, 'average': None, 'highest': None, 'lowest': None, 'pass_rate': None}
+        return {
+            'count': len(grades),
+            'average': float(grades.mean()),
+            'highest': float(grades.max()),
+            'lowest': float(grades.min()),
+            'pass_rate': float((grades >= 60).mean()),
+        }
+
+    # ---------- 与本程序的写操作同步 ----------
+
+    def upsert(self, sno, name, cno, credit, grade, course_name):
+        """新增一条成绩，已存在时更新成绩"""
+        if not self._changed():
+            return
+        sno_code = self._student_code(sno, name)
+        cno_code = self._course_code(cno, course_name, credit)
+        position = self.find(sno, cno)
+        grade = np.nan if grade is None else float(grade)
+        if position >= 0:
+            self.grade[position] = grade
+        else:
+            self._append(sno_code, cno_code, grade)
+
+    def _append(self, sno_code, cno_code, grade):
+        """在末尾追加一行，底层数组容量不足时按两倍扩容，逐条追加的均摊开销为O(1)"""
+        size = len(self.grade)
+        buffers = self._buffers
+        # 三列被整体替换过（加载、删除）时不再是底层数组的视图，需要重新分配
+        if buffers is None or self.grade.base is not buffers[2] or size == len(buffers[2]):
+            capacity = max(16, size * 2)
+            buffers = tuple(np.empty(capacity, dtype=column.dtype) for column in (self.sno_code, self.cno_code, self.grade))
+            for buffer, column in zip(buffers, (self.sno_code, self.cno_code, self.grade)):
+                buffer[:size] = column
+            self._buffers = buffers
+        buffers[0][size] = sno_code
+        buffers[1][size] = cno_code
+        buffers[2][size] = grade
+        self.sno_code, self.cno_code, self.grade = (buffer[:size + 1] for buffer in buffers)
+        if self._positions is not None:
+            self._positions[(sno_code, cno_code)] = size
+
+    def set_grade(self, sno, cno, grade):
+        """更新一条成绩"""
+        if not self._changed():
+            return
+        position = self.find(sno, cno)
+        if position >= 0:
+            self.grade[position] = float(grade)
+
+    def set_grades(self, changes):
+        """批量更新成绩，changes为 (学号, 课程号, 成绩) 序列，按主键一次向量化查找全部位置"""
+        if not self._changed() or not changes:
+            return
+        width = max(len(self.cnos), 1)
+        combined = self.sno_code.astype(np.int64) * width + self.cno_code
+        order = np.argsort(combined, kind="stable")
+        sorted_keys = combined[order]
+
+        known = [(self.student_codes.get(sno), self.course_codes.get(cno), grade) for sno, cno, grade in changes]
+        known = [(s, c, g) for s, c, g in known if s is not None and c is not None]
+        if not known:
+            return
+        targets = np.array([s * width + c for s, c, _ in known], dtype=np.int64)
+        grades = np.array([np.nan if g is None else float(g) for _, _, g in known], dtype=np.float64)
+        found = np.minimum(np.searchsorted(sorted_keys, targets), len(sorted_keys) - 1)
+        matched = sorted_keys[found] == targets if len(sorted_keys) else np.zeros(len(targets), dtype=bool)
+        self.grade[order[found[matched]]] = grades[matched]
+
+    def _remove(self, mask):
+        keep = ~mask
+        self.sno_code = self.sno_code[keep]
+        self.cno_code = self.cno_code[keep]
+        self.grade = self.grade[keep]
+        self._positions = None
+
+    def remove(self, sno, cno):
+        """删除一条成绩：用最后一行填补被删除的位置，只需修改一项主键索引
+
+        行的存放顺序不影响显示，取出的行总是按学号、课程号或指定的列排序
+        """
+        if not self._changed():
+            return
+        position = self.find(sno, cno)
+        if position < 0:
+            return
+        positions = self._positions
+        last = len(self) - 1
+        del positions[(self.student_codes[sno], self.course_codes[cno])]
+        if position != last:
+            for column in (self.sno_code, self.cno_code, self.grade):
+                column[position] = column[last]
+            positions[(int(self.sno_code[position]), int(self.cno_code[position]))] = position
+        self.sno_code, self.cno_code, self.grade = self.sno_code[:last], self.cno_code[:last], self.grade[:last]
+
+    def remove_student(self, sno):
+        """删除某个学生的全部成绩"""
+        if not self._changed():
+            return
+        code = self.student_codes.get(sno)
+        if code is not None:
+            self._remove(self.sno_code == code)
+
+    def remove_course(self, cno):
+        """删除某门课程的全部成绩"""
+        if not self._changed():
+            return
+        code = self.course_codes.get(cno)
+        if code is not None:
+            self._remove(self.cno_code == code)
+
+    def update_student(self, old_sno, new_sno, name):
+        """修改学号和姓名：只需改字典表，各行的编码不变"""
+        if not self._changed():
+            return
+        code = self.student_codes.pop(old_sno, None)
+        if code is None:
+            return
+        self.student_codes[new_sno] = code
+        self._set_text("sno", code, new_sno)
+        self._set_text("name", code, name)
+
+    def update_course(self, old_cno, new_cno, course_name, credit):
+        """修改课程号、课程名称和学分：只需改字典表，各行的编码不变"""
+        if not self._changed():
+            return
+        code = self.course_codes.pop(old_cno, None)
+        if code is None:
+            return
+        self.course_codes[new_cno] = code
+        self._set_text("cno", code, new_cno)
+        self._set_text("course_name", code, course_name)
+        self.course_credits[code] = credit
+
+
+# 搜索字段：界面名称 -> (ScoreColumnStore列名, SQL列名)
+SEARCH_FIELDS = {
+    "学号": ("sno", "s.Sno"),
+    "姓名": ("name", "s.name"),
+    "课程号": ("cno", "sc.Cno"),
+    "课程名称": ("course_name", "c.course_name"),
+    "学分": ("credit", "c.Credit"),
+    "成绩": ("grade", "sc.Grade"),
+}
+
+# 数值比较运算符：界面名称 -> (SQL运算符, NumPy比较函数)
+NUMERIC_OPERATORS = {
+    "等于": ("=", np.equal),
+    "大于": (">", np.greater),
+    "小于": ("<", np.less),
+    "大于等于": (">=", np.greater_equal),
+    "小于等于": ("<=", np.less_equal),
+    "不等于": ("<>", np.not_equal),
+}
+
+# 文本比较运算符：界面名称 -> (LIKE模式或等值比较, 本地判断函数)
+TEXT_OPERATORS = {
+    "包含": ("%{}%", lambda value, text: text in value),
+    "等于": (None, lambda value, text: value == text),
+    "开头是": ("{}%", lambda value, text: value.startswith(text)),
+    "结尾是": ("%{}", lambda value, text: value.endswith(text)),
+}
+
+# 姓名按拼音、首字母或编辑距离为1的模糊匹配，用姓名索引找到学号后按学号筛选
+NAME_MATCH_OPERATOR = "拼音/模糊"
+
+# 全部字段搜索时匹配的文本列
+ANY_TEXT_FIELDS = ("学号", "姓名", "课程号", "课程名称")
+
+
+def escape_like(text):
+    """转义LIKE模式中的通配符（SQL Server用方括号转义），使搜索词按字面匹配，与本地筛选一致"""
+    return re.sub(r"([\[%_])", r"[\1]", text)
+
+
+class SearchCriteria:
+    """成绩搜索条件
+
+    由搜索栏和高级搜索面板的状态编译而成，同一组条件既可以生成SQL的WHERE/ORDER BY
+    子句交给数据库执行，也可以在ScoreColumnStore上按列计算掩码在本地执行，两种方式结果相同。
+    文本比较与数据库默认排序规则一致，不区分大小写；成绩为空的记录不满足任何数值条件
+    """
+
+    def __init__(self):
+        self.conditions = []  # (字段, 运算符, 值)，各条件之间为AND
+        self.name_keys = {}  # 拼音/模糊匹配的姓名 -> 姓名索引找到的学号
+        self.any_text = None  # 全部字段包含的文本
+        self.sort = None  # (字段, 是否降序)，None表示按学号、课程号排序
+
+    def add(self, field, operator, value):
+        """添加一个条件，field为SEARCH_FIELDS中的界面名称"""
+        if field not in SEARCH_FIELDS:
+            raise ValueError(f"未知的搜索字段: {field}")
+        operators = NUMERIC_OPERATORS if isinstance(value, float) else TEXT_OPERATORS
+        if operator not in operators:
+            raise ValueError(f"{field}不支持运算符: {operator}")
+        self.conditions.append((field, operator, value))
+
+    def add_name_match(self, text, keys):
+        """姓名按拼音、首字母或模糊匹配text，keys为姓名索引找到的学号
+
+        匹配在添加条件时就已确定，数据库和本地两种执行方式都按这些学号筛选
+        """
+        self.conditions.append(("姓名", NAME_MATCH_OPERATOR, text))
+        self.name_keys[text] = sorted(keys)
+
+    def set_any_text(self, text):
+        """在学号、姓名、课程号和课程名称中搜索包含text的记录"""
+        self.any_text = text
+
+    def set_sort(self, field, descending=False):
+        self.sort = (field, descending)
+
+    # ---------- 生成SQL ----------
+
+    def to_sql(self):
+        """返回追加在 WHERE 1=1 之后的条件和排序子句，以及对应的参数列表"""
+        sql = []
+        params = []
+
+        if self.any_text:
+            columns = [SEARCH_FIELDS[field][1] for field in ANY_TEXT_FIELDS]
+            sql.append(" AND (" + " OR ".join(f"{column} LIKE ?" for column in columns) + ")")
+            params.extend([f"%{escape_like(self.any_text)}%"] * len(columns))
+
+        for field, operator, value in self.conditions:
+            column = SEARCH_FIELDS[field][1]
+            if isinstance(value, float):
+                sql.append(f" AND {column} {NUMERIC_OPERATORS[operator][0]} ?")
+                params.append(value)
+            elif operator == NAME_MATCH_OPERATOR:
+                keys = self.name_keys[value]
+                if keys:
+                    sql.append(f" AND {SEARCH_FIELDS['学号'][1]} IN ({', '.join('?' * len(keys))})")
+                    params.extend(keys)
+                else:
+                    sql.append(" AND 1=0")
+            else:
+                pattern = TEXT_OPERATORS[operator][0]
+                if pattern is None:
+                    sql.append(f" AND {column} = ?")
+                    params.append(value)
+                else:
+                    sql.append(f" AND {column} LIKE ?")
+                    params.append(pattern.format(escape_like(value)))
+
+        if self.sort is None:
+            sql.append(" ORDER BY s.Sno, sc.Cno")
+        else:
+            field, descending = self.sort
+            # 与本地排序相同，排序值相同的记录按学号、课程号排列，结果顺序确定
+            sql.append(f" ORDER BY {SEARCH_FIELDS[field][1]} {'DESC' if descending else 'ASC'}, s.Sno, sc.Cno")
+
+        return "".join(sql), params
+
+    # ---------- 本地执行 ----------
+
+    def mask(self, store):
+        """在ScoreColumnStore上计算满足全部条件的行掩码"""
+        mask = np.ones(len(store), dtype=bool)
+
+        if self.any_text:
+            mask &= store.contains_mask([SEARCH_FIELDS[field][0] for field in ANY_TEXT_FIELDS], self.any_text)
+
+        for field, operator, value in self.conditions:
+            column = SEARCH_FIELDS[field][0]
+            if isinstance(value, float):
+                values = store.column(column)
+                with np.errstate(invalid="ignore"):
+                    mask &= NUMERIC_OPERATORS[operator][1](values, value) & ~np.isnan(values)
+            elif operator == NAME_MATCH_OPERATOR:
+                mask &= store.sno_mask(self.name_keys[value])
+            elif operator == "包含":
+                mask &= store.contains_mask([column], value)
+            else:
+                text = value.casefold()
+                matches = TEXT_OPERATORS[operator][1]
+                mask &= store.string_mask(column, lambda v: matches(v.casefold(), text))
+
+        return mask
+
+    def indices(self, store):
+        """满足条件的行位置，按排序设置排好序"""
+        indices = np.flatnonzero(self.mask(store))
+        if self.sort is None:
+            return store.sort_indices(indices)
+        field, descending = self.sort
+        return store.sort_indices(indices, SEARCH_FIELDS[field][0], descending)
+
+    def matches(self, record):
+        """单条记录是否满足全部条件，record为 {列名: 值}，列名同SEARCH_FIELDS中的本地列名
+
+        用于判断其他用户新增的记录是否属于当前的搜索结果，判断规则与mask相同
+        """
+        def text_of(column):
+            value = record.get(column)
+            return "" if value is None else str(value).strip().casefold()
+
+        if self.any_text:
+            text = self.any_text.casefold()
+            if not any(text in text_of(SEARCH_FIELDS[field][0]) for field in ANY_TEXT_FIELDS):
+                return False
+
+        for field, operator, value in self.conditions:
+            column = SEARCH_FIELDS[field][0]
+            if isinstance(value, float):
+                current = record.get(column)
+                current = np.nan if current is None else float(current)
+                if np.isnan(current) or not NUMERIC_OPERATORS[operator][1](current, value):
+                    return False
+            elif operator == NAME_MATCH_OPERATOR:
+                if record.get("sno") not in self.name_keys[value]:
+                    return False
+            elif not TEXT_OPERATORS[operator][1](text_of(column), value.casefold()):
+                return False
+
+        return True
+
+
+class GradeChangeBuffer:
+    """成绩表格中未保存的修改，按 (学号, 课程号) 记录新成绩
+
+    按主键而不是行号记录，表格重新加载、筛选或删除行之后修改仍然对应正确的记录
+    """
+
+    UPDATE_QUERY = "UPDATE Student_Score SET Grade = ? WHERE Sno = ? AND Cno = ?"
+
+    def __init__(self):
+        self._grades = {}
+
+    def __len__(self):
+        return len(self._grades)
+
+    def __contains__(self, key):
+        return key in self._grades
+
+    def get(self, key, default=None):
+        return self._grades.get(key, default)
+
+    def set(self, key, grade):
+        self._grades[key] = grade
+
+    def discard(self, key):
+        self._grades.pop(key, None)
+
+    def clear(self):
+        self._grades.clear()
+
+    def flush(self, cursor):
+        """用一次批量executemany把全部修改写入数据库，返回写入的 (学号, 课程号, 成绩) 列表
+
+        不提交事务，也不清空修改，由调用方在提交成功后调用clear
+        """
+        changes = [(sno, cno, grade) for (sno, cno), grade in self._grades.items()]
+        if changes:
+            cursor.fast_executemany = True
+            cursor.executemany(self.UPDATE_QUERY, [(grade, sno, cno) for sno, cno, grade in changes])
+        return changes
+
+
+class ChangeEvent:
+    """一次数据修改
+
+    table: "score"、"student" 或 "course"
+    action: "insert"、"update"、"delete"，或 "reload"（大量修改，订阅方重新加载）
+    items: [(键, 数据)]，键对成绩为 (学号, 课程号)，对学生为学号，对课程为课程号；
+        数据为修改后的字段（删除时为空字典）：成绩为 name/credit/grade/course_name，
+        学生为 name，课程为 course_name/credit；学号、课程号被修改时old_key为原值
+    remote: 是否为其他客户端的修改（由ChangeFeed读取）
+    """
+
+    __slots__ = ("table", "action", "items", "remote")
+
+    def __init__(self, table, action, items=(), remote=False):
+        self.table = table
+        self.action = action
+        self.items = list(items)
+        self.remote = remote
+
+    def __repr__(self):
+        return f"ChangeEvent({self.table!r}, {self.action!r}, {len(self.items)} 项)"
+
+
+class ChangeEventBus(QObject):
+    """数据修改事件总线
+
+    写操作成功后发布修改了哪些记录，各视图和缓存订阅后只更新受影响的行，不重新加载整个表格
+    """
+
+    changed = pyqtSignal(object)  # ChangeEvent
+
+    def publish(self, table, action, key=None, **values):
+        """发布一条记录的修改"""
+        self.changed.emit(ChangeEvent(table, action, [] if key is None else [(key, values)]))
+
+    def publish_many(self, table, action, items):
+        """发布多条记录的修改，items为 [(键, 数据)]"""
+        if items:
+            self.changed.emit(ChangeEvent(table, action, items))
+
+
+class ChangeFeed:
+    """读取其他客户端对数据库的修改
+
+    Student、Course、Student_Score上的触发器（sql/change_log.sql，由管理员安装）把每次修改的主键
+    写入ChangeLog表，记录的Version为rowversion，Origin为写入连接的CONTEXT_INFO。
+    数据库中没有ChangeLog表时不读取修改，本程序不会创建或修改数据库结构。
+    本程序的每个连接都设置了同一个客户端标识，读取时跳过自己的修改（这些修改已由ChangeEventBus直接应用）。
+
+    每次只读取上次位置之后、MIN_ACTIVE_ROWVERSION()之前的记录：更大的版本号可能属于尚未提交的事务，
+    留到下次读取，因此不会漏掉提交较晚的修改。同一主键的多次修改合并为一次，
+    再按主键查询当前数据，转换为与本程序写操作相同的ChangeEvent
+    """
+
+    # 表名 -> ChangeEvent的table
+    TABLES = {
+        'Student': "student",
+        'Course': "course",
+        'Student_Score': "score",
+    }
+
+    POLL_QUERY = """
+    SELECT TableName, Action, KeyValue, KeyValue2
+    FROM dbo.ChangeLog
+    WHERE Version >= ? AND Version < ? AND (Origin IS NULL OR Origin <> ?)
+    ORDER BY Version
+    """
+
+    # 按修改记录查询各表的当前数据，列与ChangeEvent的数据对应
+    ROW_QUERIES = {
+        'Student': """
+            SELECT DISTINCT s.Sno, s.name
+            FROM dbo.ChangeLog l
+            JOIN Student s ON s.Sno = l.KeyValue
+            WHERE l.TableName = 'Student' AND l.Version >= ? AND l.Version < ?
+              AND (l.Origin IS NULL OR l.Origin <> ?)
+        """,
+        'Course': """
+            SELECT DISTINCT c.Cno, c.course_name, c.Credit
+            FROM dbo.ChangeLog l
+            JOIN Course c ON c.Cno = l.KeyValue
+            WHERE l.TableName = 'Course' AND l.Version >= ? AND l.Version < ?
+              AND (l.Origin IS NULL OR l.Origin <> ?)
+        """,
+        'Student_Score': """
+            SELECT DISTINCT s.Sno, s.name, sc.Cno, c.Credit, sc.Grade, c.course_name
+            FROM dbo.ChangeLog l
+            JOIN Student_Score sc ON sc.Sno = l.KeyValue AND sc.Cno = l.KeyValue2
+            JOIN Student s ON sc.Sno = s.Sno
+            JOIN Course c ON sc.Cno = c.Cno
+            WHERE l.TableName = 'Student_Score' AND l.Version >= ? AND l.Version < ?
+              AND (l.Origin IS NULL OR l.Origin <> ?)
+        """,
+    }
+
+    def __init__(self):
+        self.client_id = os.urandom(16)
+        self.installed = None  # 数据库中是否有ChangeLog表，None表示尚未检查
+        self._version = None  # 下次从该版本号开始读取，None表示尚未初始化
+
+    @property
+    def ready(self):
+        return self._version is not None
+
+    def tag_connection(self, conn):
+        """为新连接设置客户端标识，触发器把它记录为修改来源（用作ConnectionPool的on_connect）"""
+        conn.cursor().execute(f"SET CONTEXT_INFO 0x{self.client_id.hex()}")
+
+    def setup(self, conn):
+        """检查数据库中是否有ChangeLog表，有则从当前版本开始读取修改，返回是否可以同步"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT OBJECT_ID(N'dbo.ChangeLog', N'U')")
+        self.installed = cursor.fetchone()[0] is not None
+        if self.installed:
+            cursor.execute("SELECT MIN_ACTIVE_ROWVERSION()")
+            self._version = cursor.fetchone()[0]
+        return self.installed
+
+    def poll(self, conn):
+        """读取上次之后其他客户端提交的修改，返回ChangeEvent列表（学生、课程、成绩的顺序）"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT MIN_ACTIVE_ROWVERSION()")
+        upper = cursor.fetchone()[0]
+        window = (self._version, upper, self.client_id)
+        cursor.execute(self.POLL_QUERY, window)
+
+        # 表名 -> {主键: [第一次操作, 最后一次操作, 是否删除过]}
+        changes = {table: {} for table in self.TABLES}
+        limit = CHANGE_FEED_CONFIG['max_keys']
+        for table, action, key, key2 in ResultStream(cursor).iter_rows():
+            if table not in changes:
+                continue
+            key = key.strip() if key2 is None else (key.strip(), key2.strip())
+            state = changes[table].get(key)
+            if state is None:
+                if len(changes[table]) >= limit:
+                    # 修改太多（如批量导入），不再读取剩下的修改记录，改为重新加载全部数据
+                    cursor.cancel()
+                    cursor.close()
+                    self._version = upper
+                    return [ChangeEvent(self.TABLES[table], "reload", remote=True)]
+                state = changes[table][key] = [action, action, False]
+            state[1] = action
+            state[2] = state[2] or action == 'D'
+
+        events = []
+        for table, keys in changes.items():
+            if keys:
+                events.extend(self._table_events(cursor, table, keys, window))
+        self._version = upper
+        return events
+
+    def _table_events(self, cursor, table, keys, window):
+        """把一个表合并后的修改转换为ChangeEvent：先删除，再新增，最后修改"""
+        kind = self.TABLES[table]
+        current = {}
+        if any(last != 'D' for _, last, _ in keys.values()):
+            cursor.execute(self.ROW_QUERIES[table], window)
+            for row in cursor.fetchall():
+                row = tuple(value.strip() if isinstance(value, str) else value for value in row)
+                if kind == "score":
+                    current[(row[0], row[2])] = {'name': row[1], 'credit': row[3], 'grade': row[4],
+                                                 'course_name': row[5]}
+                elif kind == "student":
+                    current[row[0]] = {'name': row[1]}
+                else:
+                    current[row[0]] = {'course_name': row[1], 'credit': row[2]}
+
+        deleted, inserted, updated = [], [], []
+        for key, (first, last, dropped) in keys.items():
+            values = current.get(key)
+            if last == 'D' or values is None:
+                # 查询数据时已被删除的记录按删除处理，下次读到的删除记录重复应用也没有影响
+                deleted.append((key, {}))
+                continue
+            if dropped:
+                # 删除后又新增了同一主键，先删除原有的行
+                deleted.append((key, {}))
+            if first == 'I' or dropped:
+                inserted.append((key, values))
+            else:
+                updated.append((key, values))
+
+        return [ChangeEvent(kind, action, items, remote=True)
+                for action, items in (("delete", deleted), ("insert", inserted), ("update", updated)) if items]
+
+
+class ChangeFeedWorker(QRunnable):
+    """在线程池中读取一次其他客户端的修改，首次运行时先检查ChangeLog并确定读取起点"""
+
+    def __init__(self, pool, feed):
+        super().__init__()
+        self.pool = pool
+        self.feed = feed
+        self.signals = QueryWorkerSignals()  # finished的参数为ChangeEvent列表
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            with self.pool.connection() as conn:
+                if self.feed.ready or self.feed.setup(conn):
+                    events = self.feed.poll(conn)
+                else:
+                    events = []
+            if not self._cancelled:
+                self.signals.finished.emit(events)
+        except Exception as e:
+            if not self._cancelled:
+                self.signals.failed.emit(e)
+        finally:
+            self.signals.done.emit()
+
+
+class TableRowIndex:
+    """表格主键到行号的索引：学生管理/课程管理表格按第一列（学号、课程号），成绩表格按 (学号, 课程号)
+
+    这些表格只在末尾追加行、按行号删除行。追加时记录行的位置坐标；删除行时
+    不逐个调整后面行的坐标，而是把删除的坐标记入有序列表，查找时减去它前面已删除的行数。
+    """
+
+    COMPACT_THRESHOLD = 1024  # 已删除的坐标超过这个数时重新编号
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """表格清空时调用"""
+        self._positions = {}  # 第一列的值 -> 位置坐标
+        self._removed = []  # 已删除行的位置坐标，升序
+        self._next = 0  # 下一个追加行的位置坐标
+
+    def append(self, key):
+        self._positions[key] = self._next
+        self._next += 1
+
+    def row(self, key):
+        """返回第一列为key的行号，找不到时返回-1"""
+        position = self._positions.get(key)
+        if position is None:
+            return -1
+        return position - bisect.bisect_left(self._removed, position)
+
+    def rename(self, old_key, new_key):
+        """行的第一列从old_key改为new_key，行号不变"""
+        position = self._positions.pop(old_key, None)
+        if position is not None:
+            self._positions[new_key] = position
+
+    def remove(self, key):
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        bisect.insort(self._removed, position)
+        if len(self._removed) > self.COMPACT_THRESHOLD:
+            ordered = sorted(self._positions, key=self._positions.get)
+            self._positions = {k: row for row, k in enumerate(ordered)}
+            self._removed = []
+            self._next = len(ordered)
+
+
+class ScoreTableModel(QAbstractTableModel):
+    """学生成绩表格模型
+
+    数据按行以元组紧凑存储，不再为每个单元格创建QTableWidgetItem，
+    单元格文本只在视图需要显示时由data()按需格式化
+    """
+
+    HEADERS = ["学号", "姓名", "课程号", "学分", "成绩"]
+    GRADE_COLUMN = 4
+
+    # 成绩单元格被编辑后发出，参数为行号
+    grade_edited = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []  # 每行一个元组: (学号, 姓名, 课程号, 学分, 成绩)
+        self._originals = []  # 每行加载时（或最近一次保存后）的原始成绩，与_rows一一对应
+        self.changes = GradeChangeBuffer()  # 已修改但未保存的成绩
+        self.conflicts = set()  # 有未保存的修改、同时数据库中的成绩又被其他用户修改的 (学号, 课程号)
+        self._row_index = None  # (学号, 课程号) -> 行号的TableRowIndex，第一次按主键查找时建立
+
+        # 滚动到底部时加载更多数据的回调（分页浏览时使用）
+        self._can_fetch_more = None
+        self._fetch_more = None
+
+    def _pack(self, record):
+        """将查询结果转换为紧凑的行元组，未保存的修改覆盖查询到的成绩"""
+        # 修复空格问题 - 学号、姓名、课程号去除空格，重复字符串共享同一对象
+        sno, name, cno = (sys.intern(str(v).strip()) if v is not None else None
+                          for v in record[:3])
+        grade = self.changes.get((sno, cno), record[4]) if len(self.changes) else record[4]
+        return sno, name, cno, record[3], grade
+
+    @staticmethod
+    def _key(values):
+        return values[0], values[2]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return str(self._rows[index.row()][index.column()])
+
+        if index.column() == self.GRADE_COLUMN and role in (Qt.BackgroundRole, Qt.ToolTipRole):
+            row = index.row()
+            key = self._key(self._rows[row])
+            if key in self.conflicts:
+                if role == Qt.ToolTipRole:
+                    return f"其他用户已把成绩改为 {self._originals[row]}，保存时将用这里的修改覆盖"
+                return QBrush(QColor(255, 160, 122))
+            if role == Qt.BackgroundRole and key in self.changes:
+                return QBrush(Qt.yellow)
+
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        # 只允许直接编辑成绩列
+        if index.isValid() and index.column() == self.GRADE_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole or index.column() != self.GRADE_COLUMN:
+            return False
+
+        row = index.row()
+        self._replace_grade(row, value)
+        self.dataChanged.emit(index, index)
+        self.grade_edited.emit(row)
+        return True
+
+    def _replace_grade(self, row, grade):
+        self._rows[row] = self._rows[row][:self.GRADE_COLUMN] + (grade,)
+
+    def set_rows(self, records):
+        """用查询结果替换全部数据"""
+        self.beginResetModel()
+        self._rows = [self._pack(record) for record in records]
+        self._originals = [record[4] for record in records]
+        self._row_index = None
+        self.endResetModel()
+
+    def append_rows(self, records):
+        """将一批查询结果追加到末尾"""
+        if not records:
+            return
+        start = len(self._rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(records) - 1)
+        self._rows.extend(self._pack(record) for record in records)
+        self._originals.extend(record[4] for record in records)
+        if self._row_index is not None:
+            for row in range(start, len(self._rows)):
+                self._row_index.append(self._key(self._rows[row]))
+        self.endInsertRows()
+
+    def row_values(self, row):
+        """获取一行数据 (学号, 姓名, 课程号, 学分, 成绩)"""
+        return self._rows[row]
+
+    def set_grade(self, row, grade, modified=False):
+        """设置某行成绩
+
+        modified为True时作为未保存的修改（与原始成绩相同时不算修改）；
+        为False时表示数据库中的成绩已经是grade，同时更新原始成绩
+        """
+        self._replace_grade(row, grade)
+        key = self._key(self._rows[row])
+        if modified and grade != self._originals[row]:
+            self.changes.set(key, grade)
+        else:
+            self.changes.discard(key)
+            self.conflicts.discard(key)
+            if not modified:
+                self._originals[row] = grade
+        index = self.index(row, self.GRADE_COLUMN)
+        self.dataChanged.emit(index, index)
+
+    def set_saved_grade(self, row, grade):
+        """数据库中某行的成绩已被其他用户改为grade，返回是否与未保存的修改冲突
+
+        没有未保存的修改时直接更新；有修改时只更新原始成绩，保留修改并标记为冲突，
+        由用户决定保存（覆盖对方的修改）还是放弃
+        """
+        key = self._key(self._rows[row])
+        if key not in self.changes:
+            self.set_grade(row, grade)
+            return False
+        self._originals[row] = grade
+        if self.changes.get(key) == grade:
+            # 对方改成了同样的成绩，这条修改已经不需要保存
+            self.set_grade(row, grade)
+            return False
+        self.conflicts.add(key)
+        index = self.index(row, self.GRADE_COLUMN)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def original_grade(self, row):
+        """某行的原始成绩"""
+        return self._originals[row]
+
+    def revert_edit(self, row):
+        """撤销对某行的这次输入，恢复为之前未保存的修改或原始成绩，不访问数据库"""
+        grade = self.changes.get(self._key(self._rows[row]), self._originals[row])
+        self._replace_grade(row, grade)
+        index = self.index(row, self.GRADE_COLUMN)
+        self.dataChanged.emit(index, index)
+
+    def diff(self):
+        """已加载的行中有未保存修改的单元格：[(行号, 学号, 课程号, 原始成绩, 新成绩)]"""
+        if not len(self.changes):
+            return []
+        return [(row, values[0], values[2], self._originals[row], values[self.GRADE_COLUMN])
+                for row, values in enumerate(self._rows) if self._key(values) in self.changes]
+
+    def discard_changes(self):
+        """放弃全部未保存的修改，已加载的行恢复为原始成绩，不访问数据库"""
+        for row, _, _, original, _ in self.diff():
+            self._replace_grade(row, original)
+        self.changes.clear()
+        self.conflicts.clear()
+        self._emit_grade_column_changed()
+
+    def mark_saved(self):
+        """修改已写入数据库：新成绩成为原始成绩，清空修改记录，只重绘成绩列去掉黄色标记"""
+        for row, _, _, _, grade in self.diff():
+            self._originals[row] = grade
+        self.changes.clear()
+        self.conflicts.clear()
+        self._emit_grade_column_changed()
+
+    def _emit_grade_column_changed(self):
+        if self._rows:
+            self.dataChanged.emit(self.index(0, self.GRADE_COLUMN), self.index(len(self._rows) - 1, self.GRADE_COLUMN))
+
+    def set_fetch_more(self, can_fetch_more=None, fetch_more=None):
+        """设置滚动到底部时的加载回调，传入None关闭滚动加载"""
+        self._can_fetch_more = can_fetch_more
+        self._fetch_more = fetch_more
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._can_fetch_more is None:
+            return False
+        return self._can_fetch_more()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not parent.isValid() and self._fetch_more is not None:
+            self._fetch_more()
+
+    def remove_row(self, row):
+        """删除一行"""
+        key = self._key(self._rows[row])
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.changes.discard(key)
+        self.conflicts.discard(key)
+        del self._rows[row]
+        del self._originals[row]
+        if self._row_index is not None:
+            self._row_index.remove(key)
+        self.endRemoveRows()
+
+    def find_row(self, sno, cno):
+        """按主键查找行号，不在表格中时返回-1"""
+        if self._row_index is None:
+            self._row_index = TableRowIndex()
+            for values in self._rows:
+                self._row_index.append(self._key(values))
+        return self._row_index.row((sno, cno))
+
+    def update_rows(self, match, update):
+        """修改满足match(行)的各行，update(行)返回新的行元组"""
+        changed = []
+        for row, values in enumerate(self._rows):
+            if match(values):
+                updated = self._rows[row] = update(values)
+                changed.append(row)
+                if self._row_index is not None and self._key(updated) != self._key(values):
+                    self._row_index.rename(self._key(values), self._key(updated))
+        if changed:
+            self.dataChanged.emit(self.index(changed[0], 0), self.index(changed[-1], len(self.HEADERS) - 1))
+
+    def remove_rows(self, match):
+        """删除满足match(行)的各行：一次遍历重建行列表，再把视图中保留的位置（当前行、选中行）移到新行号"""
+        removed = [row for row, values in enumerate(self._rows) if match(values)]
+        if len(removed) <= 1:
+            for row in removed:
+                self.remove_row(row)
+            return
+
+        self.layoutAboutToBeChanged.emit()
+        removed_rows = set(removed)
+        for row in removed:
+            key = self._key(self._rows[row])
+            self.changes.discard(key)
+            self.conflicts.discard(key)
+            if self._row_index is not None:
+                self._row_index.remove(key)
+        self._rows = [values for row, values in enumerate(self._rows) if row not in removed_rows]
+        self._originals = [grade for row, grade in enumerate(self._originals) if row not in removed_rows]
+
+        persistent = self.persistentIndexList()
+        moved = [QModelIndex() if index.row() in removed_rows
+                 else self.index(index.row() - bisect.bisect_left(removed, index.row()), index.column())
+                 for index in persistent]
+        self.changePersistentIndexList(persistent, moved)
+        self.layoutChanged.emit()
+
+
+class LookupListModel(QAbstractListModel):
+    """学生、课程选择列表的数据模型，每项显示为“名称 (编号)”，Qt.UserRole为编号
+
+    多个对话框可以共用同一个模型，只需从数据库加载一次；
+    学生列表（fuzzy_names=True）还支持按拼音、首字母和模糊匹配查找姓名，
+    姓名索引由使用方在后台建立后通过set_name_index设置，建立之前只按包含匹配查找
+    """
+
+    name_index_requested = pyqtSignal()  # 需要姓名索引但还没有建立
+    name_index_ready = pyqtSignal()  # 姓名索引已设置，筛选结果需要重新排列
+
+    def __init__(self, items=(), fuzzy_names=False, parent=None):
+        super().__init__(parent)
+        self.fuzzy_names = fuzzy_names
+        self.set_items(items)
+
+    def set_items(self, items):
+        """items: (编号, 名称) 序列"""
+        self.beginResetModel()
+        self.keys = []
+        self.names = []
+        self.labels = []
+        for key, name in items:
+            self.keys.append(key)
+            self.names.append(name)
+            self.labels.append(f"{name} ({key})")
+        self.folded = [label.casefold() for label in self.labels]
+        self.positions = {key: position for position, key in enumerate(self.keys)}
+        self._name_index = None
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.keys)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.labels[index.row()]
+        if role == Qt.UserRole:
+            return self.keys[index.row()]
+        return None
+
+    def name_index(self):
+        """姓名查找索引（键为编号），还没有建立时返回None"""
+        return self._name_index
+
+    def set_name_index(self, index):
+        """设置在后台建立的姓名索引，index必须按当前数据建立"""
+        self._name_index = index
+        self.name_index_ready.emit()
+
+    def contains(self, text, within=None):
+        """显示文本包含text（已转换为小写）的行位置；within为候选位置，None表示全部"""
+        folded = self.folded
+        candidates = range(len(folded)) if within is None else within
+        return [position for position in candidates if text in folded[position]]
+
+    def rank(self, text, hits):
+        """排列匹配结果：姓名索引按匹配程度排好序的结果在前，其余包含匹配按原顺序在后"""
+        if not self.fuzzy_names or any(char.isdigit() for char in text):
+            # 含数字的搜索词是在查编号，不需要姓名索引
+            return hits
+        index = self._name_index
+        if index is None:
+            self.name_index_requested.emit()
+            return hits
+        ranked = [self.positions[key] for key in index.search(text, NAME_SEARCH_LIMIT)
+                  if key in self.positions]
+        seen = set(ranked)
+        return ranked + [position for position in hits if position not in seen]
+
+
+class LookupFilterModel(QAbstractListModel):
+    """LookupListModel的筛选结果，只保存匹配行在源模型中的位置
+
+    新搜索词包含上一次的搜索词时只在上一次的匹配行中查找，
+    连续输入时每次筛选的开销与上一次的匹配数量成正比，而不是与列表长度成正比
+    """
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.text = ""
+        self.rows = None  # 匹配行在源模型中的位置，None表示显示全部
+        self._hits = None  # 上一次按包含匹配到的位置
+        source.modelReset.connect(self.refilter)
+        source.name_index_ready.connect(self.refilter)
+
+    def set_filter(self, text):
+        text = text.strip().casefold()
+        within = self._hits if self.text and self._hits is not None and self.text in text else None
+
+        self.beginResetModel()
+        self.text = text
+        if text:
+            self._hits = self.source.contains(text, within)
+            self.rows = self.source.rank(text, self._hits)
+        else:
+            self._hits = self.rows = None
+        self.endResetModel()
+
+    def refilter(self):
+        """源模型数据变化后重新筛选"""
+        text = self.text
+        self.text, self._hits = "", None
+        self.set_filter(text)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.source.rowCount() if self.rows is None else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row() if self.rows is None else self.rows[index.row()]
+        return self.source.data(self.source.index(row), role)
+
+
+class NameIndexWorker(QRunnable):
+    """在线程池中读取学生基础数据并建立姓名查找索引（拼音转换较慢，20万名学生约需数秒）"""
+
+    def __init__(self, reference_data):
+        super().__init__()
+        self.reference_data = reference_data
+        self.signals = QueryWorkerSignals()  # finished的参数为 (数据版本号, NameLookupIndex)
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            version, rows = self.reference_data.rows("students")
+            index = NameLookupIndex((row[0], row[1]) for row in rows)
+            if not self._cancelled:
+                self.signals.finished.emit((version, index))
+        except Exception as e:
+            if not self._cancelled:
+                self.signals.failed.emit(e)
+        finally:
+            self.signals.done.emit()
+
+
 class AddScoreDialog(QDialog):
     """添加学生成绩对话框 """
 
-    def __init__(self, parent=None, cursor=None):
+    def __init__(self, parent=None, pool=None, student_model=None, course_model=None):
         super().__init__(parent)
-        self.cursor = cursor
+        self.pool = pool
+        # 主窗口共用的学生、课程列表模型，没有时由对话框自己从数据库加载
+        self.student_model = student_model
+        self.course_model = course_model
         self.setWindowTitle("添加学生成绩")
         self.setMinimumWidth(500)
         self.setMinimumHeight(500)
@@ -129,8 +3637,9 @@ class AddScoreDialog(QDialog):
         student_search_layout.addWidget(self.student_search)
 
         # 学生列表
-        self.student_list = QListWidget()
+        self.student_list = QListView()
         self.student_list.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.student_list.setUniformItemSizes(True)  # 行高一致，只需创建和绘制可见的行
 
         # 添加到布局
         student_layout.addLayout(student_search_layout)
@@ -150,8 +3659,9 @@ class AddScoreDialog(QDialog):
         course_search_layout.addWidget(self.course_search)
 
         # 课程列表
-        self.course_list = QListWidget()
+        self.course_list = QListView()
         self.course_list.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.course_list.setUniformItemSizes(True)
 
         # 添加到布局
         course_layout.addLayout(course_search_layout)
@@ -193,82 +3703,69 @@ class AddScoreDialog(QDialog):
         # 连接信号
         self.student_search.textChanged.connect(self.filter_students)
         self.course_search.textChanged.connect(self.filter_courses)
-        self.student_list.itemSelectionChanged.connect(self.update_selected_info)
-        self.course_list.itemSelectionChanged.connect(self.update_selected_info)
+        self.student_list.selectionModel().selectionChanged.connect(self.update_selected_info)
+        self.course_list.selectionModel().selectionChanged.connect(self.update_selected_info)
 
         # 存储数据
         self.selected_student = None
         self.selected_course = None
+        self.selected_student_text = "未选择学生"
+        self.selected_course_text = "未选择课程"
 
     def load_students_data(self):
-        """加载学生数据到列表"""
-        try:
-            self.cursor.execute("SELECT Sno, name FROM Student ORDER BY Sno")
-            students = self.cursor.fetchall()
-
-            for student in students:
-                sno = student[0].strip()
-                name = student[1].strip()
-                item = QListWidgetItem(f"{name} ({sno})")
-                item.setData(Qt.UserRole, sno)
-                self.student_list.addItem(item)
-        except Exception as e:
-            QMessageBox.warning(self, "错误", f"加载学生数据失败: {e}")
+        """加载学生数据到列表，优先使用主窗口共用的模型"""
+        if self.student_model is None:
+            self.student_model = LookupListModel(fuzzy_names=True, parent=self)
+            try:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT Sno, name FROM Student ORDER BY Sno")
+                    students = cursor.fetchall()
+                self.student_model.set_items((sno.strip(), name.strip()) for sno, name in students)
+            except Exception as e:
+                QMessageBox.warning(self, "错误", f"加载学生数据失败: {e}")
+
+        self.student_filter = LookupFilterModel(self.student_model, self)
+        self.student_list.setModel(self.student_filter)
 
     def load_courses_data(self):
-        """加载课程数据到列表"""
-        try:
-            self.cursor.execute("SELECT Cno, course_name FROM Course ORDER BY Cno")
-            courses = self.cursor.fetchall()
-
-            for course in courses:
-                cno = course[0].strip()
-                name = course[1].strip()
-                item = QListWidgetItem(f"{name} ({cno})")
-                item.setData(Qt.UserRole, cno)
-                self.course_list.addItem(item)
-        except Exception as e:
-            QMessageBox.warning(self, "错误", f"加载课程数据失败: {e}")
+        """加载课程数据到列表，优先使用主窗口共用的模型"""
+        if self.course_model is None:
+            self.course_model = LookupListModel(parent=self)
+            try:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT Cno, course_name FROM Course ORDER BY Cno")
+                    courses = cursor.fetchall()
+                self.course_model.set_items((cno.strip(), name.strip()) for cno, name in courses)
+            except Exception as e:
+                QMessageBox.warning(self, "错误", f"加载课程数据失败: {e}")
+
+        self.course_filter = LookupFilterModel(self.course_model, self)
+        self.course_list.setModel(self.course_filter)
 
     def filter_students(self, text):
-        """过滤学生列表"""
-        text = text.lower()
-        for i in range(self.student_list.count()):
-            item = self.student_list.item(i)
-            if text in item.text().lower() or not text:
-                item.setHidden(False)
-            else:
-                item.setHidden(True)
+        """过滤学生列表，姓名也可以按拼音、首字母和模糊匹配"""
+        self.student_filter.set_filter(text)
 
     def filter_courses(self, text):
         """过滤课程列表"""
-        text = text.lower()
-        for i in range(self.course_list.count()):
-            item = self.course_list.item(i)
-            if text in item.text().lower() or not text:
-                item.setHidden(False)
-            else:
-                item.setHidden(True)
+        self.course_filter.set_filter(text)
 
     def update_selected_info(self):
-        """更新选择信息"""
-        selected_student_items = self.student_list.selectedItems()
-        selected_course_items = self.course_list.selectedItems()
-
-        student_text = "未选择学生"
-        course_text = "未选择课程"
+        """更新选择信息（筛选后已选中的项不在列表中时保留原来的选择）"""
+        selected_students = self.student_list.selectionModel().selectedIndexes()
+        selected_courses = self.course_list.selectionModel().selectedIndexes()
 
-        if selected_student_items:
-            item = selected_student_items[0]
-            student_text = item.text()
-            self.selected_student = item.data(Qt.UserRole)
+        if selected_students:
+            self.selected_student_text = selected_students[0].data()
+            self.selected_student = selected_students[0].data(Qt.UserRole)
 
-        if selected_course_items:
-            item = selected_course_items[0]
-            course_text = item.text()
-            self.selected_course = item.data(Qt.UserRole)
+        if selected_courses:
+            self.selected_course_text = selected_courses[0].data()
+            self.selected_course = selected_courses[0].data(Qt.UserRole)
 
-        self.selected_info.setText(f"学生: {student_text} | 课程: {course_text}")
+        self.selected_info.setText(f"学生: {self.selected_student_text} | 课程: {self.selected_course_text}")
 
     def get_score_data(self):
         """获取成绩数据"""
@@ -387,15 +3884,61 @@ class StudentManagementSystem(QMainWindow):
         font.setStyleHint(QFont.SansSerif)
         QApplication.setFont(font)
 
+        # 其他客户端修改的同步，本程序的连接都带上它的客户端标识
+        self.change_feed = ChangeFeed()
+
         # 显示登录对话框
         if not self.show_login_dialog():
             # 登录失败，退出应用
             sys.exit(1)
 
+        # 后台查询执行器，各视图当前正在执行的查询
+        self.query_executor = QueryExecutor(self.pool, self)
+        self.view_queries = {}
+        # 学生管理/课程管理表格当前结果对应的搜索词，查询未完成时为None
+        self.table_search_text = {}
+        # 成绩表格当前结果对应的搜索条件，分页浏览时为None（其他用户新增的记录由翻页取得）
+        self.score_view_criteria = SearchCriteria()
+        # 学生管理/课程管理表格的 第一列 -> 行号 索引，数据修改时据此定位行
+        self.table_row_index = {}
+        self.import_worker = None  # 正在执行的后台导入任务
+        self.course_report_worker = None  # 正在执行的按课程导出任务
+        self.query_stats_dialog = None
+
+        # 学生成绩联表数据的本地缓存，首次加载后由本程序的写操作同步更新
+        self.score_cache = ScoreColumnStore()
+        # 学生、课程基础数据缓存，以及由它生成的选择列表模型和课程筛选下拉框对应的版本号
+        self.reference_data = ReferenceDataCache(self.pool)
+        self.lookup_models = {}  # 类别 -> (版本号, LookupListModel)
+        self.name_index_worker = None  # 正在后台建立的学生姓名索引
+        self.pending_name_search = False  # 成绩搜索正在等待姓名索引
+        self.course_filter_version = None
+
+        # 加载状态提示
+        self.loading_label = QLabel("正在加载...")
+        self.loading_label.setStyleSheet("color: #2196f3; font-weight: bold; padding: 0 8px;")
+        self.loading_label.setVisible(False)
+        self.statusBar().addPermanentWidget(self.loading_label)
+
+        # 数据修改事件：先更新缓存，再更新三个页面的表格
+        self.change_bus = ChangeEventBus(self)
+        self.change_bus.changed.connect(self.apply_change_to_caches)
+        self.change_bus.changed.connect(self.apply_change_to_score_view)
+        self.change_bus.changed.connect(self.apply_change_to_student_view)
+        self.change_bus.changed.connect(self.apply_change_to_course_view)
+
+        # 定时读取其他客户端的修改，上一次读取完成后才开始计时
+        self.change_feed_worker = None
+        self.change_feed_timer = QTimer(self)
+        self.change_feed_timer.setSingleShot(True)
+        self.change_feed_timer.setInterval(CHANGE_FEED_CONFIG['poll_interval_ms'])
+        self.change_feed_timer.timeout.connect(self.poll_change_feed)
+
         # 初始化UI
         self.init_ui()
 
-        # 加载学生数据
+        # 开始同步其他客户端的修改（首次读取时检查ChangeLog并确定读取起点），然后加载学生数据
+        self.poll_change_feed()
         self.load_students()
 
     def apply_dialog_style(self, dialog):
@@ -503,21 +4046,22 @@ class StudentManagementSystem(QMainWindow):
             try:
                 # 尝试连接数据库
                 conn_str = f"DRIVER={DB_CONFIG['driver']};SERVER={DB_CONFIG['server']};DATABASE={DB_CONFIG['database']};UID={credentials['username']};PWD={credentials['password']}"
-                self.conn = pyodbc.connect(conn_str)
-                self.cursor = self.conn.cursor()
+                self.pool = ConnectionPool(conn_str, on_connect=self.change_feed.tag_connection)
 
-                # 记录登录
-                self.current_user = credentials['username']
-                logging.info(f"用户 {self.current_user} 登录成功")
+                # 借出第一个连接，同时验证登录凭据
+                with self.pool.connection() as conn:
+                    # 记录登录
+                    self.current_user = credentials['username']
+                    logging.info(f"用户 {self.current_user} 登录成功")
 
-                # 检查用户表是否存在，更新最后登录时间
-                try:
-                    self.cursor.execute("UPDATE Users SET last_login = GETDATE() WHERE username = ?",
-                                        (self.current_user,))
-                    self.conn.commit()
-                except:
-                    # 用户表可能不存在，忽略错误
-                    pass
+                    # 检查用户表是否存在，更新最后登录时间
+                    try:
+                        conn.cursor().execute("UPDATE Users SET last_login = GETDATE() WHERE username = ?",
+                                              (self.current_user,))
+                        conn.commit()
+                    except:
+                        # 用户表可能不存在，忽略错误
+                        pass
 
                 return True
 
@@ -575,6 +4119,9 @@ class StudentManagementSystem(QMainWindow):
         # 学生表格
         self.create_student_table(student_score_layout)
 
+        # 分页浏览
+        self.create_pagination_bar(student_score_layout)
+
         # 按钮区域
         self.create_buttons(student_score_layout)
 
@@ -660,6 +4207,7 @@ class StudentManagementSystem(QMainWindow):
         self.search_btn.clicked.connect(self.search_students)
         self.reset_btn.clicked.connect(self.reset_search)
         self.search_input.returnPressed.connect(self.search_students)
+        self.connect_live_search(self.search_input, self.live_search_students)
 
         # 基本搜索行布局
         basic_search_layout.addWidget(QLabel("搜索字段:"))
@@ -767,6 +4315,8 @@ class StudentManagementSystem(QMainWindow):
         else:
             # 文本字段
             self.search_operator.addItems(["包含", "等于", "开头是", "结尾是"])
+            if field_text == "姓名":
+                self.search_operator.addItem(NAME_MATCH_OPERATOR)
 
     def toggle_advanced_search(self, state):
         """切换高级搜索面板显示状态"""
@@ -782,17 +4332,27 @@ class StudentManagementSystem(QMainWindow):
             self.sort_order.setCurrentIndex(0)
 
     def load_course_filter_data(self):
-        """加载课程数据到筛选下拉框"""
+        """加载课程数据到筛选下拉框，课程数据没有变化时不重新加载"""
         try:
-            self.cursor.execute("SELECT Cno, course_name FROM Course ORDER BY Cno")
-            courses = self.cursor.fetchall()
-
-            for course in courses:
-                cno = course[0].strip()
-                name = course[1].strip()
-                self.course_filter.addItem(f"{name} ({cno})")
+            version, courses = self.reference_data.rows("courses")
         except Exception as e:
             logging.error(f"加载课程筛选数据错误: {e}")
+            return
+
+        if version == self.course_filter_version:
+            return
+
+        # 保留"所有课程"和当前选择
+        current = self.course_filter.currentText()
+        while self.course_filter.count() > 1:
+            self.course_filter.removeItem(1)
+
+        for cno, name, _ in courses:
+            self.course_filter.addItem(f"{name} ({cno})")
+
+        index = self.course_filter.findText(current)
+        self.course_filter.setCurrentIndex(max(index, 0))
+        self.course_filter_version = version
 
     def apply_grade_preset(self, index):
         """应用成绩预设"""
@@ -832,165 +4392,115 @@ class StudentManagementSystem(QMainWindow):
 
     def search_students(self):
         """根据高级搜索条件筛选学生"""
-        try:
-            # 断开信号，防止加载数据时触发编辑信号
-            self.table.itemChanged.disconnect(self.on_cell_changed)
-        except:
-            pass
-
-        try:
-            # 基本搜索参数
-            search_text = self.search_input.text().strip()
-            field_index = self.search_field.currentIndex()
-            field_text = self.search_field.currentText()
-            operator = self.search_operator.currentText()
-
-            # 构建基本查询
-            query = """
-            SELECT s.Sno, s.name, sc.Cno, c.Credit, sc.Grade, c.course_name
-            FROM Student_Score sc
-            JOIN Student s ON sc.Sno = s.Sno
-            JOIN Course c ON sc.Cno = c.Cno
-            WHERE 1=1
-            """
-
-            params = []
-
-            # 添加基本搜索条件
-            if search_text:
-                if field_index == 0:  # 全部字段
-                    query += " AND (s.Sno LIKE ? OR s.name LIKE ? OR sc.Cno LIKE ? OR c.course_name LIKE ?)"
-                    params.extend([f"%{search_text}%", f"%{search_text}%", f"%{search_text}%", f"%{search_text}%"])
-                else:
-                    # 根据字段类型和操作符构建条件
-                    if field_text == "学号":
-                        field_name = "s.Sno"
-                    elif field_text == "姓名":
-                        field_name = "s.name"
-                    elif field_text == "课程号":
-                        field_name = "sc.Cno"
-                    elif field_text == "学分":
-                        field_name = "c.Credit"
-                    elif field_text == "成绩":
-                        field_name = "sc.Grade"
-
-                    # 构建条件
-                    if field_text in ["学分", "成绩"]:
-                        # 数值比较
-                        try:
-                            value = float(search_text)
-                            if operator == "等于":
-                                query += f" AND {field_name} = ?"
-                            elif operator == "大于":
-                                query += f" AND {field_name} > ?"
-                            elif operator == "小于":
-                                query += f" AND {field_name} < ?"
-                            elif operator == "大于等于":
-                                query += f" AND {field_name} >= ?"
-                            elif operator == "小于等于":
-                                query += f" AND {field_name} <= ?"
-                            elif operator == "不等于":
-                                query += f" AND {field_name} <> ?"
-                            params.append(value)
-                        except ValueError:
-                            QMessageBox.warning(self, "输入错误", f"{field_text}必须是数字")
-                            return
-                    else:
-                        # 文本比较
-                        if operator == "包含":
-                            query += f" AND {field_name} LIKE ?"
-                            params.append(f"%{search_text}%")
-                        elif operator == "等于":
-                            query += f" AND {field_name} = ?"
-                            params.append(search_text)
-                        elif operator == "开头是":
-                            query += f" AND {field_name} LIKE ?"
-                            params.append(f"{search_text}%")
-                        elif operator == "结尾是":
-                            query += f" AND {field_name} LIKE ?"
-                            params.append(f"%{search_text}")
-
-            # 添加高级筛选条件，如果高级搜索面板可见
-            if self.advanced_search_widget.isVisible():
-                # 课程筛选
-                selected_course = self.course_filter.currentText()
-                if selected_course != "所有课程":
-                    course_cno = selected_course.split("(")[-1].split(")")[0].strip()
-                    query += " AND sc.Cno = ?"
-                    params.append(course_cno)
-
-                # 成绩范围筛选
-                min_grade_text = self.min_grade.text().strip()
-                max_grade_text = self.max_grade.text().strip()
-
-                if min_grade_text:
-                    try:
-                        min_grade = float(min_grade_text)
-                        query += " AND sc.Grade >= ?"
-                        params.append(min_grade)
-                    except ValueError:
-                        QMessageBox.warning(self, "输入错误", "最低分必须是数字")
-                        return
+        criteria = self.build_search_criteria()
+        if criteria is not None:
+            self.apply_search_criteria(criteria)
+
+    def live_search_students(self):
+        """边输入边搜索：输入不完整（如数值还没输完）时不提示错误，等待继续输入"""
+        if not self.search_input.text().strip() and not self.advanced_search_widget.isVisible():
+            # 清空搜索词时恢复为普通浏览（分页浏览时回到第一页）
+            self.load_students()
+            return
+        criteria = self.build_search_criteria(show_errors=False)
+        if criteria is not None:
+            self.apply_search_criteria(criteria)
+
+    def apply_search_criteria(self, criteria):
+        """执行搜索：已建立本地缓存时在缓存上筛选，否则在后台线程查询（取代尚未完成的上一次查询）"""
+        self.score_view_criteria = criteria
+        if self.score_cache.loaded:
+            self.show_cached_scores(criteria.indices(self.score_cache), "找到 {} 条匹配记录")
+            return
 
-                if max_grade_text:
-                    try:
-                        max_grade = float(max_grade_text)
-                        query += " AND sc.Grade <= ?"
-                        params.append(max_grade)
-                    except ValueError:
-                        QMessageBox.warning(self, "输入错误", "最高分必须是数字")
-                        return
+        # 构建基本查询
+        query = """
+        SELECT s.Sno, s.name, sc.Cno, c.Credit, sc.Grade, c.course_name
+        FROM Student_Score sc
+        JOIN Student s ON sc.Sno = s.Sno
+        JOIN Course c ON sc.Cno = c.Cno
+        WHERE 1=1
+        """
+        conditions, params = criteria.to_sql()
+
+        # 后台执行查询，结果分批填充到表格模型（只显示前5列，不显示course_name）
+        self.run_score_query(query + conditions, params, "找到 {} 条匹配记录", "搜索学生数据")
+
+    def build_search_criteria(self, show_errors=True):
+        """把搜索栏和高级搜索面板的状态转换为SearchCriteria，输入有误时返回None
+
+        show_errors: 输入有误时是否弹出提示
+        """
+        criteria = SearchCriteria()
+
+        def invalid(message):
+            if show_errors:
+                QMessageBox.warning(self, "输入错误", message)
+            return None
 
-                # 排序
-                sort_field = self.sort_field.currentText()
-                sort_order = "ASC" if self.sort_order.currentText() == "升序" else "DESC"
-
-                if sort_field == "学号":
-                    query += f" ORDER BY s.Sno {sort_order}"
-                elif sort_field == "姓名":
-                    query += f" ORDER BY s.name {sort_order}"
-                elif sort_field == "课程号":
-                    query += f" ORDER BY sc.Cno {sort_order}"
-                elif sort_field == "学分":
-                    query += f" ORDER BY c.Credit {sort_order}"
-                elif sort_field == "成绩":
-                    query += f" ORDER BY sc.Grade {sort_order}"
+        # 基本搜索参数
+        search_text = self.search_input.text().strip()
+        field_index = self.search_field.currentIndex()
+        field_text = self.search_field.currentText()
+        operator = self.search_operator.currentText()
+
+        # 添加基本搜索条件
+        if search_text:
+            if field_index == 0:  # 全部字段
+                criteria.set_any_text(search_text)
+            elif field_text in ["学分", "成绩"]:
+                # 数值比较
+                try:
+                    criteria.add(field_text, operator, float(search_text))
+                except ValueError:
+                    return invalid(f"{field_text}必须是数字")
+            elif operator == NAME_MATCH_OPERATOR:
+                index = self.student_name_index()
+                if index is None:
+                    # 姓名索引在后台建立，建立完成后自动重新搜索
+                    self.pending_name_search = True
+                    self.statusBar().showMessage("正在建立姓名拼音索引，完成后自动搜索...")
+                    return None
+                criteria.add_name_match(search_text, index.search(search_text, NAME_SEARCH_LIMIT))
             else:
-                # 默认排序
-                query += " ORDER BY s.Sno, sc.Cno"
-
-            # 执行查询
-            self.cursor.execute(query, params)
-            records = self.cursor.fetchall()
-
-            # 清空表格
-            self.table.setRowCount(0)
-
-            # 添加数据到表格
-            for i, record in enumerate(records):
-                self.table.insertRow(i)
-                # 只显示前5列（不显示course_name）
-                for j in range(5):
-                    value = record[j]
-                    # 修复空格问题
-                    if j in [0, 1, 2] and value is not None:
-                        value = str(value).strip()
-                    self.table.setItem(i, j, QTableWidgetItem(str(value)))
+                # 文本比较
+                criteria.add(field_text, operator, search_text)
+
+        # 添加高级筛选条件，如果高级搜索面板可见
+        if self.advanced_search_widget.isVisible():
+            # 课程筛选
+            selected_course = self.course_filter.currentText()
+            if selected_course != "所有课程":
+                course_cno = selected_course.split("(")[-1].split(")")[0].strip()
+                criteria.add("课程号", "等于", course_cno)
+
+            # 成绩范围筛选
+            min_grade_text = self.min_grade.text().strip()
+            max_grade_text = self.max_grade.text().strip()
+
+            if min_grade_text:
+                try:
+                    criteria.add("成绩", "大于等于", float(min_grade_text))
+                except ValueError:
+                    return invalid("最低分必须是数字")
 
-            # 更新状态栏
-            self.statusBar().showMessage(f"找到 {len(records)} 条匹配记录")
+            if max_grade_text:
+                try:
+                    criteria.add("成绩", "小于等于", float(max_grade_text))
+                except ValueError:
+                    return invalid("最高分必须是数字")
 
-        except pyodbc.Error as e:
-            logging.error(f"搜索学生数据错误: {e}")
-            QMessageBox.warning(self, "错误", f"搜索学生数据失败: {e}")
+            # 排序
+            criteria.set_sort(self.sort_field.currentText(), self.sort_order.currentText() != "升序")
 
-        # 重新连接信号
-        self.table.itemChanged.connect(self.on_cell_changed)
+        return criteria
 
     def create_student_table(self, parent_layout):
         """创建学生表格"""
-        self.table = QTableWidget(0, 5)  # 5列：学号、姓名、课程号、学分、成绩
-        self.table.setHorizontalHeaderLabels(["学号", "姓名", "课程号", "学分", "成绩"])
+        # 5列：学号、姓名、课程号、学分、成绩
+        self.score_model = ScoreTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.score_model)
 
         # 设置表格属性
         self.table.setEditTriggers(QAbstractItemView.DoubleClicked)
@@ -1003,11 +4513,150 @@ class StudentManagementSystem(QMainWindow):
         # 设置列宽
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 
+        # 固定行高，避免大数据量时逐行计算行高
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(self.table.fontMetrics().height() + 10)
+
         # 连接单元格编辑信号
-        self.table.itemChanged.connect(self.on_cell_changed)
+        self.score_model.grade_edited.connect(self.on_cell_changed)
 
         parent_layout.addWidget(self.table)
 
+    def current_score_row(self):
+        """获取成绩表格当前选中的行号，未选中时返回-1"""
+        index = self.table.currentIndex()
+        return index.row() if index.isValid() else -1
+
+    def create_pagination_bar(self, parent_layout):
+        """创建分页浏览栏"""
+        # 分页器，None表示不分页
+        self.pager = None
+
+        page_layout = QHBoxLayout()
+
+        self.paging_check = QCheckBox("分页浏览")
+        self.paging_check.stateChanged.connect(self.toggle_pagination)
+
+        self.page_size_combo = QComboBox()
+        for size in PAGE_SIZES:
+            self.page_size_combo.addItem(f"{size} 条/页", size)
+        self.page_size_combo.setCurrentIndex(PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
+        self.page_size_combo.currentIndexChanged.connect(self.change_page_size)
+
+        self.prev_page_btn = self.create_button("上一页", "#607d8b")
+        self.next_page_btn = self.create_button("下一页", "#607d8b")
+        self.prev_page_btn.clicked.connect(self.load_previous_page)
+        self.next_page_btn.clicked.connect(lambda: self.load_next_page())
+
+        self.page_label = QLabel()
+
+        self.jump_sno_input = QLineEdit()
+        self.jump_sno_input.setPlaceholderText("输入学号跳转")
+        self.jump_sno_input.setMaximumWidth(150)
+        self.jump_sno_input.returnPressed.connect(self.jump_to_student)
+        self.jump_btn = self.create_button("跳转", "#2196f3")
+        self.jump_btn.clicked.connect(self.jump_to_student)
+
+        page_layout.addWidget(self.paging_check)
+        page_layout.addWidget(self.page_size_combo)
+        page_layout.addStretch(1)
+        page_layout.addWidget(self.prev_page_btn)
+        page_layout.addWidget(self.page_label)
+        page_layout.addWidget(self.next_page_btn)
+        page_layout.addStretch(1)
+        page_layout.addWidget(QLabel("学号:"))
+        page_layout.addWidget(self.jump_sno_input)
+        page_layout.addWidget(self.jump_btn)
+
+        parent_layout.addLayout(page_layout)
+        self.update_pagination_controls()
+
+    def toggle_pagination(self, state):
+        """切换分页浏览模式"""
+        if state == Qt.Checked:
+            self.pager = KeysetPager(self.page_size_combo.currentData())
+        else:
+            self.pager = None
+        self.load_students()
+
+    def change_page_size(self):
+        """修改每页行数后从第一页重新浏览"""
+        if self.pager is not None:
+            self.pager = KeysetPager(self.page_size_combo.currentData())
+            self.load_first_page()
+
+    def update_pagination_controls(self):
+        """根据分页状态更新翻页按钮和页码显示"""
+        paging = self.pager is not None
+        self.page_size_combo.setEnabled(paging)
+        self.jump_sno_input.setEnabled(paging)
+        self.jump_btn.setEnabled(paging)
+        self.prev_page_btn.setEnabled(paging and self.pager.has_previous)
+        self.next_page_btn.setEnabled(paging and self.pager.has_next)
+
+        if not paging:
+            self.page_label.setText("")
+        elif self.pager.page_number is not None:
+            self.page_label.setText(f"第 {self.pager.page_number} 页")
+        elif self.pager.first_key is not None:
+            self.page_label.setText(f"从学号 {str(self.pager.first_key[0]).strip()} 开始")
+        else:
+            self.page_label.setText("")
+
+    def load_first_page(self):
+        """分页浏览：第一页"""
+        self.run_page_query("first", *self.pager.first_page())
+
+    def load_next_page(self, append=False):
+        """分页浏览：下一页，append为True时追加到当前表格末尾（滚动加载）"""
+        if self.pager is not None and self.pager.has_next:
+            self.run_page_query("next", *self.pager.next_page(), append=append)
+
+    def load_previous_page(self):
+        """分页浏览：上一页"""
+        if self.pager is not None and self.pager.has_previous:
+            self.run_page_query("previous", *self.pager.previous_page())
+
+    def jump_to_student(self):
+        """分页浏览：跳转到指定学号所在的位置"""
+        sno = self.jump_sno_input.text().strip()
+        if self.pager is None or not sno:
+            return
+        self.run_page_query("seek", *self.pager.seek(sno))
+
+    def run_page_query(self, direction, query, params, append=False):
+        """后台查询一页成绩数据"""
+        page_rows = []
+        pager = self.pager
+        self.score_view_criteria = None
+
+        def finished(stream):
+            if pager is not self.pager:
+                return
+
+            rows = pager.apply(page_rows, direction, append)
+            if append:
+                self.score_model.append_rows(rows)
+            elif rows or direction in ("first", "seek"):
+                self.score_model.set_rows(rows)
+                self.table.scrollToTop()
+
+            self.update_pagination_controls()
+            if rows:
+                self.statusBar().showMessage(
+                    f"已加载 {len(rows)} 条学生成绩记录（耗时 {stream.elapsed:.2f} 秒）")
+            else:
+                self.statusBar().showMessage("没有更多记录")
+
+        self.score_model.set_fetch_more(
+            lambda: self.pager is not None and self.pager.has_next and "scores" not in self.view_queries,
+            lambda: self.load_next_page(append=True)
+        )
+        self.statusBar().showMessage("正在加载学生成绩...")
+        self.start_view_query("scores", query, params, on_rows=page_rows.extend, on_finished=finished,
+                              error_text="加载学生数据")
+        self.update_pagination_controls()
+
     def create_student_management_tab(self, parent_layout):
         """创建学生管理标签页"""
         # 学生表格
@@ -1030,6 +4679,7 @@ class StudentManagementSystem(QMainWindow):
         self.student_search_input = QLineEdit()
         self.student_search_input.setPlaceholderText("输入学号或姓名搜索...")
         self.student_search_input.returnPressed.connect(self.search_student)
+        self.connect_live_search(self.student_search_input, self.search_student)
 
         search_btn = self.create_button("搜索", "#2196f3")
         search_btn.clicked.connect(self.search_student)
@@ -1105,6 +4755,7 @@ class StudentManagementSystem(QMainWindow):
         self.course_search_input = QLineEdit()
         self.course_search_input.setPlaceholderText("输入课程号或课程名称搜索...")
         self.course_search_input.returnPressed.connect(self.search_course)
+        self.connect_live_search(self.course_search_input, self.search_course)
 
         search_btn = self.create_button("搜索", "#2196f3")
         search_btn.clicked.connect(self.search_course)
@@ -1125,10 +4776,11 @@ class StudentManagementSystem(QMainWindow):
         add_course_btn = self.create_button("添加课程", "#4caf50")
         edit_course_btn = self.create_button("编辑课程", "#2196f3")
         delete_course_btn = self.create_button("删除课程", "#f44336")
+        export_by_course_btn = self.create_button("按课程导出", "#795548")
         refresh_course_btn = self.create_button("刷新", "#9c27b0")
 
         # 设置按钮大小策略
-        for btn in [add_course_btn, edit_course_btn, delete_course_btn, refresh_course_btn]:
+        for btn in [add_course_btn, edit_course_btn, delete_course_btn, export_by_course_btn, refresh_course_btn]:
             btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
 
         # 添加到布局
@@ -1136,6 +4788,7 @@ class StudentManagementSystem(QMainWindow):
         button_layout.addWidget(edit_course_btn)
         button_layout.addWidget(delete_course_btn)
         button_layout.addStretch(1)
+        button_layout.addWidget(export_by_course_btn)
         button_layout.addWidget(refresh_course_btn)
 
         button_group.setLayout(button_layout)
@@ -1144,6 +4797,7 @@ class StudentManagementSystem(QMainWindow):
         add_course_btn.clicked.connect(self.add_course)
         edit_course_btn.clicked.connect(self.edit_course)
         delete_course_btn.clicked.connect(self.delete_course)
+        export_by_course_btn.clicked.connect(self.export_by_course)
         refresh_course_btn.clicked.connect(self.load_courses)
 
         # 添加到主布局
@@ -1232,28 +4886,33 @@ class StudentManagementSystem(QMainWindow):
         self.edit_btn = self.create_button("编辑成绩", "#2196f3")
         self.delete_btn = self.create_button("删除成绩", "#f44336")
         self.save_btn = self.create_button("保存修改", "#9c27b0")
+        self.discard_btn = self.create_button("放弃修改", "#9e9e9e")
         self.refresh_btn = self.create_button("刷新数据", "#607d8b")
 
         # 设置按钮大小策略
-        for btn in [self.add_btn, self.edit_btn, self.delete_btn, self.save_btn, self.refresh_btn]:
+        for btn in [self.add_btn, self.edit_btn, self.delete_btn, self.save_btn, self.discard_btn, self.refresh_btn]:
             btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
 
         operations_layout.addWidget(self.add_btn)
         operations_layout.addWidget(self.edit_btn)
         operations_layout.addWidget(self.delete_btn)
         operations_layout.addWidget(self.save_btn)
+        operations_layout.addWidget(self.discard_btn)
         operations_layout.addWidget(self.refresh_btn)
 
         # 导入导出按钮
         import_export_layout = QHBoxLayout()
         self.import_btn = self.create_button("导入Excel", "#ff9800")
-        self.export_btn = self.create_button("导出Excel", "#795548")
+        self.export_btn = self.create_button("导出数据", "#795548")
+        self.export_all_btn = self.create_button("导出全部", "#795548")
 
         self.import_btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
         self.export_btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        self.export_all_btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
 
         import_export_layout.addWidget(self.import_btn)
         import_export_layout.addWidget(self.export_btn)
+        import_export_layout.addWidget(self.export_all_btn)
 
         # 添加到主布局
         btn_layout.addLayout(operations_layout, 3)  # 操作按钮占3份
@@ -1268,9 +4927,11 @@ class StudentManagementSystem(QMainWindow):
         self.edit_btn.clicked.connect(self.edit_student_score)
         self.delete_btn.clicked.connect(self.delete_student_score)
         self.save_btn.clicked.connect(self.save_all_changes)
-        self.refresh_btn.clicked.connect(self.load_students)
+        self.discard_btn.clicked.connect(self.discard_all_changes)
+        self.refresh_btn.clicked.connect(self.reload_students)
         self.import_btn.clicked.connect(self.import_excel)
         self.export_btn.clicked.connect(self.export_excel)
+        self.export_all_btn.clicked.connect(self.export_all_excel)
 
     def init_menu(self):
         """初始化菜单栏 - 删除管理菜单"""
@@ -1283,16 +4944,31 @@ class StudentManagementSystem(QMainWindow):
         import_action.triggered.connect(self.import_excel)
         file_menu.addAction(import_action)
 
-        export_action = QAction("导出Excel", self)
+        export_action = QAction("导出数据", self)
         export_action.triggered.connect(self.export_excel)
         file_menu.addAction(export_action)
 
+        export_all_action = QAction("导出全部数据", self)
+        export_all_action.triggered.connect(self.export_all_excel)
+        file_menu.addAction(export_all_action)
+
+        export_by_course_action = QAction("按课程导出成绩", self)
+        export_by_course_action.triggered.connect(self.export_by_course)
+        file_menu.addAction(export_by_course_action)
+
         file_menu.addSeparator()
 
         exit_action = QAction("退出", self)
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
 
+        # 工具菜单
+        tools_menu = menubar.addMenu("工具")
+
+        query_stats_action = QAction("数据库查询统计", self)
+        query_stats_action.triggered.connect(self.show_query_stats)
+        tools_menu.addAction(query_stats_action)
+
         # 帮助菜单
         help_menu = menubar.addMenu("帮助")
 
@@ -1343,84 +5019,520 @@ class StudentManagementSystem(QMainWindow):
         return btn
 
     def load_students(self):
-        """从数据库加载学生成绩数据"""
-        try:
-            # 断开信号，防止加载数据时触发编辑信号
-            self.table.itemChanged.disconnect(self.on_cell_changed)
-        except:
-            pass
-
-        try:
-            # 执行查询，获取学生成绩数据
-            query = """
-            SELECT s.Sno, s.name, sc.Cno, c.Credit, sc.Grade
-            FROM Student_Score sc
-            JOIN Student s ON sc.Sno = s.Sno
-            JOIN Course c ON sc.Cno = c.Cno
-            ORDER BY s.Sno, sc.Cno
-            """
-            self.cursor.execute(query)
-            records = self.cursor.fetchall()
-
-            # 清空表格
-            self.table.setRowCount(0)
-
-            # 添加数据到表格
-            for i, record in enumerate(records):
-                self.table.insertRow(i)
-                for j, value in enumerate(record):
-                    # 修复空格问题 - 字符串类型数据去除空格
-                    if j in [0, 1, 2] and value is not None:  # 学号、姓名、课程号字段
-                        value = str(value).strip()
-                    self.table.setItem(i, j, QTableWidgetItem(str(value)))
+        """加载学生成绩数据：本地缓存已建立时直接显示缓存，否则在后台线程查询并建立缓存"""
+        # 执行查询，获取学生成绩数据（课程名称只用于缓存，不在表格中显示）
+        query = """
+        SELECT s.Sno, s.name, sc.Cno, c.Credit, sc.Grade, c.course_name
+        FROM Student_Score sc
+        JOIN Student s ON sc.Sno = s.Sno
+        JOIN Course c ON sc.Cno = c.Cno
+        ORDER BY s.Sno, sc.Cno
+        """
+        if self.pager is not None:
+            # 分页浏览时只加载第一页
+            self.load_first_page()
+        elif self.score_cache.loaded:
+            self.score_view_criteria = SearchCriteria()
+            self.show_cached_scores(None, "已加载 {} 条学生成绩记录")
+        else:
+            self.score_view_criteria = SearchCriteria()
+            self.run_score_query(query, (), "已加载 {} 条学生成绩记录", "加载学生数据", cache=self.score_cache)
 
-            # 动态更新搜索下拉框
-            # 首先保留"全部字段"选项，清除其他选项
-            while self.search_field.count() > 1:
-                self.search_field.removeItem(1)
+        # 动态更新搜索下拉框
+        # 首先保留"全部字段"选项，清除其他选项
+        while self.search_field.count() > 1:
+            self.search_field.removeItem(1)
 
-            # 添加表格的列名到搜索下拉框
-            for i in range(self.table.columnCount()):
-                column_name = self.table.horizontalHeaderItem(i).text()
-                self.search_field.addItem(column_name)
+        # 添加表格的列名到搜索下拉框
+        for i in range(self.score_model.columnCount()):
+            column_name = self.score_model.headerData(i, Qt.Horizontal)
+            self.search_field.addItem(column_name)
 
-            # 更新状态栏
-            self.statusBar().showMessage(f"已加载 {len(records)} 条学生成绩记录")
+    def load_courses(self):
+        """加载课程数据：课程数据没有变化时直接使用缓存，否则在后台线程查询并更新缓存"""
+        if self.reference_data.is_fresh("courses"):
+            _, courses = self.reference_data.rows("courses")
+            self.cancel_view_query("courses")
+            self.clear_table_rows(self.course_table)
+            self.append_table_rows(self.course_table, courses)
+            self.table_search_text["courses"] = ""
+            self.statusBar().showMessage(f"已加载 {len(courses)} 门课程（本地缓存）")
+            return
 
-        except pyodbc.Error as e:
-            logging.error(f"加载学生数据错误: {e}")
-            QMessageBox.warning(self, "错误", f"加载学生数据失败: {e}")
+        version = self.reference_data.version("courses")
+        self.run_table_query("courses", self.course_table, REFERENCE_QUERIES["courses"], (), "已加载 {} 门课程",
+                             "加载课程数据",
+                             on_complete=lambda rows: self.reference_data.store("courses", version, rows))
+
+    def start_view_query(self, view, query, params, on_rows, on_finished, error_text, on_progress=None):
+        """在后台执行某个视图的查询
+
+        同一视图的新查询会取代尚未完成的旧查询，旧查询的结果不再显示
+        view: 视图名称，如 "scores"、"students"、"courses"
+        on_finished: 查询完成时调用，参数为ResultStream
+        """
+        previous = self.view_queries.pop(view, None)
+        if previous is not None:
+            previous.cancel()
+
+        worker = None
+
+        def is_current():
+            return worker is not None and self.view_queries.get(view) is worker
+
+        def handle_rows(rows):
+            if is_current():
+                on_rows(rows)
+
+        def handle_finished(stream):
+            if is_current():
+                on_finished(stream)
+
+        def handle_progress(rows, rows_per_second):
+            if is_current() and on_progress is not None:
+                on_progress(rows, rows_per_second)
+
+        def handle_failed(error):
+            if is_current():
+                logging.error(f"{error_text}错误: {error}")
+                QMessageBox.warning(self, "错误", f"{error_text}失败: {error}")
+
+        def handle_done():
+            if is_current():
+                del self.view_queries[view]
+            self.update_loading_state()
+
+        worker = self.query_executor.submit(query, params, handle_rows, handle_finished, handle_failed, handle_done,
+                                            on_progress=handle_progress)
+        self.view_queries[view] = worker
+
+        self.update_loading_state()
+        return worker
+
+    def cancel_view_query(self, view):
+        """取消某个视图正在执行的查询"""
+        previous = self.view_queries.pop(view, None)
+        if previous is not None:
+            previous.cancel()
+            self.update_loading_state()
+
+    def update_loading_state(self):
+        """有查询正在执行时在状态栏显示加载状态"""
+        self.loading_label.setVisible(bool(self.view_queries))
+
+    def show_query_finished(self, done_message, stream):
+        """在状态栏显示查询结果数量和吞吐量"""
+        self.statusBar().showMessage(
+            f"{done_message.format(stream.rows)}（耗时 {stream.elapsed:.2f} 秒，{stream.rows_per_second:.0f} 行/秒）")
+
+    def disable_score_paging(self):
+        """成绩表格一次显示全部结果，不分页"""
+        self.score_model.set_fetch_more(None)
+        self.prev_page_btn.setEnabled(False)
+        self.next_page_btn.setEnabled(False)
+        self.page_label.setText("")
+
+    def run_score_query(self, query, params, done_message, error_text, cache=None):
+        """后台执行成绩查询，结果分批追加到成绩表格
+
+        cache: 传入ScoreColumnStore时用查询结果重新建立本地缓存（查询需包含课程名称列）
+        """
+        self.disable_score_paging()
+
+        def handle_rows(rows):
+            self.score_model.append_rows(rows)
+            if cache is not None:
+                cache.add_rows(rows)
+
+        def handle_finished(stream):
+            if cache is not None:
+                cache.finish_load()
+            self.show_query_finished(done_message, stream)
+
+        if cache is not None:
+            cache.begin_load()
+
+        self.score_model.set_rows([])
+        self.statusBar().showMessage("正在加载学生成绩...")
+        self.start_view_query(
+            "scores", query, params,
+            on_rows=handle_rows,
+            on_finished=handle_finished,
+            error_text=error_text,
+            on_progress=lambda rows, rate: self.statusBar().showMessage(
+                f"正在加载学生成绩... 已接收 {rows} 条（{rate:.0f} 行/秒）")
+        )
 
-        # 重新连接信号
-        self.table.itemChanged.connect(self.on_cell_changed)
+    def show_cached_scores(self, indices, done_message):
+        """从本地缓存显示成绩数据，indices为要显示的行位置（None表示全部）"""
+        started = time.perf_counter()
+        self.cancel_view_query("scores")
+        self.disable_score_paging()
+
+        rows = self.score_cache.rows(indices)
+        self.score_model.set_rows(rows)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.statusBar().showMessage(f"{done_message.format(len(rows))}（本地缓存，耗时 {elapsed:.0f} 毫秒）")
+
+    def apply_change_to_caches(self, event):
+        """把数据修改应用到成绩联表缓存和学生、课程基础数据缓存"""
+        if event.action == "reload":
+            self.score_cache.clear()
+            self.reference_data.invalidate()
+            self.load_course_filter_data()
+            return
 
-    def load_courses(self):
-        """加载课程数据"""
-        try:
-            # 执行查询
-            query = "SELECT Cno, course_name, Credit FROM Course ORDER BY Cno"
-            self.cursor.execute(query)
-            courses = self.cursor.fetchall()
-
-            # 清空表格
-            self.course_table.setRowCount(0)
-
-            # 添加数据到表格
-            for i, course in enumerate(courses):
-                self.course_table.insertRow(i)
-                for j, value in enumerate(course):
-                    # 修复空格问题 - 字符串类型数据去除空格
-                    if j in [0, 1] and value is not None:  # 课程号、课程名称字段
-                        value = str(value).strip()
-                    self.course_table.setItem(i, j, QTableWidgetItem(str(value)))
+        for key, values in event.items:
+            if event.table == "score":
+                sno, cno = key
+                if event.action == "insert":
+                    self.score_cache.upsert(sno, values['name'], cno, values['credit'], values['grade'],
+                                            values['course_name'])
+                elif event.action == "delete":
+                    self.score_cache.remove(sno, cno)
+            elif event.table == "student":
+                old_key = values.get('old_key')
+                if event.action == "update":
+                    self.score_cache.update_student(old_key or key, key, values['name'])
+                elif event.action == "delete":
+                    self.score_cache.remove_student(key)
+                row = None if event.action == "delete" else (key, values['name'])
+                self.reference_data.patch("students", key, row, old_key)
+            elif event.table == "course":
+                old_key = values.get('old_key')
+                if event.action == "update":
+                    self.score_cache.update_course(old_key or key, key, values['course_name'], values['credit'])
+                elif event.action == "delete":
+                    self.score_cache.remove_course(key)
+                row = None if event.action == "delete" else (key, values['course_name'], values['credit'])
+                self.reference_data.patch("courses", key, row, old_key)
+
+        if event.table == "score" and event.action == "update":
+            self.score_cache.set_grades([(sno, cno, values['grade']) for (sno, cno), values in event.items])
+        if event.table == "course":
+            self.load_course_filter_data()
+
+    def apply_change_to_score_view(self, event):
+        """把数据修改应用到学生成绩表格中已加载的行"""
+        model = self.score_model
+        if event.action == "reload":
+            self.load_students()
+            return
 
-            # 更新状态栏
-            self.statusBar().showMessage(f"已加载 {len(courses)} 门课程")
+        for key, values in event.items:
+            if event.table == "score":
+                sno, cno = key
+                row = model.find_row(sno, cno)
+                if event.action == "insert" and row < 0:
+                    if self.score_view_accepts(sno, cno, values):
+                        model.append_rows([(sno, values['name'], cno, values['credit'], values['grade'])])
+                elif event.action == "update" and row >= 0:
+                    if event.remote:
+                        # 其他用户的修改不覆盖本地尚未保存的修改
+                        model.set_saved_grade(row, values['grade'])
+                    else:
+                        model.set_grade(row, values['grade'])
+                elif event.action == "delete" and row >= 0:
+                    model.remove_row(row)
+            elif event.table == "student":
+                target = values.get('old_key') or key
+                if event.action == "update":
+                    model.update_rows(lambda r: r[0] == target,
+                                      lambda r: (sys.intern(key), sys.intern(values['name'])) + r[2:])
+                elif event.action == "delete":
+                    model.remove_rows(lambda r: r[0] == target)
+            elif event.table == "course":
+                target = values.get('old_key') or key
+                if event.action == "update":
+                    model.update_rows(lambda r: r[2] == target,
+                                      lambda r: r[:2] + (sys.intern(key), values['credit']) + r[4:])
+                elif event.action == "delete":
+                    model.remove_rows(lambda r: r[2] == target)
+
+    def score_view_accepts(self, sno, cno, values):
+        """新增的成绩是否属于成绩表格当前显示的结果
+
+        分页浏览或查询尚未完成时不加入表格，由翻页或查询结果取得；否则只加入满足当前搜索条件的记录
+        """
+        criteria = self.score_view_criteria
+        if criteria is None or "scores" in self.view_queries:
+            return False
+        return criteria.matches({'sno': sno, 'cno': cno, **values})
+
+    def append_student_row(self, sno, name):
+        """把新增的学生加入学生管理表格
+
+        表格是全部学生时总是加入，不满足当前搜索词时隐藏；表格是搜索结果时只加入满足搜索词的学生；
+        查询尚未完成时不加入，由查询结果取得
+        """
+        table = self.student_table
+        base = self.table_search_text.get("students")
+        if base is None:
+            return
+        text = self.student_search_input.text().strip().casefold()
+        matched = not text or text in sno.casefold() or text in name.casefold()
+        if base and not matched:
+            return
+        self.append_table_rows(table, [(sno, name, 0)])
+        table.setRowHidden(table.rowCount() - 1, not matched)
+
+    def row_index(self, table):
+        """学生管理/课程管理表格的行号索引"""
+        return self.table_row_index.setdefault(table, TableRowIndex())
+
+    def find_table_row(self, table, key):
+        """在学生管理/课程管理表格中按第一列查找行号，找不到时返回-1"""
+        return self.row_index(table).row(key)
+
+    def clear_table_rows(self, table):
+        """清空学生管理/课程管理表格"""
+        table.setRowCount(0)
+        self.row_index(table).clear()
+
+    def remove_table_row(self, table, row, key):
+        """删除学生管理/课程管理表格的一行"""
+        table.removeRow(row)
+        self.row_index(table).remove(key)
+
+    def apply_change_to_student_view(self, event):
+        """把数据修改应用到学生管理表格（学号、姓名、已选课程数）"""
+        table = self.student_table
+        if event.action == "reload" or (event.table == "course" and event.action == "delete"):
+            # 删除课程会改变许多学生的选课数，重新加载
+            self.load_student_list()
+            return
 
-        except pyodbc.Error as e:
-            logging.error(f"加载课程数据错误: {e}")
-            QMessageBox.warning(self, "错误", f"加载课程数据失败: {e}")
+        for key, values in event.items:
+            if event.table == "student":
+                old_key = values.get('old_key') or key
+                row = self.find_table_row(table, old_key)
+                if event.action == "insert" and row < 0:
+                    self.append_student_row(key, values['name'])
+                elif event.action == "update" and row >= 0:
+                    table.setItem(row, 0, QTableWidgetItem(key))
+                    table.setItem(row, 1, QTableWidgetItem(values['name']))
+                    self.row_index(table).rename(old_key, key)
+                elif event.action == "delete" and row >= 0:
+                    self.remove_table_row(table, row, key)
+            elif event.table == "score" and event.action in ("insert", "delete"):
+                row = self.find_table_row(table, key[0])
+                count_item = table.item(row, 2) if row >= 0 else None
+                if count_item is not None:
+                    step = 1 if event.action == "insert" else -1
+                    count_item.setText(str(int(count_item.text()) + step))
+
+    def apply_change_to_course_view(self, event):
+        """把数据修改应用到课程管理表格（课程号、课程名称、学分）"""
+        table = self.course_table
+        if event.action == "reload":
+            self.load_courses()
+            return
+        if event.table != "course":
+            return
+
+        for key, values in event.items:
+            old_key = values.get('old_key') or key
+            row = self.find_table_row(table, old_key)
+            if event.action == "insert" and row < 0:
+                self.append_table_rows(table, [(key, values['course_name'], values['credit'])])
+            elif event.action == "update" and row >= 0:
+                for column, value in enumerate((key, values['course_name'], values['credit'])):
+                    table.setItem(row, column, QTableWidgetItem(str(value)))
+                self.row_index(table).rename(old_key, key)
+            elif event.action == "delete" and row >= 0:
+                self.remove_table_row(table, row, key)
+
+    def poll_change_feed(self):
+        """后台读取一次其他客户端的修改"""
+        if self.change_feed_worker is not None:
+            return
+        worker = ChangeFeedWorker(self.pool, self.change_feed)
+        worker.signals.finished.connect(self.apply_change_feed)
+        worker.signals.failed.connect(self.change_feed_failed)
+        worker.signals.done.connect(self.change_feed_done)
+        self.change_feed_worker = self.query_executor.start(worker)
+
+    def apply_change_feed(self, events):
+        """把其他客户端的修改发布到事件总线，与本程序的修改走同样的更新流程"""
+        if not events:
+            return
+        conflicts = len(self.score_model.conflicts)
+        for event in events:
+            self.change_bus.changed.emit(event)
+        conflicts = len(self.score_model.conflicts) - conflicts
+        count = sum(len(event.items) for event in events)
+        logging.info(f"已同步其他用户的修改: {events}")
+        message = f"已同步其他用户的 {count} 项修改" if count else "其他用户修改了大量数据，已重新加载"
+        if conflicts > 0:
+            message += f"，其中 {conflicts} 条成绩与你尚未保存的修改冲突（已标为橙色，保存时将覆盖对方的修改）"
+        self.statusBar().showMessage(message)
+
+    def change_feed_failed(self, error):
+        """读取修改记录出错；首次检查ChangeLog就出错时停止同步"""
+        if not self.change_feed.ready:
+            logging.error(f"初始化多用户修改同步错误: {error}")
+            self.statusBar().showMessage("无法读取其他用户的修改，请使用刷新按钮获取最新数据")
+        else:
+            logging.error(f"读取修改记录错误: {error}")
+
+    def change_feed_done(self):
+        """一次读取结束，可以同步时开始等待下一次读取"""
+        self.change_feed_worker = None
+        if self.change_feed.ready:
+            self.change_feed_timer.start()
+        elif self.change_feed.installed is False:
+            logging.warning("数据库中没有ChangeLog表（由管理员执行 sql/change_log.sql 创建），多用户同步未启用")
+
+    def reload_students(self):
+        """丢弃本地缓存，从数据库重新加载学生成绩数据"""
+        self.score_cache.clear()
+        self.load_students()
+
+    def run_table_query(self, view, table, query, params, done_message, error_text, search_text="",
+                        on_complete=None):
+        """后台执行学生管理/课程管理的查询，结果分批追加到表格
+
+        search_text: 查询对应的搜索词（空字符串表示全部数据），查询完成后用于在结果中继续筛选
+        on_complete: 查询完成时调用，参数为全部结果行
+        """
+        received = []
+
+        def handle_rows(rows):
+            if on_complete is not None:
+                received.extend(rows)
+            self.append_table_rows(table, rows)
+
+        def handle_finished(stream):
+            self.table_search_text[view] = search_text
+            if on_complete is not None:
+                on_complete(received)
+            self.show_query_finished(done_message, stream)
+
+        self.table_search_text[view] = None
+        self.clear_table_rows(table)
+        self.start_view_query(
+            view, query, params,
+            on_rows=handle_rows,
+            on_finished=handle_finished,
+            error_text=error_text
+        )
 
+    def narrow_table_search(self, view, table, search_text, done_message, keys=None):
+        """在表格现有的查询结果中筛选，不访问数据库；返回是否已在本地完成筛选
+
+        表格中是全部数据，或新搜索词包含表格结果对应的搜索词时才能在本地筛选。
+        前两列（学号/姓名或课程号/课程名称）包含搜索词的行保留，其余行隐藏；
+        比较不区分大小写，与数据库的LIKE一致。keys为另外按第一列匹配的值
+        （如拼音、模糊匹配到的学号），这类匹配只能在全部数据中筛选
+        """
+        base = self.table_search_text.get(view)
+        if base is None:
+            return False
+        if base and (keys is not None or not search_text or base.casefold() not in search_text.casefold()):
+            return False
+
+        text = search_text.casefold()
+        visible = 0
+        for row in range(table.rowCount()):
+            first = table.item(row, 0)
+            matched = (
+                not text
+                or any(table.item(row, column) is not None and text in table.item(row, column).text().casefold()
+                       for column in (0, 1))
+                or (keys is not None and first is not None and first.text() in keys)
+            )
+            table.setRowHidden(row, not matched)
+            visible += matched
+
+        self.statusBar().showMessage(f"{done_message.format(visible)}（在已加载的结果中筛选）")
+        return True
+
+    def lookup_model(self, kind):
+        """学生或课程选择列表共用的数据模型，kind为"students"或"courses"；加载失败时返回None
+
+        数据版本没有变化时直接返回已有的模型；数据被修改后在同一个模型上重新设置数据，
+        正在使用该模型的筛选视图会随之更新
+        """
+        version, model = self.lookup_models.get(kind, (None, None))
+        if model is None or version != self.reference_data.version(kind):
+            try:
+                version, rows = self.reference_data.rows(kind)
+            except pyodbc.Error as e:
+                logging.error(f"加载选择列表错误: {e}")
+                return None
+            items = [(row[0], row[1]) for row in rows]
+            if model is None:
+                model = LookupListModel(items, fuzzy_names=(kind == "students"), parent=self)
+                model.name_index_requested.connect(self.build_student_name_index)
+            else:
+                model.set_items(items)
+            self.lookup_models[kind] = (version, model)
+        return model
+
+    def student_name_index(self):
+        """学生姓名查找索引（键为学号）
+
+        建立索引要读取全部学生并转换拼音，在后台线程进行；还没有建立好时返回None，
+        调用方先只按包含匹配查找，索引建立后重新执行学生搜索
+        """
+        version, model = self.lookup_models.get("students", (None, None))
+        if model is not None and version == self.reference_data.version("students"):
+            index = model.name_index()
+            if index is not None:
+                return index
+        self.build_student_name_index()
+        return None
+
+    def build_student_name_index(self):
+        """在后台建立学生姓名索引，已在建立时不重复提交"""
+        if self.name_index_worker is not None:
+            return
+        worker = NameIndexWorker(self.reference_data)
+        worker.signals.finished.connect(self.install_student_name_index)
+        worker.signals.failed.connect(lambda e: logging.error(f"建立姓名索引错误: {e}"))
+        worker.signals.done.connect(self.name_index_worker_done)
+        self.name_index_worker = self.query_executor.start(worker)
+
+    def install_student_name_index(self, result):
+        """后台建立的姓名索引交给学生选择列表模型，并按索引重新执行学生搜索"""
+        version, index = result
+        if version != self.reference_data.version("students") or not self.reference_data.is_fresh("students"):
+            return  # 建立期间学生数据被修改，下次使用时重新建立
+        model = self.lookup_model("students")  # 数据已在缓存中，不访问数据库
+        if model is None:
+            return
+        model.set_name_index(index)
+        if self.student_search_input.text().strip():
+            self.search_student()
+        if self.pending_name_search:
+            self.pending_name_search = False
+            self.search_students()
+
+    def name_index_worker_done(self):
+        self.name_index_worker = None
+
+    def connect_live_search(self, line_edit, search):
+        """边输入边搜索：停止输入SEARCH_DEBOUNCE_MS毫秒后执行search，连续输入时只执行最后一次"""
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(SEARCH_DEBOUNCE_MS)
+        timer.timeout.connect(search)
+        line_edit.textChanged.connect(lambda _: timer.start())
+        # 按回车时立即搜索，不再等待
+        line_edit.returnPressed.connect(timer.stop)
+
+    def append_table_rows(self, table, rows):
+        """将一批查询结果追加到表格末尾，并记入行号索引"""
+        index = self.row_index(table)
+        start = table.rowCount()
+        table.setRowCount(start + len(rows))
+        for i, record in enumerate(rows, start):
+            for j, value in enumerate(record):
+                # 修复空格问题 - 前两列为学号/姓名或课程号/课程名称
+                if j in [0, 1] and value is not None:
+                    value = str(value).strip()
+                table.setItem(i, j, QTableWidgetItem(str(value)))
+            index.append(table.item(i, 0).text())
 
     def reset_search(self):
         """重置所有搜索条件并加载所有学生"""
@@ -1443,7 +5555,7 @@ class StudentManagementSystem(QMainWindow):
     def show_context_menu(self, position):
         """显示右键菜单"""
         # 只有选中行时才显示菜单
-        if not self.table.selectedItems():
+        if not self.table.selectionModel().hasSelection():
             return
 
         context_menu = QMenu(self)
@@ -1451,6 +5563,15 @@ class StudentManagementSystem(QMainWindow):
         edit_action = context_menu.addAction("编辑成绩")
         delete_action = context_menu.addAction("删除成绩")
 
+        # 当前行有未保存的修改时可以恢复原始成绩
+        row = self.current_score_row()
+        if row >= 0:
+            sno, _, cno = self.score_model.row_values(row)[:3]
+            if (sno, cno) in self.score_model.changes:
+                restore_action = context_menu.addAction(f"恢复原始成绩 ({self.score_model.original_grade(row)})")
+                restore_action.triggered.connect(
+                    lambda: self.score_model.set_grade(row, self.score_model.original_grade(row), modified=True))
+
         # 连接信号
         edit_action.triggered.connect(self.edit_student_score)
         delete_action.triggered.connect(self.delete_student_score)
@@ -1497,8 +5618,10 @@ class StudentManagementSystem(QMainWindow):
             WHERE sc.Cno = ?
             ORDER BY sc.Grade DESC, s.Sno
             """
-            self.cursor.execute(query, (cno,))
-            students = self.cursor.fetchall()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (cno,))
+                students = cursor.fetchall()
 
             if not students:
                 QMessageBox.information(self, "提示", f"暂无学生选择课程 {course_name} ({cno})")
@@ -1558,125 +5681,85 @@ class StudentManagementSystem(QMainWindow):
             logging.error(f"查询课程学生错误: {e}")
             QMessageBox.critical(self, "错误", f"查询课程学生失败: {e}")
 
-    def on_cell_changed(self, item):
-        """单元格内容变化处理"""
-        # 仅处理成绩列
-        if item.column() == 4:  # 成绩列
-            row = item.row()
-
-            try:
-                # 尝试将输入转换为浮点数
-                value = float(item.text())
-
-                # 验证成绩范围
-                if value < 0 or value > 100:
-                    raise ValueError("成绩必须在0-100之间")
-
-                # 高亮修改的单元格
-                item.setBackground(Qt.yellow)
+    def on_cell_changed(self, row):
+        """成绩单元格内容变化处理"""
+        try:
+            # 尝试将输入转换为浮点数
+            value = float(self.score_model.row_values(row)[ScoreTableModel.GRADE_COLUMN])
 
-                # 更新状态栏
-                self.statusBar().showMessage("单元格已修改，请点击保存按钮应用更改")
+            # 验证成绩范围
+            if value < 0 or value > 100:
+                raise ValueError("成绩必须在0-100之间")
 
-                # 确保保存按钮可见且突出
-                self.save_btn.setStyleSheet("""
-                    QPushButton {
-                        background-color: #9c27b0; 
-                        color: white; 
-                        padding: 8px; 
-                        font-size: 13px;
-                        border-radius: 4px;
-                        min-width: 80px;
-                        font-weight: bold;
-                        border: 2px solid #4a148c;
-                    }
-                    QPushButton:hover {
-                        background-color: #7b1fa2;
-                    }
-                """)
-            except ValueError as e:
-                # 恢复原值
-                QMessageBox.warning(self, "输入错误", str(e))
+            # 高亮修改的单元格
+            self.score_model.set_grade(row, value, modified=True)
 
-                # 断开信号防止递归
-                try:
-                    self.table.itemChanged.disconnect(self.on_cell_changed)
-                except:
-                    pass
+            # 更新状态栏
+            self.statusBar().showMessage("单元格已修改，请点击保存按钮应用更改")
 
-                # 重新设置原值（仅当有原始数据时）
-                try:
-                    sno = self.table.item(row, 0).text().strip()
-                    cno = self.table.item(row, 2).text().strip()
-                    self.cursor.execute("""
-                        SELECT Grade FROM Student_Score 
-                        WHERE Sno = ? AND Cno = ?
-                    """, (sno, cno))
-                    original_grade = self.cursor.fetchone()[0]
-                    self.table.setItem(row, 4, QTableWidgetItem(str(original_grade)))
-                except:
-                    # 如果无法获取原始值，则重新加载所有数据
-                    self.load_students()
-
-                # 重新连接信号
-                self.table.itemChanged.connect(self.on_cell_changed)
+            # 确保保存按钮可见且突出
+            self.save_btn.setStyleSheet("""
+                QPushButton {
+                    background-color: #9c27b0; 
+                    color: white; 
+                    padding: 8px; 
+                    font-size: 13px;
+                    border-radius: 4px;
+                    min-width: 80px;
+                    font-weight: bold;
+                    border: 2px solid #4a148c;
+                }
+                QPushButton:hover {
+                    background-color: #7b1fa2;
+                }
+            """)
+        except ValueError as e:
+            # 恢复为输入前的值（未保存的修改或原始成绩）
+            QMessageBox.warning(self, "输入错误", str(e))
+            self.score_model.revert_edit(row)
 
     def save_all_changes(self):
-        """保存所有修改"""
-        try:
-            # 记录修改数量
-            changes_count = 0
-
-            # 遍历表格中的所有行
-            for row in range(self.table.rowCount()):
-                # 获取单元格背景色，检查是否修改过
-                grade_item = self.table.item(row, 4)
-                if grade_item and grade_item.background().color() == Qt.yellow:
-                    try:
-                        # 获取行数据
-                        sno = self.table.item(row, 0).text().strip()
-                        cno = self.table.item(row, 2).text().strip()
-                        grade = float(grade_item.text())
-
-                        # 更新数据库
-                        query = """
-                        UPDATE Student_Score
-                        SET Grade = ?
-                        WHERE Sno = ? AND Cno = ?
-                        """
-                        self.cursor.execute(query, (grade, sno, cno))
-                        changes_count += 1
-                    except (ValueError, TypeError) as e:
-                        # 处理数据转换错误
-                        QMessageBox.warning(self, "数据错误", f"第 {row + 1} 行成绩格式错误: {e}")
-                        continue
-
-            if changes_count > 0:
-                # 提交事务
-                self.conn.commit()
-
-                # 重新加载数据（清除黄色标记）
-                self.load_students()
-
-                # 更新状态栏
-                QMessageBox.information(self, "成功", f"已保存 {changes_count} 处修改")
-                self.statusBar().showMessage(f"已保存 {changes_count} 处修改")
-            else:
-                QMessageBox.information(self, "提示", "没有检测到修改项")
-                self.statusBar().showMessage("没有检测到修改项")
+        """保存所有修改：一次批量更新写入数据库，只刷新修改过的单元格，不重新加载表格"""
+        if not len(self.score_model.changes):
+            QMessageBox.information(self, "提示", "没有检测到修改项")
+            self.statusBar().showMessage("没有检测到修改项")
+            return
 
+        try:
+            with self.pool.connection() as conn:
+                saved = self.score_model.changes.flush(conn.cursor())
+                conn.commit()
         except pyodbc.Error as e:
+            # 未提交的事务在连接归还时自动回滚
             logging.error(f"保存修改错误: {e}")
             QMessageBox.critical(self, "保存错误", f"保存修改失败: {e}")
-            # 尝试回滚事务
-            try:
-                self.conn.rollback()
-            except:
-                pass
+            return
+
+        # 清除黄色标记，通知缓存和其他页面
+        self.score_model.mark_saved()
+        self.change_bus.publish_many("score", "update", [((sno, cno), {'grade': grade}) for sno, cno, grade in saved])
+
+        QMessageBox.information(self, "成功", f"已保存 {len(saved)} 处修改")
+        self.statusBar().showMessage(f"已保存 {len(saved)} 处修改")
+
+    def discard_all_changes(self):
+        """放弃全部未保存的成绩修改，恢复为原始成绩"""
+        count = len(self.score_model.changes)
+        if not count:
+            self.statusBar().showMessage("没有未保存的修改")
+            return
+
+        reply = QMessageBox.question(
+            self, "确认放弃", f"确定要放弃 {count} 处未保存的修改？",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self.score_model.discard_changes()
+            self.statusBar().showMessage(f"已放弃 {count} 处修改")
 
     def add_student_score(self):
         """添加学生成绩"""
-        dialog = AddScoreDialog(self, self.cursor)
+        dialog = AddScoreDialog(self, self.pool, self.lookup_model("students"), self.lookup_model("courses"))
 
         self.apply_dialog_style(dialog)
         if dialog.exec_() == QDialog.Accepted:
@@ -1684,50 +5767,61 @@ class StudentManagementSystem(QMainWindow):
 
             if score_data:
                 try:
-                    # 检查是否已存在该学生的该课程成绩
-                    self.cursor.execute("""
-                        SELECT COUNT(*) FROM Student_Score
-                        WHERE Sno = ? AND Cno = ?
-                    """, (score_data['sno'], score_data['cno']))
-
-                    count = self.cursor.fetchone()[0]
+                    with self.pool.connection() as conn:
+                        cursor = conn.cursor()
 
-                    if count > 0:
-                        QMessageBox.warning(self, "添加失败", "该学生已有该课程的成绩记录")
-                        return
+                        # 检查是否已存在该学生的该课程成绩
+                        cursor.execute("""
+                            SELECT COUNT(*) FROM Student_Score
+                            WHERE Sno = ? AND Cno = ?
+                        """, (score_data['sno'], score_data['cno']))
 
-                    # 添加新成绩
-                    self.cursor.execute("""
-                        INSERT INTO Student_Score (Sno, Cno, Grade)
-                        VALUES (?, ?, ?)
-                    """, (score_data['sno'], score_data['cno'], score_data['grade']))
+                        count = cursor.fetchone()[0]
 
-                    self.conn.commit()
+                        if count > 0:
+                            QMessageBox.warning(self, "添加失败", "该学生已有该课程的成绩记录")
+                            return
 
-                    # 刷新数据
-                    self.load_students()
+                        # 添加新成绩
+                        cursor.execute("""
+                            INSERT INTO Student_Score (Sno, Cno, Grade)
+                            VALUES (?, ?, ?)
+                        """, (score_data['sno'], score_data['cno'], score_data['grade']))
+
+                        conn.commit()
+
+                        # 读取新记录的联表数据，通知缓存和各页面
+                        cursor.execute("""
+                            SELECT s.Sno, s.name, sc.Cno, c.Credit, sc.Grade, c.course_name
+                            FROM Student_Score sc
+                            JOIN Student s ON sc.Sno = s.Sno
+                            JOIN Course c ON sc.Cno = c.Cno
+                            WHERE sc.Sno = ? AND sc.Cno = ?
+                        """, (score_data['sno'], score_data['cno']))
+                        record = cursor.fetchone()
+
+                    if record is not None:
+                        sno, name, cno, credit, grade, course_name = record
+                        self.change_bus.publish("score", "insert", (sno.strip(), cno.strip()), name=name.strip(),
+                                                credit=credit, grade=grade, course_name=course_name.strip())
 
                     # 更新状态栏
                     self.statusBar().showMessage("已添加新成绩记录")
 
                 except pyodbc.Error as e:
-                    self.conn.rollback()
                     logging.error(f"添加成绩错误: {e}")
                     QMessageBox.critical(self, "错误", f"添加成绩失败: {e}")
 
     def edit_student_score(self):
         """编辑学生成绩"""
         # 获取选中行
-        selected_row = self.table.currentRow()
+        selected_row = self.current_score_row()
         if selected_row < 0:
             QMessageBox.warning(self, "警告", "请先选择一条记录")
             return
 
         # 获取当前成绩
-        sno = self.table.item(selected_row, 0).text().strip()
-        name = self.table.item(selected_row, 1).text().strip()
-        cno = self.table.item(selected_row, 2).text().strip()
-        current_grade = self.table.item(selected_row, 4).text()
+        sno, name, cno, _, current_grade = self.score_model.row_values(selected_row)
 
         # 显示对话框获取新成绩
         new_grade, ok = QInputDialog.getDouble(
@@ -1744,11 +5838,12 @@ class StudentManagementSystem(QMainWindow):
                 SET Grade = ?
                 WHERE Sno = ? AND Cno = ?
                 """
-                self.cursor.execute(query, (new_grade, sno, cno))
-                self.conn.commit()
+                with self.pool.connection() as conn:
+                    conn.cursor().execute(query, (new_grade, sno, cno))
+                    conn.commit()
 
-                # 更新表格
-                self.table.setItem(selected_row, 4, QTableWidgetItem(str(new_grade)))
+                # 通知表格和缓存
+                self.change_bus.publish("score", "update", (sno, cno), grade=new_grade)
 
                 # 更新状态栏
                 self.statusBar().showMessage(f"已更新 {name} 的 {cno} 课程成绩")
@@ -1760,15 +5855,13 @@ class StudentManagementSystem(QMainWindow):
     def delete_student_score(self):
         """删除学生成绩"""
         # 获取选中行
-        selected_row = self.table.currentRow()
+        selected_row = self.current_score_row()
         if selected_row < 0:
             QMessageBox.warning(self, "警告", "请先选择一条记录")
             return
 
         # 获取信息
-        sno = self.table.item(selected_row, 0).text().strip()
-        name = self.table.item(selected_row, 1).text().strip()
-        cno = self.table.item(selected_row, 2).text().strip()
+        sno, name, cno = self.score_model.row_values(selected_row)[:3]
 
         # 确认删除
         reply = QMessageBox.question(
@@ -1783,11 +5876,12 @@ class StudentManagementSystem(QMainWindow):
             try:
                 # 删除记录
                 query = "DELETE FROM Student_Score WHERE Sno = ? AND Cno = ?"
-                self.cursor.execute(query, (sno, cno))
-                self.conn.commit()
+                with self.pool.connection() as conn:
+                    conn.cursor().execute(query, (sno, cno))
+                    conn.commit()
 
-                # 从表格中移除
-                self.table.removeRow(selected_row)
+                # 通知表格和缓存
+                self.change_bus.publish("score", "delete", (sno, cno))
 
                 # 更新状态栏
                 self.statusBar().showMessage(f"已删除 {name} 的 {cno} 课程成绩记录")
@@ -1858,28 +5952,30 @@ class StudentManagementSystem(QMainWindow):
                     return
 
                 try:
-                    # 检查课程号是否已存在
-                    self.cursor.execute("SELECT COUNT(*) FROM Course WHERE Cno = ?", (cno,))
-                    if self.cursor.fetchone()[0] > 0:
-                        QMessageBox.warning(self, "添加失败", "该课程号已存在")
-                        return
+                    with self.pool.connection() as conn:
+                        cursor = conn.cursor()
+
+                        # 检查课程号是否已存在
+                        cursor.execute("SELECT COUNT(*) FROM Course WHERE Cno = ?", (cno,))
+                        if cursor.fetchone()[0] > 0:
+                            QMessageBox.warning(self, "添加失败", "该课程号已存在")
+                            return
 
-                    # 添加课程
-                    self.cursor.execute("""
-                        INSERT INTO Course (Cno, course_name, Credit)
-                        VALUES (?, ?, ?)
-                    """, (cno, name, credit))
+                        # 添加课程
+                        cursor.execute("""
+                            INSERT INTO Course (Cno, course_name, Credit)
+                            VALUES (?, ?, ?)
+                        """, (cno, name, credit))
 
-                    self.conn.commit()
+                        conn.commit()
 
-                    # 刷新数据
-                    self.load_courses()
+                    # 通知缓存和各页面
+                    self.change_bus.publish("course", "insert", cno, course_name=name, credit=credit)
 
                     # 更新状态栏
                     self.statusBar().showMessage(f"已添加课程: {name} ({cno})")
 
                 except pyodbc.Error as e:
-                    self.conn.rollback()
                     logging.error(f"添加课程错误: {e}")
                     QMessageBox.critical(self, "错误", f"添加课程失败: {e}")
 
@@ -1969,9 +6065,12 @@ class StudentManagementSystem(QMainWindow):
 
                 # 检查新课程号是否已被使用
                 try:
-                    self.cursor.execute("SELECT COUNT(*) FROM Course WHERE Cno = ? AND Cno <> ?",
-                                        (new_cno, old_cno))
-                    if self.cursor.fetchone()[0] > 0:
+                    with self.pool.connection() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute("SELECT COUNT(*) FROM Course WHERE Cno = ? AND Cno <> ?",
+                                       (new_cno, old_cno))
+                        cno_used = cursor.fetchone()[0] > 0
+                    if cno_used:
                         QMessageBox.warning(self, "编辑失败", "该课程号已被其他课程使用")
                         return
                 except pyodbc.Error as e:
@@ -1981,40 +6080,46 @@ class StudentManagementSystem(QMainWindow):
 
             # 执行数据库更新操作
             try:
-                if is_changing_cno:
-                    # 需要处理外键关系的课程号修改
-                    self.cursor.execute("BEGIN TRANSACTION")
-
-                    # 1. 先添加新课程记录
-                    self.cursor.execute("""
-                        INSERT INTO Course (Cno, course_name, Credit)
-                        VALUES (?, ?, ?)
-                    """, (new_cno, name, credit))
-
-                    # 2. 更新成绩记录引用新课程号
-                    self.cursor.execute("""
-                        UPDATE Student_Score 
-                        SET Cno = ?
-                        WHERE Cno = ?
-                    """, (new_cno, old_cno))
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+
+                    if is_changing_cno:
+                        # 需要处理外键关系的课程号修改
+                        cursor.execute("BEGIN TRANSACTION")
+
+                        # 1. 先添加新课程记录
+                        cursor.execute("""
+                            INSERT INTO Course (Cno, course_name, Credit)
+                            VALUES (?, ?, ?)
+                        """, (new_cno, name, credit))
+
+                        # 2. 更新成绩记录引用新课程号
+                        cursor.execute("""
+                            UPDATE Student_Score 
+                            SET Cno = ?
+                            WHERE Cno = ?
+                        """, (new_cno, old_cno))
+
+                        # 3. 删除旧课程记录
+                        cursor.execute("DELETE FROM Course WHERE Cno = ?", (old_cno,))
+                    else:
+                        # 仅更新名称和学分，不涉及课程号变更
+                        cursor.execute("""
+                            UPDATE Course 
+                            SET course_name = ?, Credit = ? 
+                            WHERE Cno = ?
+                        """, (name, credit, old_cno))
 
-                    # 3. 删除旧课程记录
-                    self.cursor.execute("DELETE FROM Course WHERE Cno = ?", (old_cno,))
+                    conn.commit()
 
-                    self.conn.commit()
+                # 通知缓存和各页面
+                self.change_bus.publish("course", "update", new_cno, course_name=name, credit=credit,
+                                        old_key=old_cno if is_changing_cno else None)
 
-                    # 提示信息
+                # 提示信息
+                if is_changing_cno:
                     change_type = "课程号、课程名称和学分"
                 else:
-                    # 仅更新名称和学分，不涉及课程号变更
-                    self.cursor.execute("""
-                        UPDATE Course 
-                        SET course_name = ?, Credit = ? 
-                        WHERE Cno = ?
-                    """, (name, credit, old_cno))
-                    self.conn.commit()
-
-                    # 提示信息
                     if name != current_name and credit != float(current_credit):
                         change_type = "课程名称和学分"
                     elif name != current_name:
@@ -2022,12 +6127,6 @@ class StudentManagementSystem(QMainWindow):
                     else:
                         change_type = "学分"
 
-                # 刷新数据
-                self.load_courses()
-                # 如果更改了课程号，也要刷新成绩表
-                if is_changing_cno:
-                    self.load_students()
-
                 # 格式化学分显示
                 formatted_credit = f"{credit:.1f}" if credit != int(credit) else str(int(credit))
 
@@ -2035,9 +6134,7 @@ class StudentManagementSystem(QMainWindow):
                 self.statusBar().showMessage(f"已更新课程 {change_type}: {name} ({new_cno}), 学分: {formatted_credit}")
 
             except pyodbc.Error as e:
-                # 发生错误时回滚事务
-                if is_changing_cno:
-                    self.conn.rollback()
+                # 发生错误时事务在连接归还时回滚
                 logging.error(f"更新课程错误: {e}")
                 QMessageBox.critical(self, "数据库错误", f"更新课程失败: {e}")
 
@@ -2064,373 +6161,232 @@ class StudentManagementSystem(QMainWindow):
 
         if reply == QMessageBox.Yes:
             try:
-                # 删除课程前先删除相关成绩记录 (外键约束)
-                self.cursor.execute("DELETE FROM Student_Score WHERE Cno = ?", (cno,))
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+
+                    # 删除课程前先删除相关成绩记录 (外键约束)
+                    cursor.execute("DELETE FROM Student_Score WHERE Cno = ?", (cno,))
 
-                # 删除课程
-                self.cursor.execute("DELETE FROM Course WHERE Cno = ?", (cno,))
+                    # 删除课程
+                    cursor.execute("DELETE FROM Course WHERE Cno = ?", (cno,))
 
-                self.conn.commit()
+                    conn.commit()
 
-                # 刷新数据
-                self.course_table.removeRow(selected_row)
-                self.load_students()  # 也要刷新学生成绩表
+                # 通知缓存和各页面
+                self.change_bus.publish("course", "delete", cno)
 
                 # 更新状态栏
                 self.statusBar().showMessage(f"已删除课程: {name} ({cno})")
 
             except pyodbc.Error as e:
-                self.conn.rollback()
                 logging.error(f"删除课程错误: {e}")
                 QMessageBox.critical(self, "错误", f"删除课程失败: {e}")
 
     def import_excel(self):
-        """从Excel导入数据 """
+        """从Excel导入数据：在后台线程读取并校验文件，确认后再在后台写入数据库"""
         # 打开文件对话框选择Excel文件
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "选择Excel文件", "", "Excel文件 (*.xlsx *.xls)"
+            self, "选择Excel文件", "", "Excel文件 (*.xlsx *.xls);;CSV文件 (*.csv)"
         )
 
         if not file_path:
             return
 
-        try:
-            # 创建进度对话框
-            progress = QDialog(self)
-            progress.setWindowTitle("导入中...")
-            progress.setFixedSize(300, 100)
-            self.apply_dialog_style(progress)
+        if self.import_worker is not None:
+            QMessageBox.information(self, "提示", "已有导入任务正在进行，请等待完成或取消后再导入")
+            return
 
-            progress_layout = QVBoxLayout(progress)
-            progress_label = QLabel("正在读取Excel文件，请稍候...")
-            progress_layout.addWidget(progress_label)
-            progress.setModal(True)
-            progress.show()
-            QApplication.processEvents()  # 更新UI
+        # 根据不同选项卡处理不同类型的数据，目前只支持学生成绩
+        if self.findChild(QTabWidget).currentIndex() != 0:
+            QMessageBox.information(
+                self,
+                "功能提示",
+                "请切换到\"学生成绩\"选项卡使用导入功能"
+            )
+            return
 
-            # 读取Excel文件
-            df = pd.read_excel(file_path)
+        dialog = ImportProgressDialog(parent=self)
+        self.apply_dialog_style(dialog)
+        worker = ImportAnalysisWorker(file_path)
+        results = []
 
-            # 更新进度提示
-            progress_label.setText("正在分析数据...")
-            QApplication.processEvents()
+        def handle_failed(e):
+            logging.error(f"读取Excel文件错误: {e}")
+            QMessageBox.critical(self, "文件错误", f"无法读取Excel文件: {e}")
 
-            # 获取当前活动的选项卡
-            tab_index = self.findChild(QTabWidget).currentIndex()
+        def handle_done():
+            self.import_worker = None
+            dialog.finish()
+            # 读取线程结束、进度对话框关闭后再显示确认对话框
+            if results:
+                self.confirm_import(results[0])
+
+        signals = worker.signals
+        signals.stage.connect(dialog.set_stage)
+        signals.progress.connect(dialog.update_progress)
+        signals.finished.connect(results.append)
+        signals.failed.connect(handle_failed)
+        signals.cancelled.connect(lambda: self.statusBar().showMessage("已取消导入"))
+        signals.done.connect(handle_done)
+        dialog.cancel_requested.connect(worker.cancel)
+
+        self.import_worker = worker
+        dialog.show()
+        self.query_executor.start(worker)
+
+    def confirm_import(self, analysis):
+        """显示文件的校验结果；数据没有问题时确认导入选项，然后在后台导入"""
+        required_columns = IMPORT_REQUIRED_COLUMNS
+        if analysis.missing_columns:
+            QMessageBox.warning(
+                self,
+                "格式错误",
+                f"Excel文件缺少必要的列: {', '.join(analysis.missing_columns)}\n"
+                f"请确保Excel包含以下列: {', '.join(required_columns)}"
+            )
+            return
 
-            # 根据不同选项卡处理不同类型的数据
-            if tab_index == 0:  # 学生成绩选项卡
-                # 检查必要的列
-                required_columns = ["学号", "姓名", "课程号", "课程名称", "学分", "成绩"]
-
-                # 检查表头，支持多种表头格式
-                header_mappings = {
-                    "学号": ["学号", "学生学号", "学生号", "sno", "student_id", "学生id"],
-                    "姓名": ["姓名", "学生姓名", "name", "student_name"],
-                    "课程号": ["课程号", "课号", "课程编号", "cno", "course_id"],
-                    "课程名称": ["课程名称", "课程名", "课程", "course_name", "course"],
-                    "学分": ["学分", "分值", "学分值", "credit"],
-                    "成绩": ["成绩", "得分", "分数", "grade", "score"]
-                }
+        if analysis.errors:
+            error_msg = "\n".join(analysis.errors)
+            if analysis.error_count > len(analysis.errors):
+                error_msg += f"\n... 等共 {analysis.error_count} 个错误"
+            QMessageBox.warning(self, "数据验证错误", f"Excel数据存在以下问题:\n{error_msg}")
+            return
 
-                # 尝试匹配列名
-                matched_columns = {}
-                for required_col, possible_names in header_mappings.items():
-                    for col in df.columns:
-                        if str(col).lower() in [name.lower() for name in possible_names]:
-                            matched_columns[required_col] = col
-                            break
-
-                missing_columns = [col for col in required_columns if col not in matched_columns]
-
-                if missing_columns:
-                    progress.close()
-                    QMessageBox.warning(
-                        self,
-                        "格式错误",
-                        f"Excel文件缺少必要的列: {', '.join(missing_columns)}\n"
-                        f"请确保Excel包含以下列: {', '.join(required_columns)}"
-                    )
-                    return
+        preview_df = analysis.preview
 
-                # 创建一个新的DataFrame使用标准列名
-                standardized_df = pd.DataFrame()
-                for std_col, excel_col in matched_columns.items():
-                    standardized_df[std_col] = df[excel_col]
+        # 导入确认对话框
+        confirm_dialog = QDialog(self)
+        confirm_dialog.setWindowTitle("确认导入")
+        confirm_dialog.setMinimumSize(600, 400)
 
-                # 预处理数据
-                standardized_df = standardized_df.fillna("")  # 将NaN替换为空字符串
+        self.apply_dialog_style(confirm_dialog)
+        layout = QVBoxLayout(confirm_dialog)
 
-                # 数据验证
-                errors = []
-                for index, row in standardized_df.iterrows():
-                    # 验证学号
-                    if not row["学号"] or str(row["学号"]).strip() == "":
-                        errors.append(f"第 {index + 2} 行: 学号不能为空")
+        info_label = QLabel(f"即将导入 {analysis.total_rows} 条学生成绩记录，请选择导入选项：")
+        layout.addWidget(info_label)
 
-                    # 验证姓名
-                    if not row["姓名"] or str(row["姓名"]).strip() == "":
-                        errors.append(f"第 {index + 2} 行: 姓名不能为空")
+        # 导入选项
+        options_group = QGroupBox("导入选项")
+        options_layout = QVBoxLayout()
 
-                    # 验证课程号
-                    if not row["课程号"] or str(row["课程号"]).strip() == "":
-                        errors.append(f"第 {index + 2} 行: 课程号不能为空")
+        self.update_existing = QCheckBox("更新已存在的成绩记录")
+        self.update_existing.setChecked(True)
 
-                    # 验证学分
-                    try:
-                        if row["学分"] != "":
-                            credit = float(row["学分"])
-                            if credit <= 0:
-                                errors.append(f"第 {index + 2} 行: 学分必须大于0")
-                    except:
-                        errors.append(f"第 {index + 2} 行: 学分必须是数字")
+        self.add_missing_students = QCheckBox("自动添加不存在的学生")
+        self.add_missing_students.setChecked(True)
 
-                    # 验证成绩
-                    try:
-                        if row["成绩"] != "":
-                            grade = float(row["成绩"])
-                            if grade < 0 or grade > 100:
-                                errors.append(f"第 {index + 2} 行: 成绩必须在0-100之间")
-                    except:
-                        errors.append(f"第 {index + 2} 行: 成绩必须是数字")
-
-                if errors:
-                    progress.close()
-                    error_msg = "\n".join(errors[:10])
-                    if len(errors) > 10:
-                        error_msg += f"\n... 等共 {len(errors)} 个错误"
-                    QMessageBox.warning(self, "数据验证错误", f"Excel数据存在以下问题:\n{error_msg}")
-                    return
+        self.add_missing_courses = QCheckBox("自动添加不存在的课程")
+        self.add_missing_courses.setChecked(True)
 
-                # 关闭进度对话框
-                progress.close()
-
-                # 导入确认对话框
-                confirm_dialog = QDialog(self)
-                confirm_dialog.setWindowTitle("确认导入")
-                confirm_dialog.setMinimumSize(600, 400)
-
-                self.apply_dialog_style(confirm_dialog)
-                layout = QVBoxLayout(confirm_dialog)
-
-                info_label = QLabel(f"即将导入 {len(standardized_df)} 条学生成绩记录，请选择导入选项：")
-                layout.addWidget(info_label)
-
-                # 导入选项
-                options_group = QGroupBox("导入选项")
-                options_layout = QVBoxLayout()
-
-                self.update_existing = QCheckBox("更新已存在的成绩记录")
-                self.update_existing.setChecked(True)
-
-                self.add_missing_students = QCheckBox("自动添加不存在的学生")
-                self.add_missing_students.setChecked(True)
-
-                self.add_missing_courses = QCheckBox("自动添加不存在的课程")
-                self.add_missing_courses.setChecked(True)
-
-                options_layout.addWidget(self.update_existing)
-                options_layout.addWidget(self.add_missing_students)
-                options_layout.addWidget(self.add_missing_courses)
-
-                options_group.setLayout(options_layout)
-                layout.addWidget(options_group)
-
-                # 预览表格
-                preview_label = QLabel("数据预览：")
-                layout.addWidget(preview_label)
-
-                preview_table = QTableWidget()
-                preview_table.setColumnCount(len(standardized_df.columns))
-                preview_table.setHorizontalHeaderLabels(standardized_df.columns.tolist())
-
-                # 仅显示前10行数据
-                max_rows = min(10, len(standardized_df))
-                preview_table.setRowCount(max_rows)
-
-                for i in range(max_rows):
-                    for j, col in enumerate(standardized_df.columns):
-                        value = standardized_df.iloc[i, j]
-                        if pd.isna(value):
-                            value = ""
-                        item = QTableWidgetItem(str(value))
-                        preview_table.setItem(i, j, item)
-
-                preview_table.resizeColumnsToContents()
-                layout.addWidget(preview_table)
-
-                # 按钮
-                buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-                buttons.accepted.connect(confirm_dialog.accept)
-                buttons.rejected.connect(confirm_dialog.reject)
-                layout.addWidget(buttons)
-                self.setup_standard_buttons(buttons)
-
-                if confirm_dialog.exec_() == QDialog.Accepted:
-                    # 重新打开进度对话框
-                    progress = QDialog(self)
-                    progress.setWindowTitle("导入中...")
-                    progress.setFixedSize(300, 100)
-                    progress_layout = QVBoxLayout(progress)
-                    progress_label = QLabel("正在导入数据，请稍候...")
-                    progress_layout.addWidget(progress_label)
-                    progress.setModal(True)
-                    progress.show()
-                    QApplication.processEvents()  # 更新UI
-
-                    # 开始导入
-                    imported = 0
-                    updated = 0
-                    errors = 0
+        options_layout.addWidget(self.update_existing)
+        options_layout.addWidget(self.add_missing_students)
+        options_layout.addWidget(self.add_missing_courses)
 
-                    try:
-                        # 开始导入事务
-                        self.cursor.execute("BEGIN TRANSACTION")
-
-                        for i, row in standardized_df.iterrows():
-                            # 更新进度显示
-                            if i % 10 == 0:
-                                progress_label.setText(f"正在处理第 {i + 1}/{len(standardized_df)} 条记录...")
-                                QApplication.processEvents()
-
-                            try:
-                                # 清理数据并转换类型
-                                sno = str(row["学号"]).strip()
-                                name = str(row["姓名"]).strip()
-                                cno = str(row["课程号"]).strip()
-
-                                is_valid, error_msg = validate_course_number(cno)
-                                if not is_valid:
-                                    logging.warning(f"行 {i + 2}：课程号 '{cno}' 格式错误 - {error_msg}")
-                                    errors += 1
-                                    continue
-
-                                # 处理可能的空值或非数字值
-                                try:
-                                    credit = float(row["学分"]) if row["学分"] != "" else 0.0
-                                except:
-                                    credit = 0.0
-
-                                try:
-                                    grade = float(row["成绩"]) if row["成绩"] != "" else 0.0
-                                except:
-                                    grade = 0.0
-
-                                # 检查学生是否存在
-                                self.cursor.execute("SELECT COUNT(*) FROM Student WHERE Sno = ?", (sno,))
-                                if self.cursor.fetchone()[0] == 0:
-                                    if self.add_missing_students.isChecked():
-                                        # 添加学生
-                                        self.cursor.execute(
-                                            "INSERT INTO Student (Sno, name) VALUES (?, ?)",
-                                            (sno, name)
-                                        )
-                                    else:
-                                        logging.warning(f"学生 {sno} 不存在且未选择自动添加")
-                                        errors += 1
-                                        continue
-
-                                # 检查课程是否存在
-                                self.cursor.execute("SELECT COUNT(*) FROM Course WHERE Cno = ?", (cno,))
-                                if self.cursor.fetchone()[0] == 0:
-                                    if self.add_missing_courses.isChecked():
-                                        # 添加课程
-                                        course_name = str(row["课程名称"]).strip() if "课程名称" in row and row[
-                                            "课程名称"] != "" else f"[导入]课程{cno}"
-                                        self.cursor.execute(
-                                            "INSERT INTO Course (Cno, course_name, Credit) VALUES (?, ?, ?)",
-                                            (cno, course_name, credit)
-                                        )
-                                    else:
-                                        logging.warning(f"课程 {cno} 不存在且未选择自动添加")
-                                        errors += 1
-                                        continue
-
-                                # 检查成绩记录是否存在
-                                self.cursor.execute(
-                                    "SELECT COUNT(*) FROM Student_Score WHERE Sno = ? AND Cno = ?",
-                                    (sno, cno)
-                                )
-
-                                if self.cursor.fetchone()[0] > 0:
-                                    if self.update_existing.isChecked():
-                                        # 更新成绩
-                                        self.cursor.execute(
-                                            "UPDATE Student_Score SET Grade = ? WHERE Sno = ? AND Cno = ?",
-                                            (grade, sno, cno)
-                                        )
-                                        updated += 1
-                                else:
-                                    # 添加成绩记录
-                                    self.cursor.execute(
-                                        "INSERT INTO Student_Score (Sno, Cno, Grade) VALUES (?, ?, ?)",
-                                        (sno, cno, grade)
-                                    )
-                                    imported += 1
-
-                            except Exception as e:
-                                logging.error(f"导入行数据错误 (行 {i + 2}): {e}")
-                                errors += 1
-
-                        # 提交事务
-                        self.cursor.execute("COMMIT")
-                        progress.close()
-
-                        # 刷新数据
-                        self.load_students()
-                        self.load_courses()
-
-                        # 显示导入结果
-                        QMessageBox.information(
-                            self,
-                            "导入完成",
-                            f"导入成功！\n\n"
-                            f"新增记录: {imported}\n"
-                            f"更新记录: {updated}\n"
-                            f"错误记录: {errors}"
-                        )
-
-                        self.statusBar().showMessage(f"成功导入 {imported} 条记录，更新 {updated} 条记录")
-
-                    except Exception as e:
-                        # 回滚事务
-                        self.cursor.execute("ROLLBACK")
-                        progress.close()
-                        logging.error(f"导入数据错误: {e}")
-                        QMessageBox.critical(self, "导入错误", f"导入数据失败: {e}")
-                        self.statusBar().showMessage("导入失败")
+        options_group.setLayout(options_layout)
+        layout.addWidget(options_group)
 
-            else:
-                # 其他选项卡的导入功能
-                progress.close()
-                QMessageBox.information(
-                    self,
-                    "功能提示",
-                    "请切换到\"学生成绩\"选项卡使用导入功能"
-                )
+        # 预览表格
+        preview_label = QLabel("数据预览：")
+        layout.addWidget(preview_label)
 
-        except Exception as e:
-            # 确保进度对话框关闭
-            try:
-                progress.close()
-            except:
-                pass
-            logging.error(f"读取Excel文件错误: {e}")
-            QMessageBox.critical(self, "文件错误", f"无法读取Excel文件: {e}")
+        preview_table = QTableWidget()
+        preview_table.setColumnCount(len(preview_df.columns))
+        preview_table.setHorizontalHeaderLabels(preview_df.columns.tolist())
+
+        # 仅显示前10行数据
+        max_rows = min(10, len(preview_df))
+        preview_table.setRowCount(max_rows)
+
+        for i in range(max_rows):
+            for j, col in enumerate(preview_df.columns):
+                value = preview_df.iloc[i, j]
+                if pd.isna(value):
+                    value = ""
+                item = QTableWidgetItem(str(value))
+                preview_table.setItem(i, j, item)
+
+        preview_table.resizeColumnsToContents()
+        layout.addWidget(preview_table)
+
+        # 按钮
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(confirm_dialog.accept)
+        buttons.rejected.connect(confirm_dialog.reject)
+        layout.addWidget(buttons)
+        self.setup_standard_buttons(buttons)
+
+        if confirm_dialog.exec_() == QDialog.Accepted and self.import_worker is None:
+            # 在后台线程导入，导入期间界面保持可用
+            self.start_import(analysis)
+
+    def start_import(self, analysis):
+        """启动后台导入任务并显示进度对话框，写入已读取并校验过的数据"""
+        dialog = ImportProgressDialog(analysis.total_rows, self)
+        self.apply_dialog_style(dialog)
+
+        worker = ImportWorker(
+            self.pool, analysis.chunks, analysis.total_rows,
+            update_existing=self.update_existing.isChecked(),
+            add_missing_students=self.add_missing_students.isChecked(),
+            add_missing_courses=self.add_missing_courses.isChecked()
+        )
+
+        def handle_finished(result):
+            imported, updated, errors = result
+
+            # 批量导入修改大量记录，通知缓存和各页面重新加载
+            self.change_bus.publish("score", "reload")
+
+            # 显示导入结果
+            QMessageBox.information(
+                self,
+                "导入完成",
+                f"导入成功！\n\n"
+                f"新增记录: {imported}\n"
+                f"更新记录: {updated}\n"
+                f"错误记录: {errors}"
+            )
+
+            self.statusBar().showMessage(f"成功导入 {imported} 条记录，更新 {updated} 条记录")
+
+        def handle_failed(e):
+            # 未提交的事务在连接归还时回滚
+            logging.error(f"导入数据错误: {e}")
+            QMessageBox.critical(self, "导入错误", f"导入数据失败: {e}")
+            self.statusBar().showMessage("导入失败")
+
+        def handle_done():
+            self.import_worker = None
+            dialog.finish()
+
+        signals = worker.signals
+        signals.stage.connect(dialog.set_stage)
+        signals.progress.connect(dialog.update_progress)
+        signals.finished.connect(handle_finished)
+        signals.failed.connect(handle_failed)
+        signals.cancelled.connect(lambda: self.statusBar().showMessage("导入已取消，数据未做任何修改"))
+        signals.done.connect(handle_done)
+        dialog.cancel_requested.connect(worker.cancel)
+
+        self.import_worker = worker
+        dialog.show()
+        self.query_executor.start(worker)
 
     def export_excel(self):
-        """导出数据到Excel """
-        # 打开文件对话框选择保存位置
-        file_path, _ = QFileDialog.getSaveFileName(
-            self, "保存Excel文件", "", "Excel文件 (*.xlsx)"
+        """导出数据到Excel、CSV、压缩CSV或Parquet文件 """
+        # 打开文件对话框选择保存位置和格式
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "保存导出文件", "", ";;".join(name for name, _ in EXPORT_FILE_FORMATS)
         )
 
         if not file_path:
             return
 
-        # 如果文件路径没有.xlsx后缀，添加它
-        if not file_path.endswith('.xlsx'):
-            file_path += '.xlsx'
+        # 如果文件路径没有所选格式的后缀，添加它
+        extensions = dict(EXPORT_FILE_FORMATS)
+        if not any(file_path.lower().endswith(ext) for ext in extensions.values()):
+            file_path += extensions.get(selected_filter, '.xlsx')
 
         try:
             # 创建一个等待对话框
@@ -2446,143 +6402,149 @@ class StudentManagementSystem(QMainWindow):
 
             # 获取数据 - 根据当前视图决定导出内容
             tab_index = self.findChild(QTabWidget).currentIndex()
-
             if tab_index == 0:  # 学生成绩
-                # 创建要导出的学生成绩数据
-                data = []
-                headers = ["学号", "姓名", "课程号", "课程名称", "学分", "成绩"]
-
-                # 执行查询获取完整关联数据
-                self.cursor.execute("""
-                    SELECT s.Sno, s.name, sc.Cno, c.course_name, c.Credit, sc.Grade
-                    FROM Student_Score sc
-                    JOIN Student s ON sc.Sno = s.Sno
-                    JOIN Course c ON sc.Cno = c.Cno
-                    ORDER BY s.Sno, sc.Cno
-                """)
+                spec = EXPORT_QUERIES['scores']
+            elif tab_index == 1:  # 学生管理
+                spec = EXPORT_QUERIES['students']
+            else:  # 课程管理
+                spec = EXPORT_QUERIES['courses']
 
-                records = self.cursor.fetchall()
-                for record in records:
-                    row_data = []
-                    for value in record:
-                        # 处理小数格式
-                        if isinstance(value, float) and value == int(value):
-                            value = int(value)
-                        row_data.append(value)
-                    data.append(row_data)
+            def show_progress(written):
+                progress_label.setText(f"正在导出数据，已写入 {written} 条记录...")
+                QApplication.processEvents()
 
-            elif tab_index == 1:  # 学生管理
-                # 导出学生信息
-                headers = ["学号", "姓名", "已修课程数", "平均成绩"]
-                data = []
-
-                # 执行查询获取学生数据及统计信息
-                self.cursor.execute("""
-                    SELECT s.Sno, s.name, 
-                           COUNT(sc.Cno) as course_count,
-                           AVG(sc.Grade) as avg_grade
-                    FROM Student s
-                    LEFT JOIN Student_Score sc ON s.Sno = sc.Sno
-                    GROUP BY s.Sno, s.name
-                    ORDER BY s.Sno
-                """)
+            # 查询结果从服务器分批读取，逐批写入文件
+            writer, format_row = create_export_writer(file_path, spec)
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(spec['query'])
+                exported = writer.add_sheet('数据', spec['headers'], ResultStream(cursor), format_row, show_progress)
+            writer.save()
 
-                records = self.cursor.fetchall()
-                for record in records:
-                    row_data = []
-                    for i, value in enumerate(record):
-                        # 处理平均成绩格式
-                        if i == 3 and value is not None:  # 平均成绩
-                            value = round(value, 2)
-                        elif value is None:
-                            value = 0
-                        row_data.append(value)
-                    data.append(row_data)
+            # 关闭进度对话框
+            progress.close()
 
-            else:  # 课程管理
-                # 导出课程信息
-                headers = ["课程号", "课程名称", "学分", "选课人数", "平均成绩"]
-                data = []
-
-                # 执行查询获取课程数据及统计信息
-                self.cursor.execute("""
-                    SELECT c.Cno, c.course_name, c.Credit,
-                           COUNT(sc.Sno) as student_count,
-                           AVG(sc.Grade) as avg_grade
-                    FROM Course c
-                    LEFT JOIN Student_Score sc ON c.Cno = sc.Cno
-                    GROUP BY c.Cno, c.course_name, c.Credit
-                    ORDER BY c.Cno
-                """)
+            # 成功提示
+            QMessageBox.information(self, "导出成功", f"成功将 {exported} 条记录导出到:\n{file_path}")
+            self.statusBar().showMessage(f"成功导出 {exported} 条记录到 {file_path}")
+
+        except Exception as e:
+            logging.error(f"导出数据错误: {e}")
+            QMessageBox.critical(self, "导出错误", f"导出数据失败: {e}")
+
+    def export_all_excel(self):
+        """把学生成绩、学生统计和课程统计导出到同一个Excel文件的不同工作表"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "保存Excel文件", "", "Excel文件 (*.xlsx)"
+        )
 
-                records = self.cursor.fetchall()
-                for record in records:
-                    row_data = []
-                    for i, value in enumerate(record):
-                        # 处理小数格式
-                        if i == 2 and value is not None:  # 学分
-                            if value == int(value):
-                                value = int(value)
-                        elif i == 4 and value is not None:  # 平均成绩
-                            value = round(value, 2)
-                        elif value is None:
-                            value = 0
-                        row_data.append(value)
-                    data.append(row_data)
-
-            # 创建DataFrame
-            df = pd.DataFrame(data, columns=headers)
-
-            # 使用ExcelWriter增强Excel格式
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='数据')
-
-                # 获取工作簿和工作表
-                workbook = writer.book
-                worksheet = writer.sheets['数据']
-
-                # 创建表头样式
-                from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-                header_font = Font(bold=True, color="FFFFFF")
-                header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-                centered = Alignment(horizontal="center", vertical="center")
-                border = Border(
-                    left=Side(style='thin'),
-                    right=Side(style='thin'),
-                    top=Side(style='thin'),
-                    bottom=Side(style='thin')
-                )
-
-                # 应用样式到表头
-                for col_num, column in enumerate(df.columns, 1):
-                    cell = worksheet.cell(row=1, column=col_num)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.alignment = centered
-                    cell.border = border
-
-                # 设置列宽
-                for i, column in enumerate(df.columns):
-                    column_width = max(len(str(column)), df[column].astype(str).map(len).max())
-                    worksheet.column_dimensions[chr(65 + i)].width = column_width + 4
-
-                # 应用边框和居中对齐到所有数据单元格
-                for row in range(2, len(df) + 2):
-                    for col in range(1, len(df.columns) + 1):
-                        cell = worksheet.cell(row=row, column=col)
-                        cell.border = border
-                        cell.alignment = Alignment(horizontal="center")
+        if not file_path:
+            return
+
+        # 如果文件路径没有.xlsx后缀，添加它
+        if not file_path.endswith('.xlsx'):
+            file_path += '.xlsx'
+
+        streams = []
+        try:
+            # 创建一个等待对话框
+            progress = QDialog(self)
+            progress.setWindowTitle("导出中...")
+            progress.setFixedSize(300, 100)
+            progress_layout = QVBoxLayout(progress)
+            progress_label = QLabel("正在导出数据，请稍候...")
+            progress_layout.addWidget(progress_label)
+            progress.setModal(True)
+            progress.show()
+            QApplication.processEvents()  # 更新UI
+
+            # 三个查询各借用一个连接同时执行，按顺序写入工作表
+            specs = [EXPORT_QUERIES[key] for key in ('scores', 'students', 'courses')]
+            streams = [PrefetchStream(self.pool, spec['query']) for spec in specs]
+
+            writer = ExcelExportWriter(file_path)
+            counts = []
+            for spec, stream in zip(specs, streams):
+                def show_progress(written, title=spec['title']):
+                    progress_label.setText(f"正在导出{title}，已写入 {written} 条记录...")
+                    QApplication.processEvents()
+
+                counts.append(writer.add_sheet(spec['title'], spec['headers'], stream,
+                                               lambda record, spec=spec: format_export_row(record, spec),
+                                               show_progress))
+            writer.save()
 
             # 关闭进度对话框
             progress.close()
 
-            # 成功提示
-            QMessageBox.information(self, "导出成功", f"成功将 {len(data)} 条记录导出到:\n{file_path}")
-            self.statusBar().showMessage(f"成功导出 {len(data)} 条记录到 {file_path}")
+            summary = "、".join(f"{spec['title']} {count} 条" for spec, count in zip(specs, counts))
+            QMessageBox.information(self, "导出成功", f"成功导出{summary}到:\n{file_path}")
+            self.statusBar().showMessage(f"成功导出{summary}到 {file_path}")
 
         except Exception as e:
-            logging.error(f"导出Excel错误: {e}")
+            progress.close()
+            logging.error(f"导出数据错误: {e}")
             QMessageBox.critical(self, "导出错误", f"导出数据失败: {e}")
+        finally:
+            for stream in streams:
+                stream.close()
+
+    def export_by_course(self):
+        """为每门课程生成一个成绩报表文件，并生成课程汇总表（在后台线程执行，期间可以继续使用主窗口）"""
+        if self.course_report_worker is not None:
+            QMessageBox.information(self, "提示", "正在按课程导出报表，请等待完成或取消后再导出")
+            return
+
+        directory = QFileDialog.getExistingDirectory(self, "选择保存报表的文件夹")
+        if not directory:
+            return
+
+        worker = CourseReportWorker(self.pool, directory)
+
+        # 进度对话框，关闭对话框等同于取消导出
+        dialog = QDialog(self)
+        dialog.setWindowTitle("导出中...")
+        dialog.setMinimumWidth(320)
+        dialog_layout = QVBoxLayout(dialog)
+        progress_label = QLabel("正在导出数据，请稍候...")
+        cancel_btn = QPushButton("取消导出")
+        dialog_layout.addWidget(progress_label)
+        dialog_layout.addWidget(cancel_btn, alignment=Qt.AlignRight)
+
+        def request_cancel():
+            cancel_btn.setEnabled(False)
+            progress_label.setText("正在取消导出，等待正在生成的报表完成...")
+            worker.cancel()
+
+        def handle_progress(completed, submitted):
+            if not worker.cancelled:
+                progress_label.setText(f"正在生成课程报表，已完成 {completed}/{submitted} 门...")
+
+        def handle_finished(count):
+            QMessageBox.information(self, "导出成功", f"成功生成 {count} 门课程的成绩报表到:\n{directory}")
+            self.statusBar().showMessage(f"成功生成 {count} 门课程的成绩报表")
+
+        def handle_failed(e):
+            logging.error(f"按课程导出错误: {e}")
+            QMessageBox.critical(self, "导出错误", f"按课程导出失败: {e}")
+
+        def handle_done():
+            self.course_report_worker = None
+            dialog.accept()
+
+        cancel_btn.clicked.connect(request_cancel)
+        dialog.rejected.connect(request_cancel)
+
+        signals = worker.signals
+        signals.progress.connect(handle_progress)
+        signals.finished.connect(handle_finished)
+        signals.failed.connect(handle_failed)
+        signals.cancelled.connect(lambda: self.statusBar().showMessage("按课程导出已取消"))
+        signals.done.connect(handle_done)
+
+        self.course_report_worker = worker
+        dialog.show()
+        self.query_executor.start(worker)
 
     def show_about(self):
         """显示关于对话框"""
@@ -2595,84 +6557,72 @@ class StudentManagementSystem(QMainWindow):
             "支持学生、课程和成绩管理"
         )
 
+    def show_query_stats(self):
+        """显示数据库查询统计（非模态，可以边操作边刷新查看）"""
+        dialog = self.query_stats_dialog
+        if dialog is None:
+            dialog = self.query_stats_dialog = QueryStatsDialog(self.pool.stats, self)
+            self.apply_dialog_style(dialog)
+        else:
+            dialog.refresh()
+        dialog.show()
+        dialog.raise_()
+
     def closeEvent(self, event):
         """关闭窗口时关闭数据库连接"""
-        if hasattr(self, 'conn') and self.conn:
-            self.conn.close()
+        if hasattr(self, 'change_feed_timer'):
+            self.change_feed_timer.stop()
+        if hasattr(self, 'query_executor'):
+            self.query_executor.shutdown()
+        if hasattr(self, 'pool') and self.pool:
+            self.pool.close_all()
+            summary = self.pool.stats.summary()
+            if summary:
+                logging.info(f"数据库查询统计（按总耗时）:\n{summary}")
         event.accept()
 
     def load_student_list(self):
-        """加载学生列表"""
-        try:
-            # 执行查询
-            query = """
-            SELECT s.Sno, s.name, COUNT(sc.Cno) as course_count
-            FROM Student s
-            LEFT JOIN Student_Score sc ON s.Sno = sc.Sno
-            GROUP BY s.Sno, s.name
-            ORDER BY s.Sno
-            """
-            self.cursor.execute(query)
-            students = self.cursor.fetchall()
-
-            # 清空表格
-            self.student_table.setRowCount(0)
-
-            # 添加数据到表格
-            for i, student in enumerate(students):
-                self.student_table.insertRow(i)
-                for j, value in enumerate(student):
-                    # 修复空格问题
-                    if j in [0, 1] and value is not None:
-                        value = str(value).strip()
-                    self.student_table.setItem(i, j, QTableWidgetItem(str(value)))
-
-            # 更新状态栏
-            self.statusBar().showMessage(f"已加载 {len(students)} 名学生")
-
-        except pyodbc.Error as e:
-            logging.error(f"加载学生列表错误: {e}")
-            QMessageBox.warning(self, "错误", f"加载学生列表失败: {e}")
+        """加载学生列表（查询在后台线程执行）"""
+        query = """
+        SELECT s.Sno, s.name, COUNT(sc.Cno) as course_count
+        FROM Student s
+        LEFT JOIN Student_Score sc ON s.Sno = sc.Sno
+        GROUP BY s.Sno, s.name
+        ORDER BY s.Sno
+        """
+        self.run_table_query("students", self.student_table, query, (), "已加载 {} 名学生", "加载学生列表")
 
     def search_student(self):
         """搜索学生"""
         search_text = self.student_search_input.text().strip()
 
+        # 按拼音、首字母和模糊匹配找到的学号；索引还在后台建立时只按学号、姓名包含查找
+        index = self.student_name_index() if search_text else None
+        keys = set(index.search(search_text, NAME_SEARCH_LIMIT)) if index is not None else None
+
+        if self.narrow_table_search("students", self.student_table, search_text, "找到 {} 名匹配的学生", keys):
+            return
+
         if not search_text:
             self.load_student_list()
             return
 
-        try:
-            # 执行查询
-            query = """
-            SELECT s.Sno, s.name, COUNT(sc.Cno) as course_count
-            FROM Student s
-            LEFT JOIN Student_Score sc ON s.Sno = sc.Sno
-            WHERE s.Sno LIKE ? OR s.name LIKE ?
-            GROUP BY s.Sno, s.name
-            ORDER BY s.Sno
-            """
-            self.cursor.execute(query, (f"%{search_text}%", f"%{search_text}%"))
-            students = self.cursor.fetchall()
-
-            # 清空表格
-            self.student_table.setRowCount(0)
-
-            # 添加数据到表格
-            for i, student in enumerate(students):
-                self.student_table.insertRow(i)
-                for j, value in enumerate(student):
-                    # 修复空格问题
-                    if j in [0, 1] and value is not None:
-                        value = str(value).strip()
-                    self.student_table.setItem(i, j, QTableWidgetItem(str(value)))
-
-            # 更新状态栏
-            self.statusBar().showMessage(f"找到 {len(students)} 名匹配的学生")
-
-        except pyodbc.Error as e:
-            logging.error(f"搜索学生错误: {e}")
-            QMessageBox.warning(self, "错误", f"搜索学生失败: {e}")
+        name_matches = ""
+        params = [f"%{search_text}%", f"%{search_text}%"]
+        if keys:
+            name_matches = f" OR s.Sno IN ({', '.join('?' * len(keys))})"
+            params.extend(sorted(keys))
+
+        query = f"""
+        SELECT s.Sno, s.name, COUNT(sc.Cno) as course_count
+        FROM Student s
+        LEFT JOIN Student_Score sc ON s.Sno = sc.Sno
+        WHERE s.Sno LIKE ? OR s.name LIKE ?{name_matches}
+        GROUP BY s.Sno, s.name
+        ORDER BY s.Sno
+        """
+        self.run_table_query("students", self.student_table, query, params, "找到 {} 名匹配的学生", "搜索学生",
+                             search_text=search_text)
 
     def reset_student_search(self):
         """重置学生搜索"""
@@ -2683,39 +6633,22 @@ class StudentManagementSystem(QMainWindow):
         """搜索课程"""
         search_text = self.course_search_input.text().strip()
 
+        if self.narrow_table_search("courses", self.course_table, search_text, "找到 {} 门匹配的课程"):
+            return
+
         if not search_text:
             self.load_courses()
             return
 
-        try:
-            # 执行查询
-            query = """
-            SELECT Cno, course_name, Credit
-            FROM Course
-            WHERE Cno LIKE ? OR course_name LIKE ?
-            ORDER BY Cno
-            """
-            self.cursor.execute(query, (f"%{search_text}%", f"%{search_text}%"))
-            courses = self.cursor.fetchall()
-
-            # 清空表格
-            self.course_table.setRowCount(0)
-
-            # 添加数据到表格
-            for i, course in enumerate(courses):
-                self.course_table.insertRow(i)
-                for j, value in enumerate(course):
-                    # 修复空格问题
-                    if j in [0, 1] and value is not None:
-                        value = str(value).strip()
-                    self.course_table.setItem(i, j, QTableWidgetItem(str(value)))
-
-            # 更新状态栏
-            self.statusBar().showMessage(f"找到 {len(courses)} 门匹配的课程")
-
-        except pyodbc.Error as e:
-            logging.error(f"搜索课程错误: {e}")
-            QMessageBox.warning(self, "错误", f"搜索课程失败: {e}")
+        query = """
+        SELECT Cno, course_name, Credit
+        FROM Course
+        WHERE Cno LIKE ? OR course_name LIKE ?
+        ORDER BY Cno
+        """
+        params = (f"%{search_text}%", f"%{search_text}%")
+        self.run_table_query("courses", self.course_table, query, params, "找到 {} 门匹配的课程", "搜索课程",
+                             search_text=search_text)
 
     def reset_course_search(self):
         """重置课程搜索"""
@@ -2777,24 +6710,26 @@ class StudentManagementSystem(QMainWindow):
                 return
 
             try:
-                # 检查学号是否已存在
-                self.cursor.execute("SELECT COUNT(*) FROM Student WHERE Sno = ?", (sno,))
-                if self.cursor.fetchone()[0] > 0:
-                    QMessageBox.warning(self, "添加失败", "该学号已存在")
-                    return
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+
+                    # 检查学号是否已存在
+                    cursor.execute("SELECT COUNT(*) FROM Student WHERE Sno = ?", (sno,))
+                    if cursor.fetchone()[0] > 0:
+                        QMessageBox.warning(self, "添加失败", "该学号已存在")
+                        return
 
-                # 添加学生
-                self.cursor.execute("INSERT INTO Student (Sno, name) VALUES (?, ?)", (sno, name))
-                self.conn.commit()
+                    # 添加学生
+                    cursor.execute("INSERT INTO Student (Sno, name) VALUES (?, ?)", (sno, name))
+                    conn.commit()
 
-                # 刷新数据
-                self.load_student_list()
+                # 通知缓存和各页面
+                self.change_bus.publish("student", "insert", sno, name=name)
 
                 # 更新状态栏
                 self.statusBar().showMessage(f"已添加学生: {name} ({sno})")
 
             except pyodbc.Error as e:
-                self.conn.rollback()
                 logging.error(f"添加学生错误: {e}")
                 QMessageBox.critical(self, "错误", f"添加学生失败: {e}")
 
@@ -2842,41 +6777,43 @@ class StudentManagementSystem(QMainWindow):
                 return
 
             try:
-                if new_sno != old_sno:
-                    # 检查新学号是否已存在
-                    self.cursor.execute("SELECT COUNT(*) FROM Student WHERE Sno = ? AND Sno <> ?",
-                                        (new_sno, old_sno))
-                    if self.cursor.fetchone()[0] > 0:
-                        QMessageBox.warning(self, "编辑失败", "该学号已被其他学生使用")
-                        return
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+
+                    if new_sno != old_sno:
+                        # 检查新学号是否已存在
+                        cursor.execute("SELECT COUNT(*) FROM Student WHERE Sno = ? AND Sno <> ?",
+                                       (new_sno, old_sno))
+                        if cursor.fetchone()[0] > 0:
+                            QMessageBox.warning(self, "编辑失败", "该学号已被其他学生使用")
+                            return
 
-                    # 开始事务
-                    self.cursor.execute("BEGIN TRANSACTION")
+                        # 开始事务
+                        cursor.execute("BEGIN TRANSACTION")
 
-                    # 更新成绩记录中的学号
-                    self.cursor.execute("UPDATE Student_Score SET Sno = ? WHERE Sno = ?",
-                                        (new_sno, old_sno))
+                        # 更新成绩记录中的学号
+                        cursor.execute("UPDATE Student_Score SET Sno = ? WHERE Sno = ?",
+                                       (new_sno, old_sno))
 
-                    # 更新学生信息
-                    self.cursor.execute("UPDATE Student SET Sno = ?, name = ? WHERE Sno = ?",
-                                        (new_sno, name, old_sno))
-                else:
-                    # 只更新姓名
-                    self.cursor.execute("UPDATE Student SET name = ? WHERE Sno = ?",
-                                        (name, old_sno))
+                        # 更新学生信息
+                        cursor.execute("UPDATE Student SET Sno = ?, name = ? WHERE Sno = ?",
+                                       (new_sno, name, old_sno))
+                    else:
+                        # 只更新姓名
+                        cursor.execute("UPDATE Student SET name = ? WHERE Sno = ?",
+                                       (name, old_sno))
 
-                self.conn.commit()
+                    conn.commit()
 
-                # 刷新数据
-                self.load_student_list()
-                self.load_students()  # 刷新成绩表中的学生信息
+                # 通知缓存和各页面
+                self.change_bus.publish("student", "update", new_sno, name=name,
+                                        old_key=old_sno if new_sno != old_sno else None)
 
                 # 更新状态栏
                 self.statusBar().showMessage(f"已更新学生信息，学号: {new_sno}, 姓名: {name}")
 
             except pyodbc.Error as e:
-                # 发生错误时回滚事务
-                self.conn.rollback()
+                # 发生错误时事务在连接归还时回滚
                 logging.error(f"更新学生错误: {e}")
                 QMessageBox.critical(self, "错误", f"更新学生失败: {e}")
 
@@ -2901,28 +6838,29 @@ class StudentManagementSystem(QMainWindow):
 
         if reply == QMessageBox.Yes:
             try:
-                # 开始事务
-                self.cursor.execute("BEGIN TRANSACTION")
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+
+                    # 开始事务
+                    cursor.execute("BEGIN TRANSACTION")
 
-                # 先删除成绩记录
-                self.cursor.execute("DELETE FROM Student_Score WHERE Sno = ?", (sno,))
+                    # 先删除成绩记录
+                    cursor.execute("DELETE FROM Student_Score WHERE Sno = ?", (sno,))
 
-                # 删除学生
-                self.cursor.execute("DELETE FROM Student WHERE Sno = ?", (sno,))
+                    # 删除学生
+                    cursor.execute("DELETE FROM Student WHERE Sno = ?", (sno,))
 
-                # 提交事务
-                self.cursor.execute("COMMIT")
+                    # 提交事务
+                    cursor.execute("COMMIT")
 
-                # 刷新数据
-                self.student_table.removeRow(selected_row)
-                self.load_students()  # 也要刷新成绩表
+                # 通知缓存和各页面
+                self.change_bus.publish("student", "delete", sno)
 
                 # 更新状态栏
                 self.statusBar().showMessage(f"已删除学生: {name} ({sno})")
 
             except pyodbc.Error as e:
-                # 回滚事务
-                self.cursor.execute("ROLLBACK")
+                # 未提交的事务在连接归还时回滚
                 logging.error(f"删除学生错误: {e}")
                 QMessageBox.critical(self, "错误", f"删除学生失败: {e}")
 
@@ -2946,8 +6884,10 @@ class StudentManagementSystem(QMainWindow):
             WHERE sc.Sno = ?
             ORDER BY sc.Cno
             """
-            self.cursor.execute(query, (sno,))
-            scores = self.cursor.fetchall()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (sno,))
+                scores = cursor.fetchall()
 
             if not scores:
                 QMessageBox.information(self, "提示", f"学生 {name} ({sno}) 暂无成绩记录")
@@ -3026,6 +6966,10 @@ class StudentManagementSystem(QMainWindow):
 
 
 if __name__ == "__main__":
+    # 打包为exe后，进程池的子进程需要从这里进入
+    multiprocessing.freeze_support()
+    setup_logging()
+
     # 设置异常处理
     def exception_hook(exctype, value, traceback):
         print(exctype, value, traceback)
@@ -0,0 +1,107 @@
+-- 多用户修改同步：ChangeLog表和触发器
+--
+-- 由数据库管理员执行一次（需要建表和建触发器权限），客户端只读取ChangeLog，不会修改数据库结构。
+-- 没有执行本脚本时客户端照常使用，只是看不到其他用户的修改，需要点击刷新按钮。
+--
+-- 触发器把Student、Course、Student_Score每次修改的主键写入ChangeLog：
+--   Version 为rowversion，客户端按版本号读取增量；
+--   Origin 为写入连接的CONTEXT_INFO（客户端标识），客户端据此跳过自己的修改。
+-- 修改主键的UPDATE记为原主键的删除（D）和新主键的新增（I）。
+
+IF OBJECT_ID(N'dbo.ChangeLog', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.ChangeLog (
+        Id BIGINT IDENTITY(1,1) PRIMARY KEY,
+        Version ROWVERSION NOT NULL,
+        TableName VARCHAR(20) NOT NULL,
+        Action CHAR(1) NOT NULL,
+        KeyValue NVARCHAR(50) NOT NULL,  -- 与学号、课程号列的长度一致，过短会使触发器截断出错
+        KeyValue2 NVARCHAR(50) NULL,
+        Origin BINARY(16) NULL,
+        ChangedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+
+    CREATE INDEX IX_ChangeLog_Version ON dbo.ChangeLog (Version)
+    INCLUDE (TableName, Action, KeyValue, KeyValue2, Origin);
+
+    CREATE INDEX IX_ChangeLog_ChangedAt ON dbo.ChangeLog (ChangedAt);
+END
+GO
+
+IF OBJECT_ID(N'dbo.trg_Student_ChangeLog', N'TR') IS NOT NULL
+    DROP TRIGGER dbo.trg_Student_ChangeLog;
+GO
+
+CREATE TRIGGER dbo.trg_Student_ChangeLog ON dbo.Student
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    INSERT INTO dbo.ChangeLog (TableName, Action, KeyValue, KeyValue2, Origin)
+    SELECT 'Student',
+           CASE WHEN d.Sno IS NULL THEN 'I' WHEN i.Sno IS NULL THEN 'D' ELSE 'U' END,
+           COALESCE(i.Sno, d.Sno), NULL,
+           CAST(CONTEXT_INFO() AS BINARY(16))
+    FROM inserted i
+    FULL JOIN deleted d ON i.Sno = d.Sno;
+END
+GO
+
+IF OBJECT_ID(N'dbo.trg_Course_ChangeLog', N'TR') IS NOT NULL
+    DROP TRIGGER dbo.trg_Course_ChangeLog;
+GO
+
+CREATE TRIGGER dbo.trg_Course_ChangeLog ON dbo.Course
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    INSERT INTO dbo.ChangeLog (TableName, Action, KeyValue, KeyValue2, Origin)
+    SELECT 'Course',
+           CASE WHEN d.Cno IS NULL THEN 'I' WHEN i.Cno IS NULL THEN 'D' ELSE 'U' END,
+           COALESCE(i.Cno, d.Cno), NULL,
+           CAST(CONTEXT_INFO() AS BINARY(16))
+    FROM inserted i
+    FULL JOIN deleted d ON i.Cno = d.Cno;
+END
+GO
+
+IF OBJECT_ID(N'dbo.trg_Student_Score_ChangeLog', N'TR') IS NOT NULL
+    DROP TRIGGER dbo.trg_Student_Score_ChangeLog;
+GO
+
+CREATE TRIGGER dbo.trg_Student_Score_ChangeLog ON dbo.Student_Score
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    INSERT INTO dbo.ChangeLog (TableName, Action, KeyValue, KeyValue2, Origin)
+    SELECT 'Student_Score',
+           CASE WHEN d.Sno IS NULL THEN 'I' WHEN i.Sno IS NULL THEN 'D' ELSE 'U' END,
+           COALESCE(i.Sno, d.Sno), COALESCE(i.Cno, d.Cno),
+           CAST(CONTEXT_INFO() AS BINARY(16))
+    FROM inserted i
+    FULL JOIN deleted d ON i.Sno = d.Sno AND i.Cno = d.Cno;
+END
+GO
+
+-- 删除过期的修改记录。由服务器定时执行（如SQL Server代理作业每天一次），客户端不做清理：
+--   EXEC dbo.PurgeChangeLog @RetentionDays = 7;
+IF OBJECT_ID(N'dbo.PurgeChangeLog', N'P') IS NOT NULL
+    DROP PROCEDURE dbo.PurgeChangeLog;
+GO
+
+CREATE PROCEDURE dbo.PurgeChangeLog
+    @RetentionDays INT = 7
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @cutoff DATETIME2 = DATEADD(DAY, -@RetentionDays, SYSUTCDATETIME());
+    -- 分批删除，避免长时间锁住正在写入的表
+    WHILE 1 = 1
+    BEGIN
+        DELETE TOP (5000) FROM dbo.ChangeLog WHERE ChangedAt < @cutoff;
+        IF @@ROWCOUNT < 5000 BREAK;
+    END
+END
+GO
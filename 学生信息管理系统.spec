@@ -13,7 +13,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=added_files,
-    hiddenimports=['pandas', 'pyodbc', 'PyQt5.QtWidgets', 'PyQt5.QtCore', 'PyQt5.QtGui'],
+    hiddenimports=['pandas', 'numpy', 'pyodbc', 'pypinyin', 'pyarrow', 'pyarrow.parquet',
+                   'PyQt5.QtWidgets', 'PyQt5.QtCore', 'PyQt5.QtGui'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],